@@ -0,0 +1,323 @@
+# 热点函数的基准测试，完全离线：输入来自 pre_draw/*.csv、由它们合成的 28x28 图像和随机的红石浮点数
+#   python benchmark.py --save                   # 先在本机运行一次，保存为基准（benchmark_baseline.json）
+#   python benchmark.py                          # 运行全部，与本机的基准比较
+#   python benchmark.py -k predict -k rsr        # 只运行名字包含 predict 或 rsr 的项目
+#   python benchmark.py --threshold 0.25         # 吞吐量比基准慢 25% 以上才算退化
+# 每个项目报告吞吐量（items/s）、逐个处理单个 item 时的延迟分位数和一次调用的峰值内存（tracemalloc）。
+# 基准里是绝对耗时，只能与同一台机器上保存的结果比较，所以 benchmark_baseline.json 不进版本库；
+# 基准记录的环境与当前不同时只给出提示，不判定退化。有退化时返回非0，可以直接放进 CI。
+import argparse
+import glob
+import json
+import os
+import platform
+import random
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+DEFAULT_BASELINE = "benchmark_baseline.json"
+
+# ===== 输入数据 =====
+
+def load_drawings(pattern="pre_draw/dig*.csv"):
+    """pre_draw 下的手绘数字，15x15 list of 0/1"""
+    from redstone_lenet_packed import read_csv_image
+    return [read_csv_image(path) for path in sorted(glob.glob(pattern))]
+
+def synthetic_raw_images(drawings, count, seed=0):
+    """
+    把手绘数字放大、加粗成 MNIST 那样的 28x28 灰度 PIL 图像，供 SkeletonizeTransform 使用
+    """
+    from PIL import Image
+
+    rng = np.random.default_rng(seed)
+    images = []
+    for n in range(count):
+        big = np.kron(np.asarray(drawings[n % len(drawings)], dtype=np.float64), np.ones((2, 2)))[1:29, 1:29]
+        thick = np.maximum.reduce([np.roll(big, shift, axis) for shift in (-1, 0, 1) for axis in (0, 1)])
+        noisy = np.clip(thick * rng.uniform(160, 255) + rng.normal(0, 8, thick.shape), 0, 255)
+        images.append(Image.fromarray(noisy.astype(np.uint8)))
+    return images
+
+def random_redstone_floats(count, seed=0, low=-1.5, high=1.5):
+    from redstone_float import RedstoneFloat as rf
+    rng = random.Random(seed)
+    return [rf.from_float(rng.uniform(low, high) * 2 ** -rng.randint(0, 8)) for _ in range(count)]
+
+# ===== 项目 =====
+
+def _cases():
+    """
+    return: {name: setup}，setup() 返回 (fn, items, one)：每次调用 fn() 处理 items 个输入，
+    one(i) 只处理其中第 i 个，用来测单个 item 的延迟（批量接口就是大小为 1 的一批）
+    setup 里才导入依赖，只运行部分项目时不会加载其它模块
+    """
+    def weights():
+        from redstone_lenet_forward import load_weights
+        return load_weights("redstone_lenet.rlw" if os.path.exists("redstone_lenet.rlw") else "redstone_lenet.pth")
+
+    def rsr():
+        from redstone_lenet_forward import rsr
+        values = np.random.default_rng(0).uniform(-2, 2, 10000).tolist()
+        return (lambda: [rsr(v) for v in values]), len(values), lambda i: rsr(values[i])
+
+    def conv2d_manual():
+        from redstone_lenet_forward import conv2d_manual
+        w, drawings = weights(), load_drawings()
+        one = lambda i: conv2d_manual(drawings[i], w['conv1.weight'], w['conv1.bias'])
+        return (lambda: [one(i) for i in range(len(drawings))]), len(drawings), one
+
+    def linear_manual():
+        from redstone_lenet_forward import linear_manual
+        w = weights()
+        inputs = np.random.default_rng(0).uniform(0, 1, (64, 49)).round(4).tolist()
+        one = lambda i: linear_manual(inputs[i], w['fc1.weight'], w['fc1.bias'])
+        return (lambda: [one(i) for i in range(len(inputs))]), len(inputs), one
+
+    def predict():
+        from redstone_lenet_forward import predict
+        w, drawings = weights(), load_drawings()
+        return (lambda: [predict(img, w) for img in drawings]), len(drawings), lambda i: predict(drawings[i], w)
+
+    def predict_batch():
+        from redstone_lenet_forward import predict_batch
+        images = np.resize(np.asarray(load_drawings(), dtype=np.uint8), (1024, 15, 15))
+        w = weights()
+        return (lambda: predict_batch(images, w)), len(images), lambda i: predict_batch(images[i:i + 1], w)
+
+    def predict_fixed():
+        from redstone_lenet_fixed import predict_fixed
+        from redstone_lenet_forward import load_weights
+        w = load_weights("redstone_lenet.rlw" if os.path.exists("redstone_lenet.rlw") else "redstone_lenet.pth",
+                         fixed_point=True)
+        drawings = load_drawings()
+        return (lambda: [predict_fixed(img, w) for img in drawings]), len(drawings), lambda i: predict_fixed(drawings[i], w)
+
+    def predict_sparse():
+        from redstone_lenet_sparse import predict_sparse, prepare_sparse
+        sparse, drawings = prepare_sparse(weights()), load_drawings()
+        return ((lambda: [predict_sparse(img, sparse) for img in drawings]), len(drawings),
+                lambda i: predict_sparse(drawings[i], sparse))
+
+    def predict_specialized():
+        from redstone_lenet_codegen import load_specialized
+        specialized, drawings = load_specialized(weights()), load_drawings()
+        return ((lambda: [specialized.predict(img) for img in drawings]), len(drawings),
+                lambda i: specialized.predict(drawings[i]))
+
+    def skeletonize_transform():
+        from redstone_lenet import SkeletonizeTransform
+        transform, images = SkeletonizeTransform(), synthetic_raw_images(load_drawings(), 64)
+        return (lambda: [transform(img) for img in images]), len(images), lambda i: transform(images[i])
+
+    def custom_skeletonize():
+        from redstone_lenet import binarize_image, custom_skeletonize
+        binary = [binarize_image(img) for img in synthetic_raw_images(load_drawings(), 64)]
+        return (lambda: [custom_skeletonize(b) for b in binary]), len(binary), lambda i: custom_skeletonize(binary[i])
+
+    def custom_skeletonize_batch():
+        from redstone_lenet import binarize_image, custom_skeletonize_batch
+        binary = np.stack([binarize_image(img) for img in synthetic_raw_images(load_drawings(), 64)])
+        rng = np.random.default_rng(0)
+        return ((lambda: custom_skeletonize_batch(binary, rng)), len(binary),
+                lambda i: custom_skeletonize_batch(binary[i:i + 1], rng))
+
+    def redstr():
+        from redstone_float import RedstoneFloat as rf
+        values = np.random.default_rng(0).uniform(-1.5, 1.5, 2000).tolist()
+        return (lambda: [rf.redstr(v) for v in values]), len(values), lambda i: rf.redstr(values[i])
+
+    def from_string():
+        from redstone_float import RedstoneFloat as rf
+        strings = [x.to_string() for x in random_redstone_floats(2000)]
+        return (lambda: [rf.from_string(s) for s in strings]), len(strings), lambda i: rf.from_string(strings[i])
+
+    def multiplying():
+        from redstone_float_multiply import multiplying
+        # multiplying 不处理尾数为 0 的操作数，先过滤掉，items 只算真正参与计算的对
+        a, b = random_redstone_floats(200, seed=1), random_redstone_floats(200, seed=2)
+        pairs = [(x, y) for x, y in zip(a, b) if x.mantissa and y.mantissa]
+        return ((lambda: [multiplying(x, y, True) for x, y in pairs]), len(pairs),
+                lambda i: multiplying(*pairs[i], True))
+
+    def multiplying_fast():
+        from redstone_float_multiply import multiplying_fast
+        a, b = random_redstone_floats(2000, seed=1), random_redstone_floats(2000, seed=2)
+        return ((lambda: [multiplying_fast(x, y, True) for x, y in zip(a, b)]), len(a),
+                lambda i: multiplying_fast(a[i], b[i], True))
+
+    return {
+        "rsr": rsr,
+        "conv2d_manual": conv2d_manual,
+        "linear_manual": linear_manual,
+        "predict": predict,
+        "predict_batch": predict_batch,
+        "predict_fixed": predict_fixed,
+        "predict_sparse": predict_sparse,
+        "predict_specialized": predict_specialized,
+        "skeletonize_transform": skeletonize_transform,
+        "custom_skeletonize": custom_skeletonize,
+        "custom_skeletonize_batch": custom_skeletonize_batch,
+        "redstr": redstr,
+        "from_string": from_string,
+        "multiplying": multiplying,
+        "multiplying_fast": multiplying_fast,
+    }
+
+CASES = _cases()
+
+# ===== 计时 =====
+
+def run_case(fn, items, one, min_time=0.5, min_repeat=5, max_repeat=1000):
+    """
+    反复调用 fn()，至少 min_repeat 次且总时长至少 min_time 秒，得到吞吐量；
+    再依次调用 one(i)，每次只处理一个 item，得到单个 item 的延迟分位数
+    return: dict(items_per_s, p50_us, p90_us, p99_us, peak_kib)
+    """
+    fn()  # 预热：导入、缓存
+    samples = []
+    total = 0.0
+    while len(samples) < min_repeat or (total < min_time and len(samples) < max_repeat):
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        samples.append(elapsed)
+        total += elapsed
+
+    # 每个 item 至少测一次，p99 至少需要 100 个样本
+    latencies = []
+    total = 0.0
+    while len(latencies) < max(items, 100) or (total < min_time / 2 and len(latencies) < 100 * max_repeat):
+        i = len(latencies) % items
+        start = time.perf_counter()
+        one(i)
+        elapsed = time.perf_counter() - start
+        latencies.append(elapsed)
+        total += elapsed
+
+    # tracemalloc 会拖慢运行，单独调用一次测峰值内存
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    latency_us = np.asarray(latencies) * 1e6
+    return {
+        "items": items,
+        "repeat": len(samples),
+        "items_per_s": items / float(np.median(samples)),
+        "latency_samples": len(latencies),
+        "p50_us": float(np.percentile(latency_us, 50)),
+        "p90_us": float(np.percentile(latency_us, 90)),
+        "p99_us": float(np.percentile(latency_us, 99)),
+        "peak_kib": peak / 1024,
+    }
+
+def run_suite(names=None, min_time=0.5, progress=True):
+    """return: {name: run_case 的结果}；依赖缺失的项目记为 {"skipped": 原因}"""
+    results = {}
+    for name, setup in CASES.items():
+        if names is not None and name not in names:
+            continue
+        try:
+            fn, items, one = setup()
+        except ImportError as e:
+            results[name] = {"skipped": str(e)}
+            continue
+        results[name] = run_case(fn, items, one, min_time)
+        if progress:
+            print(f"  {name} done", file=sys.stderr)
+    return results
+
+def environment():
+    return {"python": platform.python_version(), "machine": platform.machine(), "processor": platform.processor(),
+            "numpy": np.__version__}
+
+def load_baseline(path):
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+def save_baseline(path, results):
+    with open(path, "w") as f:
+        json.dump({"environment": environment(), "results": results}, f, indent=2, sort_keys=True)
+        f.write("\n")
+
+def find_regressions(results, baseline, threshold):
+    """
+    吞吐量比基准低 threshold 以上的项目
+    return: {name: 变慢的比例}，例如 0.3 表示慢了 30%
+    """
+    regressions = {}
+    for name, result in results.items():
+        base = baseline.get(name)
+        if not base or "skipped" in result or "skipped" in base:
+            continue
+        slowdown = base["items_per_s"] / result["items_per_s"] - 1
+        if slowdown > threshold:
+            regressions[name] = slowdown
+    return regressions
+
+def print_results(results, baseline=None):
+    # 分位数是单个 item 的延迟（us），见 run_case
+    print(f"{'benchmark':24s} {'items/s':>12s} {'p50 us':>10s} {'p90 us':>10s} {'p99 us':>10s} {'peak KiB':>10s}"
+          + ("  vs baseline" if baseline else ""))
+    for name, r in results.items():
+        if "skipped" in r:
+            print(f"{name:24s} skipped: {r['skipped']}")
+            continue
+        line = (f"{name:24s} {r['items_per_s']:12.1f} {r['p50_us']:10.2f} "
+                f"{r['p90_us']:10.2f} {r['p99_us']:10.2f} {r['peak_kib']:10.1f}")
+        base = (baseline or {}).get(name)
+        if base and "skipped" not in base:
+            line += f"  {r['items_per_s'] / base['items_per_s']:6.2f}x"
+        print(line)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the RedstoneLeNet hot paths against stored baselines")
+    parser.add_argument("-k", dest="filters", action="append", default=None,
+                        help="only run benchmarks whose name contains this (repeatable)")
+    parser.add_argument("--list", action="store_true", help="list the benchmarks and exit")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save", action="store_true", help="store the results as the new baseline")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed throughput loss, 0.2 = 20%%")
+    parser.add_argument("--min-time", type=float, default=0.5, help="seconds spent on each benchmark")
+    args = parser.parse_args(argv)
+
+    if args.list:
+        print("\n".join(CASES))
+        return 0
+    names = None
+    if args.filters:
+        names = [name for name in CASES if any(f in name for f in args.filters)]
+
+    results = run_suite(names, args.min_time)
+    stored = load_baseline(args.baseline)
+    # 绝对耗时在不同机器之间没有可比性，只使用本机记录的基准
+    local = stored is not None and stored.get("environment") == environment()
+    baseline = stored["results"] if local else None
+    print_results(results, baseline)
+
+    if args.save:
+        # 只跑了部分项目时保留本机其它项目原来的基准
+        save_baseline(args.baseline, dict(baseline or {}, **results))
+        print(f"Saved baseline to {args.baseline}")
+        return 0
+    if stored is None:
+        print(f"No baseline at {args.baseline}, run with --save to create one")
+        return 0
+    if not local:
+        print(f"Baseline was recorded on {stored.get('environment')}, not on this machine; "
+              f"run with --save to record a local baseline")
+        return 0
+    regressions = find_regressions(results, baseline, args.threshold)
+    for name, slowdown in regressions.items():
+        print(f"REGRESSION: {name} is {100 * slowdown:.0f}% slower than the baseline")
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
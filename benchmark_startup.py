@@ -0,0 +1,66 @@
+# 启动时间基准：用 python -X importtime 检查 classify 的导入开销
+#   python benchmark_startup.py                # 检查并打印
+#   python benchmark_startup.py --budget-ms 400
+# 推理路径上出现重量级模块，或导入耗时超过预算时返回非0
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+
+# 推理路径上不允许出现的模块
+HEAVY_MODULES = ("torch", "torchvision", "pandas", "matplotlib", "PIL", "skimage")
+
+def import_times(module="classify"):
+    """
+    return: {模块名: 累计导入耗时(us)}，来自 -X importtime 的输出
+    """
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            capture_output=True, text=True, check=True)
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        # 格式：import time: self [us] | cumulative | imported package
+        _, cumulative_us, name = (part.strip() for part in line[len("import time:"):].split("|"))
+        times[name] = int(cumulative_us)
+    return times
+
+def cold_start_ms(argv, repeat=5):
+    """整个进程从启动到退出的时间，取中位数"""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable] + argv, capture_output=True, check=True)
+        samples.append((time.perf_counter() - start) * 1e3)
+    return statistics.median(samples)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Guard the classify startup time")
+    parser.add_argument("--module", default="classify")
+    parser.add_argument("--budget-ms", type=float, default=500.0, help="max cumulative import time of --module")
+    parser.add_argument("--sample", default="pre_draw/dig9_a.csv", help="csv used for the end-to-end run")
+    args = parser.parse_args(argv)
+
+    times = import_times(args.module)
+    total_ms = times[args.module] / 1e3
+    heavy = sorted(name for name in times if name.split(".")[0] in HEAVY_MODULES)
+    slowest = sorted(((t, name) for name, t in times.items() if "." not in name and name != args.module), reverse=True)[:5]
+
+    print(f"import {args.module}: {total_ms:.1f} ms (budget {args.budget_ms:.0f} ms)")
+    for t, name in slowest:
+        print(f"  {name:24s} {t / 1e3:8.1f} ms")
+    if args.module == "classify":
+        print(f"classify.py {args.sample}: {cold_start_ms(['classify.py', args.sample]):.1f} ms end to end")
+
+    failed = False
+    if heavy:
+        print(f"FAIL: heavy modules imported on the inference path: {', '.join(heavy)}")
+        failed = True
+    if total_ms > args.budget_ms:
+        print(f"FAIL: import time {total_ms:.1f} ms exceeds budget {args.budget_ms:.0f} ms")
+        failed = True
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,66 @@
+# 轻量推理入口：只依赖标准库和 NumPy，torch / matplotlib 只在需要时才导入
+#   python classify.py pre_draw/dig9_a.csv pre_draw/dig0.csv
+#   python classify.py --show pre_draw/dig9_a.csv
+#   python classify.py --draw
+import argparse
+import os
+import sys
+
+from redstone_lenet_forward import load_weights, predict
+from redstone_lenet_packed import read_csv_image
+
+def default_weights_path():
+    """优先使用导出的 .rlw（不需要 torch），不存在或已过期时退回 .pth"""
+    if os.path.exists("redstone_lenet.rlw"):
+        from redstone_lenet_weights import is_stale
+        if not os.path.exists("redstone_lenet.pth") or not is_stale("redstone_lenet.rlw", "redstone_lenet.pth"):
+            return "redstone_lenet.rlw"
+    return "redstone_lenet.pth"
+
+def show_prediction(image, prediction, title=None):
+    import matplotlib.pyplot as plt
+    plt.imshow(image, cmap="gray")
+    plt.title(title or f"Predicted: {prediction}")
+    plt.axis("off")
+    plt.show()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Classify 15x15 0/1 drawings with the manual RedstoneLeNet forward pass")
+    parser.add_argument("files", nargs="*", help="csv files to classify")
+    parser.add_argument("--weights", default=None, help="redstone_lenet.rlw or redstone_lenet.pth")
+    parser.add_argument("--show", action="store_true", help="show each image with its prediction (matplotlib)")
+    parser.add_argument("--draw", action="store_true", help="draw a digit by hand before classifying")
+    parser.add_argument("--cache", default=None, help="sqlite file that keeps predictions across runs")
+    args = parser.parse_args(argv)
+    if not args.files and not args.draw:
+        parser.error("nothing to classify, give csv files or --draw")
+
+    weights_path = args.weights or default_weights_path()
+    cache = None
+    if args.cache:
+        from redstone_lenet_cache import PredictionCache
+        cache = PredictionCache(weights_path, store_path=args.cache)
+        classify_one = cache.predict
+    else:
+        weights = load_weights(weights_path)
+        classify_one = lambda image: predict(image, weights)
+
+    images = [(path, read_csv_image(path)) for path in args.files]
+    if args.draw:
+        from draw_to_clasify import draw_digit
+        images.append(("<drawn>", draw_digit(load_weights(weights_path)).tolist()))
+
+    try:
+        for path, image in images:
+            prediction = classify_one(image)
+            print(f"{path}: {prediction}")
+            if args.show:
+                show_prediction(image, prediction, f"{os.path.basename(path)}: {prediction}")
+    finally:
+        if cache is not None:
+            # 把还在缓冲里的新结果写进 sqlite
+            cache.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,205 @@
+# 无界面的批量分类：文件、目录或 stdin 给出的任意数量的 csv / .rlp，按批推理，边算边写 JSONL
+#   python classify_bulk.py pre_draw/                           # 目录（递归）
+#   python classify_bulk.py drawings/ corpus.rlp -o results.jsonl
+#   find drawings -name '*.csv' | python classify_bulk.py -     # 从 stdin 读路径，一行一个
+# 每行输出 {"file", "index"(仅 .rlp), "prediction", "logits", "latency_ms"}，读不了的文件输出 {"file", "error"}，
+# 输出顺序与输入顺序相同。
+# 路径是惰性遍历的，csv 的解析分给进程池，同时在途的分片数有上限，内存占用与文件总数无关。
+import argparse
+import json
+import os
+import sys
+import time
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from redstone_lenet_packed import PACKED_BYTES, pack_images, read_csv_image, read_corpus
+
+EXTENSIONS = (".csv", ".rlp")
+
+def iter_paths(sources, stdin=sys.stdin):
+    """
+    sources: 文件 / 目录 / "-"（从 stdin 读路径）
+    逐个产出 .csv / .rlp 文件的路径，目录按名字排序递归遍历；直接给出的文件不检查扩展名
+    """
+    for source in sources:
+        if source == "-":
+            for line in stdin:
+                path = line.strip()
+                if path:
+                    yield path
+        elif os.path.isdir(source):
+            for root, dirs, files in os.walk(source):
+                dirs.sort()
+                for name in sorted(files):
+                    if name.endswith(EXTENSIONS):
+                        yield os.path.join(root, name)
+        else:
+            yield source
+
+def parse_csv_chunk(paths):
+    """
+    在工作进程里解析一批 csv
+    return: (packed uint8 [n, 29], [(path, error or None), ...])，解析失败的文件在 packed 里是全 0 的一行
+    与服务端的 parse_image 一样，只接受 15x15 的 0/1
+    """
+    images, status = [], []
+    for path in paths:
+        try:
+            image = np.asarray(read_csv_image(path))
+            if image.shape != (15, 15):
+                raise ValueError(f"expected 15x15, got {'x'.join(map(str, image.shape))}")
+            if not np.isin(image, (0, 1)).all():
+                raise ValueError("image must be 15x15 of 0/1")
+            images.append(image)
+            status.append((path, None))
+        except (OSError, ValueError) as e:
+            images.append(np.zeros((15, 15), dtype=np.uint8))
+            status.append((path, str(e)))
+    packed = pack_images(np.asarray(images)) if images else np.zeros((0, PACKED_BYTES), dtype=np.uint8)
+    return packed, status
+
+def _with_meta(result):
+    packed, status = result
+    return packed, [(path, None, error) for path, error in status]
+
+def iter_records(paths, workers=None, chunk=256, max_pending=None):
+    """
+    按输入顺序产出 (packed [n, 29], [(file, index, error), ...])
+    csv 分片交给进程池解析，最多同时有 max_pending 个分片在途；.rlp 在主进程里 memmap 后按 chunk 切片
+    workers=0 时在当前进程里解析
+    """
+    pool = ProcessPoolExecutor(max_workers=workers) if workers != 0 else None
+    max_pending = max_pending or 2 * (workers or os.cpu_count() or 1)
+    pending = deque()
+
+    # pending 里是按输入顺序排列的无参函数，调用后得到 (packed, [(file, index, error), ...])
+    def submit(csv_paths):
+        if pool is None:
+            result = _with_meta(parse_csv_chunk(csv_paths))
+            pending.append(lambda: result)
+        else:
+            future = pool.submit(parse_csv_chunk, csv_paths)
+            pending.append(lambda: _with_meta(future.result()))
+
+    def drain(limit):
+        while len(pending) > limit:
+            yield pending.popleft()()
+
+    try:
+        csv_paths = []
+        for path in paths:
+            if not path.endswith(".rlp"):
+                csv_paths.append(path)
+                if len(csv_paths) == chunk:
+                    submit(csv_paths)
+                    csv_paths = []
+                    yield from drain(max_pending)
+                continue
+            # .rlp 之前的 csv 先提交，保证输出顺序与输入一致
+            if csv_paths:
+                submit(csv_paths)
+                csv_paths = []
+            try:
+                corpus, _ = read_corpus(path)
+            except (OSError, ValueError) as e:
+                failed = (np.zeros((0, PACKED_BYTES), dtype=np.uint8), [(path, None, str(e))])
+                pending.append(lambda failed=failed: failed)
+                continue
+            for start in range(0, len(corpus), chunk):
+                batch = (np.array(corpus[start:start + chunk]),
+                         [(path, start + i, None) for i in range(min(chunk, len(corpus) - start))])
+                pending.append(lambda batch=batch: batch)
+                yield from drain(max_pending)
+        if csv_paths:
+            submit(csv_paths)
+        yield from drain(0)
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+
+def classify_stream(records, weight_dict, out, batch_size=1024):
+    """
+    records: iter_records 的结果；攒够 batch_size 张图就用 forward_batch 推理一次，立即写出 JSONL
+    出错的文件留在它在输入中的位置，与前后的图像按输入顺序一起写出
+    return: (images, errors, Counter of predictions)
+    """
+    from redstone_lenet_forward import forward_batch
+
+    counts = Counter()
+    images = errors = 0
+    buffer, meta = [], []  # meta 包括出错的文件，buffer 只有能推理的图像
+    buffered = 0
+
+    def flush():
+        nonlocal images, errors, buffered
+        if not meta:
+            return
+        rows = iter(())
+        latency_ms = 0.0
+        if buffer:
+            packed = np.concatenate(buffer)
+            start = time.perf_counter()
+            rows = iter(forward_batch(packed, weight_dict))
+            latency_ms = (time.perf_counter() - start) * 1e3 / len(packed)
+            images += len(packed)
+        for path, index, error in meta:
+            if error is not None:
+                errors += 1
+                out.write(json.dumps({"file": path, "error": error}) + "\n")
+                continue
+            row = next(rows)
+            record = {"file": path}
+            if index is not None:
+                record["index"] = index
+            prediction = int(np.argmax(row))
+            record.update(prediction=prediction, logits=row.tolist(), latency_ms=round(latency_ms, 4))
+            out.write(json.dumps(record) + "\n")
+            counts[prediction] += 1
+        out.flush()
+        buffer.clear()
+        meta.clear()
+        buffered = 0
+
+    for packed, status in records:
+        ok = np.array([error is None for _, _, error in status], dtype=bool)
+        if ok.any():
+            buffer.append(packed[ok])
+            buffered += int(ok.sum())
+        meta.extend(status)
+        if buffered >= batch_size:
+            flush()
+    flush()
+    return images, errors, counts
+
+def main(argv=None):
+    from classify import default_weights_path
+    from redstone_lenet_forward import load_weights
+
+    parser = argparse.ArgumentParser(description="Classify many csv / .rlp drawings headlessly and write JSONL")
+    parser.add_argument("sources", nargs="+", help="files, directories, or - to read paths from stdin")
+    parser.add_argument("-o", "--output", default="-", help="JSONL output file (default: stdout)")
+    parser.add_argument("--weights", default=None)
+    parser.add_argument("--workers", type=int, default=None, help="csv parsing processes, 0 parses in-process")
+    parser.add_argument("--chunk", type=int, default=256, help="files per parsing task")
+    parser.add_argument("--batch-size", type=int, default=1024, help="images per forward_batch call")
+    args = parser.parse_args(argv)
+
+    weights = load_weights(args.weights or default_weights_path())
+    out = sys.stdout if args.output == "-" else open(args.output, "w")
+    start = time.perf_counter()
+    try:
+        records = iter_records(iter_paths(args.sources), args.workers, args.chunk)
+        images, errors, counts = classify_stream(records, weights, out, args.batch_size)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    elapsed = time.perf_counter() - start
+    print(f"{images} images classified, {errors} errors, {images / elapsed if elapsed > 0 else 0:.0f} images/s; "
+          f"predictions: {dict(sorted(counts.items()))}", file=sys.stderr)
+    return 1 if errors else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,27 +1,54 @@
-import csv
-import pandas as pd
-import torch
-import torch.nn.functional as F
 import numpy as np
-import matplotlib.pyplot as plt
-from PIL import Image
-from torchvision import transforms
 
-from redstone_lenet_class import RedstoneLeNet
+from classify import show_prediction
+from redstone_lenet_packed import read_csv_image, write_csv_image
 from redstone_lenet_forward import load_weights, predict
 
 # Function to draw an image
-def draw_digit():
+def draw_digit(weights=None):
+    """
+    weights: 给出时边画边识别，标题实时显示当前的预测（IncrementalPredictor 增量更新）
+    return: 15x15 画布
+    """
+    # 只有真正要画图时才导入 matplotlib
+    import matplotlib.pyplot as plt
+
     fig, ax = plt.subplots(figsize=(3, 3))
     ax.set_xticks([])  # Hide axes
     ax.set_yticks([])
     canvas = np.zeros((15, 15))  # Create a blank canvas
     drawing = False  # Flag to track when to draw
 
+    # 只创建一次图像，之后用 blit 只重绘画布和预测文字，不再每次 imshow + 整张重绘
+    image = ax.imshow(canvas, cmap="gray", vmin=0, vmax=1, animated=True)
+    label = fig.text(0.5, 0.95, "", ha="center", va="top", animated=True)
+    model = None
+    if weights is not None:
+        from redstone_lenet_incremental import IncrementalPredictor
+        model = IncrementalPredictor(weights)
+        label.set_text(f"Predicted: {model.predict()}")
+    background = None
+
+    def on_full_draw(event):
+        """窗口重绘（包括缩放）后重新保存背景"""
+        nonlocal background
+        background = fig.canvas.copy_from_bbox(fig.bbox)
+        blit()
+
+    def blit():
+        if background is None:
+            return
+        fig.canvas.restore_region(background)
+        ax.draw_artist(image)
+        fig.draw_artist(label)
+        fig.canvas.blit(fig.bbox)
+        fig.canvas.flush_events()
+
     def on_press(event):
         """Activate drawing when the mouse button is pressed."""
         nonlocal drawing
         drawing = True
+        on_draw(event)
 
     def on_release(event):
         """Stop drawing when the mouse button is released."""
@@ -31,12 +58,17 @@ def draw_digit():
     def on_draw(event):
         """Draw only when the mouse button is held down."""
         if drawing and event.xdata is not None and event.ydata is not None:
-            x, y = int(event.xdata), int(event.ydata)
-            if 0 <= x < 15 and 0 <= y < 15:  # Ensure within bounds
+            # imshow 的像素中心在整数坐标上
+            x, y = int(round(event.xdata)), int(round(event.ydata))
+            if 0 <= x < 15 and 0 <= y < 15 and canvas[y, x] != 1:  # Ensure within bounds
                 canvas[y, x] = 1  # Simulate brush effect
-                ax.imshow(canvas, cmap="gray")
-                plt.draw()
+                image.set_data(canvas)
+                if model is not None:
+                    model.set_pixel(y, x, 1)
+                    label.set_text(f"Predicted: {model.predict()}")
+                blit()
 
+    fig.canvas.mpl_connect("draw_event", on_full_draw)
     fig.canvas.mpl_connect("button_press_event", on_press)
     fig.canvas.mpl_connect("button_release_event", on_release)
     fig.canvas.mpl_connect("motion_notify_event", on_draw)
@@ -44,30 +76,25 @@ def draw_digit():
 
     return canvas
 
-# 读取预制画
-image_array = pd.read_csv("pre_draw/dig9_a.csv", header=None).values
+if __name__ == "__main__":
+    # 读取预制画
+    image_array = np.array(read_csv_image("pre_draw/dig9_a.csv"))
 
-# 实际上手画一张
-# image_array = draw_digit()
-# image_array[0,0] = 0
+    # 实际上手画一张（边画边显示预测）
+    # image_array = draw_digit(load_weights("redstone_lenet.pth"))
+    # image_array[0,0] = 0
 
-# 控制台预览画的/加载的csv
-# print(image_array)
+    # 控制台预览画的/加载的csv
+    # print(image_array)
 
-# 存储画的图像到temp.csv
-# with open('pre_draw/temp.csv', 'w', newline='') as csvfile:
-#     spamwriter = csv.writer(csvfile, quotechar='|', quoting=csv.QUOTE_MINIMAL)
-#     for row in image_array:
-#         spamwriter.writerow([int(i) for i in row])
+    # 存储画的图像到temp.csv
+    # write_csv_image('pre_draw/temp.csv', image_array)
 
-weights = load_weights("redstone_lenet.pth")
-# print(weights.keys())
-prediction = predict(image_array, weights)
+    weights = load_weights("redstone_lenet.pth")
+    # print(weights.keys())
+    prediction = predict(image_array, weights)
 
-print(f"Predicted Number: {prediction}")
+    print(f"Predicted Number: {prediction}")
 
-# Show the drawn image again
-plt.imshow(image_array, cmap="gray")
-plt.title(f"Predicted: {prediction}")
-plt.axis("off")
-plt.show()
+    # Show the drawn image again
+    show_prediction(image_array, prediction)
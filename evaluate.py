@@ -0,0 +1,212 @@
+# 并行、流式的准确率评估，取代逐张串行的 test_accuracy.py
+#   python evaluate.py --data ./data --limit 10000 --workers 8
+#   python evaluate.py --data ./data --label 9 --limit 100
+#   python evaluate.py --corpus pre_draw/pre_draw.rlp
+#   python evaluate.py --synthetic 20000 --scaling
+# 标签直接从 MNIST 的 idx 文件读取，不经过骨架化；只有被抽中的样本才在工作进程里做变换。
+# 完全离线：只读本地 data/MNIST/raw（torchvision 下载的目录结构），或打包好的 .rlp / 合成样本。
+import argparse
+import gzip
+import os
+import struct
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from redstone_lenet_packed import read_corpus, unpack_images
+
+ENGINES = ("batch", "fixed", "scalar")
+
+# ===== 数据集 =====
+
+def read_idx(path):
+    """读取 MNIST 的 idx 文件（可以是 .gz），返回 uint8 数组"""
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rb") as f:
+        data = f.read()
+    _, dtype, ndim = struct.unpack_from(">HBB", data, 0)
+    if dtype != 0x08:
+        raise ValueError(f"{path}: 只支持 uint8 的 idx 文件")
+    shape = struct.unpack_from(f">{ndim}I", data, 4)
+    return np.frombuffer(data, dtype=np.uint8, offset=4 + 4 * ndim).reshape(shape)
+
+def _find_idx(root, name):
+    for candidate in (os.path.join(root, "MNIST", "raw", name), os.path.join(root, name)):
+        for path in (candidate, candidate + ".gz"):
+            if os.path.exists(path):
+                return path
+    raise FileNotFoundError(f"在 {root} 下找不到 {name}，先用 torchvision 下载 MNIST，或改用 --corpus / --synthetic")
+
+def load_mnist_raw(root="./data", train=True):
+    """
+    return: (images uint8 [N, 28, 28], labels uint8 [N])，未经变换
+    """
+    prefix = "train" if train else "t10k"
+    labels = read_idx(_find_idx(root, f"{prefix}-labels-idx1-ubyte"))
+    images = read_idx(_find_idx(root, f"{prefix}-images-idx3-ubyte"))
+    return images, labels
+
+def synthetic_fixtures(count, seed=0, flip=1):
+    """
+    用 pre_draw/pre_draw.rlp 的手绘数字造一批带标签的样本：随机平移 ±1 格，再随机翻转 flip 个像素
+    return: (images uint8 [count, 15, 15], labels uint8 [count])，已经是 0/1，不需要骨架化
+    """
+    from redstone_lenet import shift_image
+
+    packed, base_labels = read_corpus("pre_draw/pre_draw.rlp")
+    base = unpack_images(packed)
+    rng = np.random.default_rng(seed)
+    choice = rng.integers(len(base), size=count)
+    images = np.empty((count, 15, 15), dtype=np.uint8)
+    for n, (k, dx, dy) in enumerate(zip(choice, rng.integers(-1, 2, size=count), rng.integers(-1, 2, size=count))):
+        images[n] = shift_image(base[k], dx, dy)
+    rows = rng.integers(15, size=(count, flip))
+    cols = rng.integers(15, size=(count, flip))
+    images[np.arange(count)[:, None], rows, cols] ^= 1
+    return images, np.asarray(base_labels)[choice]
+
+# ===== 工作进程 =====
+
+_weights = None
+_engine = None
+
+def _init_worker(weights_path, engine):
+    global _weights, _engine
+    from redstone_lenet_forward import load_weights
+    _weights = load_weights(weights_path, fixed_point=(engine == "fixed"))
+    _engine = engine
+
+def _run_shard(shard_id, images, needs_transform, seed):
+    """
+    images: 需要骨架化时为原始 28x28 灰度图，否则为 15x15 的 0/1 图
+    return: (shard_id, predictions)
+    """
+    if needs_transform:
+        from PIL import Image
+        from redstone_lenet import binarize_image, custom_skeletonize
+        # 每个分片单独设种子，结果与进程数无关
+        np.random.seed(seed + shard_id)
+        images = np.stack([custom_skeletonize(binarize_image(Image.fromarray(raw))) for raw in images])
+
+    if _engine == "batch":
+        from redstone_lenet_forward import predict_batch
+        preds = predict_batch(images, _weights)
+    elif _engine == "fixed":
+        from redstone_lenet_fixed import predict_fixed
+        preds = [predict_fixed(img.tolist(), _weights) for img in images]
+    else:
+        from redstone_lenet_forward import predict
+        preds = [predict(img.tolist(), _weights) for img in images]
+    return shard_id, np.asarray(preds, dtype=np.int64)
+
+# ===== 评估 =====
+
+def evaluate(images, labels, needs_transform, weights_path, workers=1, engine="batch", chunk=256, seed=0, progress=True):
+    """
+    把样本分片交给进程池，按完成顺序流式汇总
+    return: dict，包括 accuracy / per_class / confusion / images_per_s
+    """
+    confusion = np.zeros((10, 10), dtype=np.int64)
+    total = len(labels)
+    done = 0
+    start = time.perf_counter()
+    shards = [(i, slice(s, s + chunk)) for i, s in enumerate(range(0, total, chunk))]
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(weights_path, engine)) as pool:
+        futures = {pool.submit(_run_shard, i, images[sl], needs_transform, seed): sl for i, sl in shards}
+        for future in as_completed(futures):
+            _, preds = future.result()
+            np.add.at(confusion, (labels[futures[future]], preds), 1)
+            done += len(preds)
+            if progress:
+                elapsed = time.perf_counter() - start
+                correct = np.trace(confusion)
+                print(f"[{done}/{total}] accuracy {100 * correct / done:.2f}%  {done / elapsed:.0f} images/s", flush=True)
+    elapsed = time.perf_counter() - start
+
+    per_class = np.diag(confusion) / np.maximum(confusion.sum(axis=1), 1)
+    return {
+        "total": total,
+        "accuracy": np.trace(confusion) / max(total, 1),
+        "per_class": per_class,
+        "confusion": confusion,
+        "seconds": elapsed,
+        "images_per_s": total / elapsed if elapsed > 0 else float("inf"),
+        "workers": workers,
+    }
+
+def print_report(result):
+    print(f"Test Accuracy on {result['total']} samples: {100 * result['accuracy']:.2f}%")
+    print(f"Throughput: {result['images_per_s']:.0f} images/s with {result['workers']} worker(s), {result['seconds']:.2f} s")
+    print("Per-class accuracy:")
+    for label, acc in enumerate(result["per_class"]):
+        count = result["confusion"][label].sum()
+        if count:
+            print(f"  {label}: {100 * acc:6.2f}%  ({count} samples)")
+    print("Confusion matrix (rows: true, cols: predicted):")
+    print("     " + "".join(f"{p:>6d}" for p in range(10)))
+    for label, row in enumerate(result["confusion"]):
+        print(f"  {label}: " + "".join(f"{v:>6d}" for v in row))
+
+def load_samples(args):
+    """return: (images, labels, needs_transform)"""
+    if args.corpus:
+        packed, labels = read_corpus(args.corpus)
+        if labels is None:
+            raise SystemExit(f"{args.corpus} 不带标签，无法评估")
+        images, labels, needs_transform = unpack_images(packed), np.asarray(labels), False
+    elif args.synthetic:
+        images, labels = synthetic_fixtures(args.synthetic, seed=args.seed)
+        needs_transform = False
+    else:
+        images, labels = load_mnist_raw(args.data, train=not args.test_split)
+        needs_transform = True
+
+    indices = np.arange(len(labels))
+    if args.label is not None:
+        indices = indices[labels == args.label]
+    if args.limit is not None and args.limit < len(indices):
+        indices = np.sort(np.random.default_rng(args.seed).choice(indices, args.limit, replace=False))
+    return images[indices], np.asarray(labels[indices], dtype=np.int64), needs_transform
+
+def main(argv=None):
+    from classify import default_weights_path
+
+    parser = argparse.ArgumentParser(description="Parallel accuracy evaluation of the manual RedstoneLeNet forward pass")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--data", default="./data", help="directory containing MNIST/raw (torchvision layout)")
+    source.add_argument("--corpus", help="labelled .rlp corpus of 0/1 images")
+    source.add_argument("--synthetic", type=int, help="generate this many jittered pre_draw fixtures instead")
+    parser.add_argument("--test-split", action="store_true", help="use t10k instead of the training split")
+    parser.add_argument("--label", type=int, default=None, help="only evaluate samples with this label")
+    parser.add_argument("--limit", type=int, default=None, help="random sample size")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--engine", choices=ENGINES, default="batch")
+    parser.add_argument("--chunk", type=int, default=256, help="samples per shard")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--weights", default=None)
+    parser.add_argument("--scaling", action="store_true", help="repeat with 1, 2, 4, ... workers and report the speedup")
+    parser.add_argument("--quiet", action="store_true", help="do not stream per-shard progress")
+    args = parser.parse_args(argv)
+
+    weights_path = args.weights or default_weights_path()
+    images, labels, needs_transform = load_samples(args)
+
+    if args.scaling:
+        counts = sorted({1 << i for i in range(args.workers.bit_length()) if 1 << i <= args.workers} | {args.workers})
+        base = None
+        for workers in counts:
+            result = evaluate(images, labels, needs_transform, weights_path, workers, args.engine, args.chunk, args.seed, progress=False)
+            base = base or result["images_per_s"]
+            print(f"{workers:3d} worker(s): {result['images_per_s']:10.0f} images/s  speedup {result['images_per_s'] / base:5.2f}x  "
+                  f"accuracy {100 * result['accuracy']:.2f}%")
+        return 0
+
+    result = evaluate(images, labels, needs_transform, weights_path, args.workers, args.engine, args.chunk, args.seed,
+                      progress=not args.quiet)
+    print_report(result)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,21 @@
+import torch
+from redstone_lenet_class import RedstoneLeNet
+from redstone_lenet_weights import write_compiled_weights, file_sha256
+from redstone_float_array import write_redstone_weights
+
+# Load the trained model
+model = RedstoneLeNet()
+model.load_state_dict(torch.load("redstone_lenet.pth", map_location=torch.device('cpu')))
+model.eval()
+
+# 导出为不依赖 torch 的 .rlw 文件，供 load_compiled_weights 用 mmap 加载
+state_dict = {name: param.detach().cpu().numpy() for name, param in model.state_dict().items()}
+write_compiled_weights("redstone_lenet.rlw", state_dict, file_sha256("redstone_lenet.pth"))
+
+for name, value in state_dict.items():
+    print(f"[LAYER]: {name} | [SHAPE]: {tuple(value.shape)}")
+print("Wrote redstone_lenet.rlw")
+
+# 建造机器用的红石浮点数编码（rsr 之后的权重），整层一次性转换
+write_redstone_weights("redstone_lenet_weights.txt", state_dict)
+print("Wrote redstone_lenet_weights.txt")
@@ -1,53 +1,120 @@
 import math
 
 
+MANTISSA_COLORS = ["white", "orange", "magenta", "light_blue", "yellow", "lime", "pink", "gray",
+                   "light_gray", "cyan", "purple", "blue", "brown", "green", "red", "black"]
+EXPONENT_COLORS = ["white", "orange", "magenta", "light_blue", "yellow", "lime", "pink", "gray"]
+MANTISSA_BITS = 16
+EXPONENT_BITS = 8
+
+
 class RedstoneFloat:
-    def __init__(self, s: str, M: dict[str: int], E: dict[str: int]):
+    # 内部只存符号位和两个整数：
+    #   mantissa: 16 位整数，最高位为 white (2^-1)，最低位为 black (2^-16)，即尾数 = mantissa / 2^16
+    #   exponent: 8 位整数，最低位为 white (2^0)，实际表示的数为 尾数 * 2^(2-exponent)
+    # 颜色字典 M / E 只在访问时才计算
+    __slots__ = ("sign", "mantissa", "exponent")
+
+    def __init__(self, s, M, E):
         """
-        :param s: 符号位，'obsidian' 表示 1，'' 表示 0
-        :param M: 尾数部分，dict 形式的 16 色
-        :param E: 指数部分，dict 形式的 8 色混凝土
+        :param s: 符号位，'obsidian' 表示 1，'' 表示 0（也可以直接给 0/1）
+        :param M: 尾数部分，dict 形式的 16 色，或 16 位整数
+        :param E: 指数部分，dict 形式的 8 色混凝土，或 8 位整数
         """
-        self.s = s  # 直接存储字符串，如 'obsidian' 或 ''
-        self.M = M  # 以字典存储尾数部分
-        self.E = E  # 以字典存储指数部分
-    
+        self.sign = int('obsidian' in s) if isinstance(s, str) else int(bool(s))
+        self.mantissa = M if isinstance(M, int) else self._pack_mantissa(M)
+        self.exponent = E if isinstance(E, int) else self._pack_exponent(E)
+
+    @staticmethod
+    def _pack_mantissa(M: dict[str: int]) -> int:
+        value = 0
+        for color in MANTISSA_COLORS:
+            value = (value << 1) | (M.get(color, 0) > 0)
+        return value
+
+    @staticmethod
+    def _pack_exponent(E: dict[str: int]) -> int:
+        value = 0
+        for i, color in enumerate(EXPONENT_COLORS):
+            if E.get(color, 0) > 0:
+                value |= 1 << i
+        return value
+
+    @property
+    def s(self) -> str:
+        return 'obsidian' if self.sign else ''
+
+    @s.setter
+    def s(self, s):
+        self.sign = int('obsidian' in s) if isinstance(s, str) else int(bool(s))
+
+    @property
+    def M(self) -> dict[str: int]:
+        """尾数的 16 色字典视图，每次访问重新生成，修改它不会影响本对象"""
+        return {color: (self.mantissa >> (MANTISSA_BITS - 1 - i)) & 1 for i, color in enumerate(MANTISSA_COLORS)}
+
+    @M.setter
+    def M(self, M):
+        self.mantissa = M if isinstance(M, int) else self._pack_mantissa(M)
+
+    @property
+    def E(self) -> dict[str: int]:
+        """指数的 8 色混凝土字典视图，每次访问重新生成，修改它不会影响本对象"""
+        return {color: (self.exponent >> i) & 1 for i, color in enumerate(EXPONENT_COLORS)}
+
+    @E.setter
+    def E(self, E):
+        self.exponent = E if isinstance(E, int) else self._pack_exponent(E)
+
     def _decode_mantissa(self) -> float:
         """
-        仅to_float使用
-        将集合转换为尾数的浮点数表示
+        将尾数转换为浮点数表示
+        依次表示 2^(-1), 2^(-2), 2^(-3), ..., 2^(-16)
         """
-        value = 0
-        colors = ["white", "orange", "magenta", "light_blue", "yellow", "lime", "pink", "gray", 
-                  "light_gray", "cyan", "purple", "blue", "brown", "green", "red", "black"]
-        # 依次表示 2^(-1), 2^(-2), 2^(-3), ..., 2^(-16)
-        for i, color in enumerate(colors):
-            if self.M[color] > 0:
-                value += 2 ** (-i-1)
-        return value
+        return self.mantissa / (1 << MANTISSA_BITS)
     
     def _decode_exponent(self) -> int:
         """
-        仅to_float使用
         将混凝土集合转换为指数的整数表示
+        依次表示 2^0=1, 2^1=2, 2^2=4, ..., 2^(7)=128
+        但有偏移量 -2，且需要的指数多为负数，所以最终运算时应该是2^(2-value)
+        例如：假如有 white, orange, magenta, 则 value = 1 + 2 + 4 = 7，实际表示的指数为 2^(2-7) = 2^(-5)
+        最大可表示的数为 2^(2-0) = 2^2 = 4，最小可表示的数为 2^( 2 - (1+2+4+8...+128) ) = 2^(-253)
         """
-        value = 0
-        colors = ["white", "orange", "magenta", "light_blue", "yellow", "lime", "pink", "gray"]
-        # 依次表示 2^0=1, 2^1=2, 2^2=4, ..., 2^(7)=128
-        # 但有偏移量 -2，且需要的指数多为负数，所以最终运算时应该是2^(2-value)
-        for i, color in enumerate(colors):
-            if self.E[color] > 0:
-                value += 2 ** (i)
-        # 例如：假如有 white, orange, magenta, 则 value = 1 + 2 + 4 = 7，实际表示的指数为 2^(2-7) = 2^(-5)
-        # 最大可表示的数为 2^(2-0) = 2^2 = 4，最小可表示的数为 2^( 2 - (1+2+4+8...+128) ) = 2^(-253)
-        return value
+        return self.exponent
     
-    def to_float(self) -> float:
-        sign = (-1) ** (self.s == 'obsidian')
-        mantissa = self._decode_mantissa()
-        exponent = self._decode_exponent()
-        print(f"sign: {sign}, mantissa: {mantissa}, exponent: {-exponent}(+2)")
-        return sign * mantissa * (2**(2-exponent))
+    def to_float(self, verbose: bool = False) -> float:
+        sign = -1 if self.sign else 1
+        if verbose:
+            print(f"sign: {sign}, mantissa: {self._decode_mantissa()}, exponent: {-self.exponent}(+2)")
+        return sign * math.ldexp(self.mantissa, 2 - self.exponent - MANTISSA_BITS)
+
+    @staticmethod
+    def from_float(value: float) -> 'RedstoneFloat':
+        """
+        直接由浮点数构造，结果与 from_string(redstr(value)) 相同，但不经过字符串
+        尾数截断（而非舍入）到 16 位
+        """
+        if value == 0:
+            return RedstoneFloat(0, 0, 0)
+        if not math.isfinite(value):
+            raise ValueError(f"Cannot encode {value}")
+
+        # 归一化 mantissa 到 [0.5, 1)
+        mantissa, exponent = math.frexp(abs(value))
+
+        # 偏移 +2 进入编码阶段（实际存储的是 -exponent）
+        exponent_val = 2 - exponent
+        if exponent_val < 0 or exponent_val >= 256:
+            raise ValueError("Exponent out of range for 8-bit encoding")
+
+        return RedstoneFloat(int(value < 0), int(mantissa * (1 << MANTISSA_BITS)), exponent_val)
+
+    def to_string(self) -> str:
+        """转为 ".mantissa e -exponent (+2)" 形式，与 redstr 的格式相同"""
+        sign_str = '-' if self.sign else ''
+        mantissa_bits = format(self.mantissa, '016b').rstrip('0') or '0'
+        return f"{sign_str}.{mantissa_bits}e-{self.exponent:b}(+2)"
 
     @staticmethod
     def from_string(encoded: str) -> 'RedstoneFloat':
@@ -64,80 +131,18 @@ class RedstoneFloat:
 
         sign_str, mantissa_str, exponent_str = match.groups()
 
-        # 解析符号
-        s = 'obsidian' if sign_str == '-' else ''
-
-        # 填补 mantissa 和 exponent 到固定长度
+        # 填补 mantissa 到固定长度，非0的位都视为1
         mantissa_str = mantissa_str.ljust(16, '0')
-        exponent_str = exponent_str.rjust(8, '0')
-
-        # 颜色映射
-        mantissa_colors = ["white", "orange", "magenta", "light_blue", "yellow", "lime", "pink", "gray",
-                           "light_gray", "cyan", "purple", "blue", "brown", "green", "red", "black"]
-        exponent_colors = ["white", "orange", "magenta", "light_blue", "yellow", "lime", "pink", "gray"]
-
-        # 构造 M 字典
-        M = {
-            color: int(bit)
-            for color, bit in zip(mantissa_colors, mantissa_str)
-        }
-
-        # 构造 E 字典
-        exponent_bits = list(map(int, exponent_str))
-        # print(f"exponent_str:{exponent_str}, exponent_bits:{exponent_bits}")
-        exponent_value = sum(b << i for i, b in enumerate(reversed(exponent_bits)))  # interpret as binary
-        # print(f"exponent_value:{exponent_value}")
-        E = {}
-        for i, color in enumerate((exponent_colors)):
-            bit = (exponent_value >> i) & 1
-            E[color] = bit
-
-        return RedstoneFloat(s, M, E)
+        mantissa = int(''.join('0' if bit == '0' else '1' for bit in mantissa_str), 2)
+
+        # interpret as binary，只保留 8 位
+        exponent = sum(int(b) << i for i, b in enumerate(reversed(exponent_str))) & 0xFF
+
+        return RedstoneFloat(int(sign_str == '-'), mantissa, exponent)
     
     @staticmethod
     def redstr(value: float) -> str:
-
-        if value == 0:
-            return ".0e-0(+2)"
-
-        # 处理符号
-        sign_str = '-' if value < 0 else ''
-        abs_value = abs(value)
-
-        # 拆分为尾数与指数
-        exponent = math.floor(math.log2(abs_value))
-        mantissa = abs_value / (2 ** exponent)
-
-        # 归一化 mantissa 到 [0.5, 1)
-        if mantissa >= 1:
-            mantissa /= 2
-            exponent += 1
-
-        exponent -= 2  # 偏移 +2 进入编码阶段（实际存储的是 -exponent）
-
-        # 构造 mantissa 位串
-        mantissa_bits = ''
-        remaining = mantissa
-        for i in range(16):
-            bit_value = 2 ** (-i - 1)
-            if remaining >= bit_value:
-                mantissa_bits += '1'
-                remaining -= bit_value
-            else:
-                mantissa_bits += '0'
-
-        # 去除 mantissa 尾部 0
-        mantissa_bits = mantissa_bits.rstrip('0') or '0'
-
-        # 构造 exponent 位串（处理为 -exponent，正整数形式）
-        exponent_val = -exponent
-        if exponent_val < 0 or exponent_val >= 256:
-            raise ValueError("Exponent out of range for 8-bit encoding")
-
-        exponent_bits = bin(exponent_val)[2:].zfill(8)
-        exponent_bits = exponent_bits.lstrip('0') or '0'
-
-        return f"{sign_str}.{mantissa_bits}e-{exponent_bits}(+2)"
+        return RedstoneFloat.from_float(value).to_string()
     
     def __repr__(self):
         def format_dict(d, start_index, end_index, itemtype):
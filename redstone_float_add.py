@@ -0,0 +1,119 @@
+# 红石浮点数的加法，由与乘法相同的部件拼成：
+#   1. 两个操作数先经过 formating 标准化（尾数为 0 的操作数不参与运算，结果直接取另一个）
+#   2. 比较指数（指数箱中的值越小数越大，相同时比较尾数），得到绝对值较大的 big 和较小的 small
+#   3. 对阶：small 的尾数经过位移装置向 black 方向移动 e_small - e_big 位，移出 black 的物品直接丢弃
+#   4. 同号时两个尾数混合到一个箱子里逐位进位；white 再向上进位时整体右移一位（black 丢弃），
+#      指数箱投入 8 个物品（-1 的补码）减 1，gray 之外的进位与 exponent_add 一样丢弃，即指数回绕
+#   5. 异号时 big 的尾数逐位减去 small 的尾数（从 black 往 white 借位），再经过 formating 标准化
+#   6. 符号取 big 的符号；完全抵消时结果为 0
+from redstone_float import RedstoneFloat as rf
+from redstone_float_multiply import formating, formating_fast
+
+MANTISSA_COLORS = ["white", "orange", "magenta", "light_blue", "yellow", "lime", "pink", "gray",
+                   "light_gray", "cyan", "purple", "blue", "brown", "green", "red", "black"]
+EXPONENT_COLORS = ["white", "orange", "magenta", "light_blue", "yellow", "lime", "pink", "gray"]
+
+
+def mantissa_align(m: dict[str: int], shift: int) -> dict[str: int]:
+    """模拟对阶：尾数向 black 方向移动 shift 位，移出 black 的物品丢弃"""
+    result = dict(m)
+    for _ in range(min(shift, len(MANTISSA_COLORS))):
+        # 实际过程中是一次位移装置：每个颜色的物品移到下一个颜色，从 black 往前依次移动
+        result["black"] = 0
+        for color, next_color in zip(MANTISSA_COLORS[-2::-1], MANTISSA_COLORS[:0:-1]):
+            result[next_color] += result[color]
+            result[color] = 0
+    if shift >= len(MANTISSA_COLORS):
+        result = {color: 0 for color in MANTISSA_COLORS}
+    return result
+
+def mantissa_add(m_a: dict[str: int], m_b: dict[str: int]) -> tuple[dict[str: int], bool]:
+    """
+    模拟尾数相加
+    return: (结果, white 是否向上进位)
+    """
+    result = {color: m_a[color] + m_b[color] for color in MANTISSA_COLORS} # 模拟直接混合到一个箱子里
+    carry_out = False
+    # 实际过程中应该是16次有序的独立的检测，从末往前进位
+    for i in range(len(MANTISSA_COLORS) - 1, -1, -1):
+        color = MANTISSA_COLORS[i]
+        while result[color] >= 2: # 存量转信器发出信号
+            result[color] -= 2 # 信号指示黄铜漏斗漏掉2个物品
+            if i: result[MANTISSA_COLORS[i - 1]] += 1 # 信号指示投入一个物品表示进位
+            else: carry_out = True
+    return result, carry_out
+
+def mantissa_subtract(m_big: dict[str: int], m_small: dict[str: int]) -> dict[str: int]:
+    """模拟尾数相减，m_big 不小于 m_small"""
+    result = dict(m_big)
+    # 从 black 往 white 逐位检测，不够减时向上一个颜色借一个物品（在本颜色记为 2 个）
+    for i in range(len(MANTISSA_COLORS) - 1, -1, -1):
+        color = MANTISSA_COLORS[i]
+        if result[color] < m_small[color]:
+            result[MANTISSA_COLORS[i - 1]] -= 1
+            result[color] += 2
+        result[color] -= m_small[color]
+    return result
+
+def exponent_decrement(e: dict[str: int]) -> dict[str: int]:
+    """模拟指数减 1：投入 8 个物品（-1 的补码），gray 之外的进位丢弃"""
+    result = {color: e.get(color, 0) + 1 for color in EXPONENT_COLORS}
+    for i, color in enumerate(EXPONENT_COLORS):
+        while result[color] >= 2:
+            result[color] -= 2
+            if i + 1 < len(EXPONENT_COLORS): result[EXPONENT_COLORS[i + 1]] += 1
+    return result
+
+def adding(a: rf, b: rf, fast: bool = False) -> rf:
+    """
+    实现红石浮点数加法，步骤见文件开头的说明
+    fast: 为True时用整数运算直接算出结果（adding_fast），不逐个物品模拟
+    """
+    if fast: return adding_fast(a, b)
+
+    # 尾数为 0 时 formating 不会结束，先检测
+    if a.mantissa == 0: return b if b.mantissa == 0 else formating(b)
+    if b.mantissa == 0: return formating(a)
+    a, b = formating(a), formating(b)
+
+    # 指数小的数大，指数相同时比较尾数（从 white 往 black 逐位比较）
+    a_big = a.exponent < b.exponent or (a.exponent == b.exponent and a.mantissa >= b.mantissa)
+    big, small = (a, b) if a_big else (b, a)
+    aligned = mantissa_align(small.M, small.exponent - big.exponent)
+
+    if big.sign == small.sign:
+        raw_M, carry_out = mantissa_add(big.M, aligned)
+        raw_E = big.E
+        if carry_out:
+            raw_M = mantissa_align(raw_M, 1)
+            raw_M["white"] = 1
+            raw_E = exponent_decrement(raw_E)
+        return rf(big.s, raw_M, raw_E)
+
+    raw_M = mantissa_subtract(big.M, aligned)
+    if not any(raw_M.values()): return rf('', 0, 0)
+    return formating(rf(big.s, raw_M, big.E))
+
+# ===== 整数快速路径 =====
+# 结果与上面逐个物品模拟的版本完全相同
+
+def adding_fast(a: rf, b: rf) -> rf:
+    """adding 的整数版本"""
+    if a.mantissa == 0: return b if b.mantissa == 0 else formating_fast(b)
+    if b.mantissa == 0: return formating_fast(a)
+    a, b = formating_fast(a), formating_fast(b)
+
+    a_big = a.exponent < b.exponent or (a.exponent == b.exponent and a.mantissa >= b.mantissa)
+    big, small = (a, b) if a_big else (b, a)
+    shift = small.exponent - big.exponent
+    aligned = small.mantissa >> shift if shift < 16 else 0
+
+    if big.sign == small.sign:
+        mantissa = big.mantissa + aligned
+        if mantissa >> 16:
+            return rf(big.sign, mantissa >> 1, (big.exponent - 1) & 0xFF)
+        return rf(big.sign, mantissa, big.exponent)
+
+    mantissa = big.mantissa - aligned
+    if mantissa == 0: return rf(0, 0, 0)
+    return formating_fast(rf(big.sign, mantissa, big.exponent))
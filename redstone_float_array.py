@@ -0,0 +1,349 @@
+# 红石浮点数的向量化运算：一批数用三个 NumPy int64 数组 (sign, mantissa, exponent) 表示，
+# 含义与 RedstoneFloat 的 sign / mantissa / exponent 相同：
+#   数值 = (-1)^sign * mantissa / 2^16 * 2^(2-exponent)，mantissa 为 16 位，exponent 为 8 位
+# multiply 与 redstone_float_multiply.multiplying（以及 multiplying_fast）逐位一致。
+# add 与 redstone_float_add.adding（以及 adding_fast）逐位一致。
+# RedstoneFloatArray 把这三个数组包成一个类型，支持批量的浮点数 / 字符串转换，用于一次性导出整层权重：
+#   python redstone_float_array.py      # 与逐个调用 RedstoneFloat 比较速度
+import re
+
+import numpy as np
+
+MANTISSA_BITS = 16
+MANTISSA_MASK = (1 << MANTISSA_BITS) - 1
+EXPONENT_MASK = 0xFF
+WHITE = 1 << (MANTISSA_BITS - 1)  # 尾数最高位 2^-1
+
+def zeros(shape):
+    return (np.zeros(shape, dtype=np.int64), np.zeros(shape, dtype=np.int64), np.zeros(shape, dtype=np.int64))
+
+def full(shape, value):
+    """shape 形状、每个元素都等于 value 的红石浮点数组"""
+    s, m, e = encode(value)
+    return (np.full(shape, s, dtype=np.int64), np.full(shape, m, dtype=np.int64), np.full(shape, e, dtype=np.int64))
+
+def encode(values):
+    """
+    浮点数组 → (sign, mantissa, exponent)，与 RedstoneFloat.from_float 逐个相同（尾数截断到 16 位）
+    """
+    values = np.asarray(values, dtype=np.float64)
+    if not np.all(np.isfinite(values)):
+        raise ValueError("Cannot encode inf / nan")
+    frac, exp = np.frexp(np.abs(values))  # frac 在 [0.5, 1)
+    nonzero = values != 0
+    exponent = np.where(nonzero, 2 - exp.astype(np.int64), 0)
+    if np.any((exponent < 0) | (exponent > EXPONENT_MASK)):
+        raise ValueError("Exponent out of range for 8-bit encoding")
+    mantissa = np.floor(frac * (1 << MANTISSA_BITS)).astype(np.int64)
+    sign = (values < 0).astype(np.int64)
+    return sign, mantissa, exponent
+
+def decode(x):
+    """(sign, mantissa, exponent) → float64 数组，与 RedstoneFloat.to_float 逐个相同"""
+    s, m, e = x
+    return np.where(s == 1, -1.0, 1.0) * np.ldexp(m.astype(np.float64), (2 - e - MANTISSA_BITS).astype(np.int32))
+
+def bit_length(m):
+    """非负 int64 数组的 bit_length，m < 2^53"""
+    return np.where(m > 0, np.frexp(m.astype(np.float64))[1], 0).astype(np.int64)
+
+def _count(stats, key, mask):
+    if stats is not None:
+        stats[key] = stats.get(key, 0) + int(np.count_nonzero(mask))
+
+def normalize(x, stats=None):
+    """
+    与 formating 相同：尾数左移到 white 为 1，每移一位指数加 1（超出 8 位时回绕）
+    尾数为 0 时原样返回
+    """
+    s, m, e = x
+    shift = np.where(m > 0, MANTISSA_BITS - bit_length(m), 0)
+    e = e + shift
+    _count(stats, "exponent_wrap", e > EXPONENT_MASK)
+    return s, m << shift, e & EXPONENT_MASK
+
+def multiply(a, b, formatting=True, stats=None):
+    """
+    逐元素乘法，与 multiplying(a, b, formatting) 相同（支持广播）
+    a 的每一位是一个检测通道，开启时把 b 的尾数右移后累加，每个部分积单独截断
+    """
+    sa, ma, ea, sb, mb, eb = np.broadcast_arrays(*a, *b)
+    sign = sa ^ sb
+
+    # 指数相加，再加上补码表示的 -2
+    exponent = ea + eb - 2
+    # 0 的指数没有意义，只统计两个操作数都非 0 时的回绕
+    _count(stats, "exponent_wrap", (ma > 0) & (mb > 0) & ((exponent < 0) | (exponent > EXPONENT_MASK)))
+    exponent = exponent & EXPONENT_MASK
+
+    mantissa = np.zeros(sign.shape, dtype=np.int64)
+    for i in range(MANTISSA_BITS):
+        mantissa += ((ma >> (MANTISSA_BITS - 1 - i)) & 1) * (mb >> (i + 1))
+    mantissa &= MANTISSA_MASK
+
+    if not formatting:
+        return sign, mantissa, exponent
+    return normalize((sign, mantissa, exponent), stats)
+
+def add(a, b, stats=None):
+    """
+    逐元素加法（支持广播），与 adding(a, b) 相同
+    同号相加进位后指数减 1 越过 0 时回绕（绝对值达到 4），计入 stats["overflow"]；
+    异号相减后标准化使指数超过 255 时同样回绕，计入 stats["underflow"]
+    """
+    a, b = tuple(a), tuple(b)
+    a_zero = a[1] == 0
+    b_zero = b[1] == 0
+    sa, ma, ea, sb, mb, eb = np.broadcast_arrays(*normalize(a), *normalize(b))
+
+    # 按绝对值排序：指数越小数越大
+    a_big = (ea < eb) | ((ea == eb) & (ma >= mb))
+    s_big, m_big, e_big = np.where(a_big, sa, sb), np.where(a_big, ma, mb), np.where(a_big, ea, eb)
+    s_small, m_small, e_small = np.where(a_big, sb, sa), np.where(a_big, mb, ma), np.where(a_big, eb, ea)
+
+    # 对阶：较小数的尾数右移，移出的位截断
+    d = e_small - e_big
+    aligned = np.where(d < MANTISSA_BITS, m_small >> np.clip(d, 0, MANTISSA_BITS), 0)
+    same = s_big == s_small
+    m = np.where(same, m_big + aligned, m_big - aligned)
+    e = e_big
+
+    # 同号相加时尾数进位：右移一位（截断），指数减 1
+    carry = m > MANTISSA_MASK
+    _count(stats, "overflow", carry & (e == 0) & ~a_zero & ~b_zero)
+    m = np.where(carry, m >> 1, m)
+    e = np.where(carry, (e - 1) & EXPONENT_MASK, e)
+
+    # 异号相减之后重新标准化，完全抵消时为 0
+    shift = np.where(m > 0, MANTISSA_BITS - bit_length(m), 0)
+    e = e + shift
+    _count(stats, "underflow", (e > EXPONENT_MASK) & ~a_zero & ~b_zero)
+    zero = m == 0
+    s = np.where(zero, 0, s_big)
+    m = np.where(zero, 0, m << shift)
+    e = np.where(zero, 0, e & EXPONENT_MASK)
+
+    # 任一操作数为 0 时直接取另一个（标准化之后）；两个都为 0 时取 b
+    s = np.where(a_zero, sb, np.where(b_zero, sa, s))
+    m = np.where(a_zero, mb, np.where(b_zero, ma, m))
+    e = np.where(a_zero, eb, np.where(b_zero, ea, e))
+    return s, m, e
+
+def clamp_magnitude(x, limit):
+    """
+    把绝对值截断到 limit 以内，limit 为单个红石浮点数（已标准化），符号不变
+    """
+    s, m, e = x
+    _, lm, le = limit
+    above = (m > 0) & ((e < le) | ((e == le) & (m > lm)))
+    return s, np.where(above, lm, m), np.where(above, le, e)
+
+def take(x, index, axis=0):
+    return tuple(np.take(part, index, axis=axis) for part in x)
+
+def reshape(x, shape):
+    return tuple(part.reshape(shape) for part in x)
+
+def expand(x, axis):
+    return tuple(np.expand_dims(part, axis) for part in x)
+
+# ===== 数组类型 =====
+
+_TEXT_PATTERN = re.compile(r'^(-?)\.([0-9]{1,16})e-([0-9]{1,8})\(\+2\)$', re.MULTILINE)
+
+class RedstoneFloatArray:
+    """
+    一批红石浮点数，sign / mantissa / exponent 各是一个同形状的 int64 数组
+        w = RedstoneFloatArray.from_float(weights)   # 与逐个 RedstoneFloat.from_float 相同
+        w.to_strings()                                # 与逐个 redstr 相同
+        (x * w).to_float()                            # 与逐个 multiplying(x, w, True) 相同
+    可以像 (sign, mantissa, exponent) 元组一样解包，直接传给本模块的 multiply / add 等函数
+    """
+    __slots__ = ("sign", "mantissa", "exponent")
+
+    def __init__(self, sign, mantissa, exponent):
+        self.sign, self.mantissa, self.exponent = (np.asarray(part, dtype=np.int64)
+                                                   for part in np.broadcast_arrays(sign, mantissa, exponent))
+
+    def __iter__(self):
+        return iter((self.sign, self.mantissa, self.exponent))
+
+    @property
+    def shape(self):
+        return self.mantissa.shape
+
+    def __len__(self):
+        return len(self.mantissa)
+
+    def __getitem__(self, index):
+        return RedstoneFloatArray(self.sign[index], self.mantissa[index], self.exponent[index])
+
+    def reshape(self, *shape):
+        return RedstoneFloatArray(*reshape(self, shape[0] if len(shape) == 1 else shape))
+
+    def __eq__(self, other):
+        """逐元素比较三个字段，返回 bool 数组"""
+        s, m, e = other
+        return (self.sign == s) & (self.mantissa == m) & (self.exponent == e)
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"RedstoneFloatArray(shape={self.shape}, values={self.to_float()!r})"
+
+    @staticmethod
+    def from_float(values) -> 'RedstoneFloatArray':
+        """浮点数组（或 torch tensor 转成的 NumPy 数组）一次性编码，尾数截断到 16 位"""
+        return RedstoneFloatArray(*encode(values))
+
+    def to_float(self) -> np.ndarray:
+        return decode(self)
+
+    @staticmethod
+    def from_scalars(values) -> 'RedstoneFloatArray':
+        """RedstoneFloat 的列表 → 一维数组"""
+        values = list(values)
+        return RedstoneFloatArray([v.sign for v in values], [v.mantissa for v in values], [v.exponent for v in values])
+
+    def to_scalars(self) -> list:
+        """按展平的顺序转成 RedstoneFloat 的列表"""
+        from redstone_float import RedstoneFloat
+        return [RedstoneFloat(int(s), int(m), int(e))
+                for s, m, e in zip(self.sign.ravel(), self.mantissa.ravel(), self.exponent.ravel())]
+
+    def to_strings(self) -> np.ndarray:
+        """
+        转为 ".mantissa e -exponent (+2)" 形式的字符串数组，形状不变，每个元素与 RedstoneFloat.to_string 相同
+        """
+        n = self.mantissa.size
+        # 每一位变成一个 '0' / '1' 字节，整行按定长字节串看待
+        m_bits = ((self.mantissa.reshape(n, 1) >> np.arange(MANTISSA_BITS - 1, -1, -1)) & 1).astype(np.uint8)
+        e_bits = ((self.exponent.reshape(n, 1) >> np.arange(7, -1, -1)) & 1).astype(np.uint8)
+        mantissa = np.char.rstrip((m_bits + ord('0')).view(f"S{MANTISSA_BITS}").ravel(), b'0')
+        exponent = np.char.lstrip((e_bits + ord('0')).view("S8").ravel(), b'0')
+        mantissa[mantissa == b''] = b'0'
+        exponent[exponent == b''] = b'0'
+
+        text = np.where(self.sign.ravel() == 1, b'-.', b'.')
+        for part in (mantissa, b'e-', exponent, b'(+2)'):
+            text = np.char.add(text, part)
+        return text.astype(str).reshape(self.shape)
+
+    @staticmethod
+    def from_strings(strings) -> 'RedstoneFloatArray':
+        """
+        to_strings 的逆操作，每个元素与 RedstoneFloat.from_string 相同：
+        尾数补齐到 16 位、非 0 的位都视为 1，指数按二进制解释后只保留 8 位
+        """
+        strings = np.asarray(strings, dtype=str)
+        flat = strings.ravel().tolist()
+        text = "\n".join(flat)
+        groups = _TEXT_PATTERN.findall(text)
+        if len(groups) != len(flat) or text.count("\n") != max(len(flat) - 1, 0):
+            raise ValueError("Invalid format. Expected format: (-?).[01]{1,16}e-[01]{1,8}(+2)")
+        if not groups:
+            return RedstoneFloatArray(*zeros(strings.shape))
+        signs, mantissas, exponents = zip(*groups)
+
+        sign = np.array([s == '-' for s in signs], dtype=np.int64)
+        m_digits = np.array(mantissas, dtype=f"S{MANTISSA_BITS}").view(np.uint8).reshape(-1, MANTISSA_BITS)
+        m_bits = (m_digits != 0) & (m_digits != ord('0'))  # 不足 16 位的部分是 \0
+        mantissa = m_bits.astype(np.int64) @ (1 << np.arange(MANTISSA_BITS - 1, -1, -1))
+
+        e_digits = np.array(exponents, dtype="S8").view(np.uint8).reshape(-1, 8).astype(np.int64)
+        length = np.count_nonzero(e_digits, axis=1)[:, None]
+        shift = length - 1 - np.arange(8)  # 每个字符在二进制中的位置，从右往左
+        valid = shift >= 0
+        exponent = np.sum(np.where(valid, (e_digits - ord('0')) << np.where(valid, shift, 0), 0), axis=1)
+        exponent &= EXPONENT_MASK
+        return RedstoneFloatArray(sign, mantissa, exponent).reshape(strings.shape)
+
+    def multiply(self, other, formatting=True, stats=None) -> 'RedstoneFloatArray':
+        """逐元素乘法（支持广播），与 multiplying(self, other, formatting) 相同"""
+        return RedstoneFloatArray(*multiply(self, other, formatting, stats))
+
+    def __mul__(self, other):
+        return self.multiply(other)
+
+    def __add__(self, other):
+        return RedstoneFloatArray(*add(self, other))
+
+    def formating(self) -> 'RedstoneFloatArray':
+        """与 formating 相同的标准化"""
+        return RedstoneFloatArray(*normalize(self))
+
+def weights_to_redstone(weight_dict, quantize=True):
+    """
+    整个权重字典一次性转成 {name: RedstoneFloatArray}，形状不变
+    quantize: 先 rsr 到 2^-14 的整数倍，与 predict 使用的权重相同
+    """
+    if quantize:
+        from redstone_lenet_forward import rsr_array
+    converted = {}
+    for name, value in weight_dict.items():
+        value = np.asarray(value, dtype=np.float64)
+        converted[name] = RedstoneFloatArray.from_float(rsr_array(value) if quantize else value)
+    return converted
+
+def write_redstone_weights(filepath, weight_dict, quantize=True):
+    """
+    把每层权重的红石浮点数字符串写进文本文件，格式与 inspect_model.py 的 model_weights.txt 类似，
+    最后一维的元素写在同一行
+    """
+    with open(filepath, "w") as f:
+        for name, value in weights_to_redstone(weight_dict, quantize).items():
+            f.write(f"\n[LAYER]: {name} | [SHAPE]: {value.shape}\n")
+            strings = value.to_strings()
+            for row in strings.reshape(-1, strings.shape[-1] if strings.ndim else 1):
+                f.write(" ".join(row) + "\n")
+
+if __name__ == "__main__":
+    # 与逐个调用 RedstoneFloat 比较速度，并检查结果相同
+    import random
+    import time
+
+    from redstone_float import RedstoneFloat as rf
+    from redstone_float_multiply import multiplying_fast
+    from redstone_lenet_forward import load_weights, rsr_array
+
+    weights = load_weights("redstone_lenet.rlw")
+    flat = np.concatenate([rsr_array(np.asarray(v, dtype=np.float64)).ravel() for v in weights.values()])
+    repeat = 20
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        scalar_strings = [rf.redstr(float(v)) for v in flat]
+    t_scalar = (time.perf_counter() - start) / repeat
+    start = time.perf_counter()
+    for _ in range(repeat):
+        array_strings = RedstoneFloatArray.from_float(flat).to_strings()
+    t_array = (time.perf_counter() - start) / repeat
+    assert array_strings.tolist() == scalar_strings
+    print(f"encode {len(flat)} weights to text: scalar {1000 * t_scalar:.2f} ms, "
+          f"array {1000 * t_array:.2f} ms ({t_scalar / t_array:.1f}x)")
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        scalar_parsed = [rf.from_string(s) for s in scalar_strings]
+    t_scalar = (time.perf_counter() - start) / repeat
+    start = time.perf_counter()
+    for _ in range(repeat):
+        array_parsed = RedstoneFloatArray.from_strings(array_strings)
+    t_array = (time.perf_counter() - start) / repeat
+    assert np.all(array_parsed == RedstoneFloatArray.from_scalars(scalar_parsed))
+    print(f"parse {len(flat)} strings: scalar {1000 * t_scalar:.2f} ms, "
+          f"array {1000 * t_array:.2f} ms ({t_scalar / t_array:.1f}x)")
+
+    rng = random.Random(0)
+    a = [rf.from_float(rng.uniform(-1, 1)) for _ in range(100000)]
+    b = [rf.from_float(rng.uniform(-1.5, 1.5)) for _ in range(100000)]
+    start = time.perf_counter()
+    scalar_products = [multiplying_fast(x, y, True) for x, y in zip(a, b)]
+    t_scalar = time.perf_counter() - start
+    a_array, b_array = RedstoneFloatArray.from_scalars(a), RedstoneFloatArray.from_scalars(b)
+    start = time.perf_counter()
+    array_products = a_array * b_array
+    t_array = time.perf_counter() - start
+    assert np.all(array_products == RedstoneFloatArray.from_scalars(scalar_products))
+    print(f"multiply {len(a)} pairs: multiplying_fast {1000 * t_scalar:.1f} ms, "
+          f"array {1000 * t_array:.1f} ms ({t_scalar / t_array:.1f}x)")
@@ -1,9 +1,13 @@
 
 from redstone_float import RedstoneFloat as rf
+from redstone_float_ticks import TickCounter
 
 
-def exponent_add(e_a: dict[str: int], e_b: dict[str: int]) -> dict[str: int]:
-    """模拟指数部分相加"""
+def exponent_add(e_a: dict[str: int], e_b: dict[str: int], ticks: TickCounter = None) -> dict[str: int]:
+    """
+    模拟指数部分相加
+    ticks: 可选的 TickCounter，记录模拟过程中的检测、漏斗和投掷次数
+    """
     # colors依次表示 2^(0)=1, 2^(1)=2, 2^(2)=4, ..., 2^(7)
     # 但有偏移量 -2，且需要的指数多为负数，所以最终运算时应该是2^(2-value)
     colors = ["white", "orange", "magenta", "light_blue", "yellow", "lime", "pink", "gray"]
@@ -12,18 +16,23 @@ def exponent_add(e_a: dict[str: int], e_b: dict[str: int]) -> dict[str: int]:
     # result 提前填充补码以减去偏移量 2
     result = {color: 1 for color in colors}
     result["white"] = 0
+    # 补码的 7 个物品每次乘法都要重新投入，同样计入开销
+    if ticks: ticks.count("exponent_add", "item_insert", sum(result.values()))
 
     for color in colors:
         result[color] += (e_a.get(color, 0) + e_b.get(color, 0)) # 模拟直接混合到一个箱子里
+        if ticks: ticks.count("exponent_add", "item_insert", e_a.get(color, 0) + e_b.get(color, 0))
 
     # 实际过程中应该是8次有序的独立的检测
     for color, next_color in zip(colors, next_colors):
         while result[color] >= 2: # 存量转信器发出信号
             result[color] -= 2 # 信号指示黄铜漏斗漏掉2个物品
             if next_color: result[next_color] += 1 # 信号指示投入一个物品表示进位
+            if ticks: ticks.carry("exponent_add", bool(next_color))
+        if ticks: ticks.count("exponent_add", "comparator_check")
     return result
 
-def mantissa_multiply(m_a: dict[str: int], m_b: dict[str: int]) -> dict[str: int]:
+def mantissa_multiply(m_a: dict[str: int], m_b: dict[str: int], ticks: TickCounter = None) -> dict[str: int]:
     """模拟尾数部分相乘"""
     # colors依次表示 2^(-1), 2^(-2), 2^(-3), ..., 2^(-16)
     colors = ["white", "orange", "magenta", "light_blue", "yellow", "lime", "pink", "gray", 
@@ -45,13 +54,16 @@ def mantissa_multiply(m_a: dict[str: int], m_b: dict[str: int]) -> dict[str: int
         # print(f"chanel: {chanel}, shifted_colors: {shifted_colors}")
 
         # m_a 没有对应数字则检测通道不开启
+        if ticks: ticks.count("mantissa_channels", "comparator_check", channel=i)
         if not m_a[chanel] > 0: continue
 
         # 如前文所述，实际过程中应是0~16次独立的检测
         for color, shifted_color in zip(colors, shift_next_colors[chanel]):
             # print(f"color: {color}, shifted_color: {shifted_color}")
+            if ticks and shifted_color: ticks.count("mantissa_channels", "comparator_check", channel=i)
             if not (m_b[color]>0 and shifted_color): continue
             result[shifted_color] += 1
+            if ticks: ticks.count("mantissa_channels", "item_insert", channel=i)
     # print(f"result: {result}")
 
     # 实际过程中应该是16次有序的独立的检测
@@ -59,10 +71,12 @@ def mantissa_multiply(m_a: dict[str: int], m_b: dict[str: int]) -> dict[str: int
         while result[color] >= 2: # 存量转信器发出信号
             result[color] -= 2 # 信号指示黄铜漏斗漏掉2个物品
             if next_color: result[next_color] += 1 # 信号指示投入一个物品表示进位
-    print(f"result: {result}")
+            if ticks: ticks.carry("carry", bool(next_color))
+        if ticks: ticks.count("carry", "comparator_check")
+    # print(f"result: {result}")
     return result
 
-def formating(raw: rf) -> rf:
+def formating(raw: rf, ticks: TickCounter = None) -> rf:
     raw_E = raw.E
     raw_M = raw.M
 
@@ -74,6 +88,7 @@ def formating(raw: rf) -> rf:
     exponent_next_colors = ["orange", "magenta", "light_blue", "yellow", "lime", "pink", "gray", ""]
     
     while (raw_M["white"] < 1):
+        if ticks: ticks.count("normalize", "comparator_check", len(mantissa_colors)) # white 的检测 + 15 个颜色的检测
         epp_flag = False # 指示指数箱增加一位的flag
         for m_color, m_next in zip(mantissa_colors, mantissa_next_colors):
             if m_next and raw_M[m_color] > 0: 
@@ -81,21 +96,34 @@ def formating(raw: rf) -> rf:
                 raw_M[m_color] -= 1
                 raw_M[m_next] += 1
                 epp_flag = True
+                if ticks: ticks.move("normalize")
         # 实际过程中通过检测黄铜漏斗漏掉了物品的信号往指数箱中投掷物品
         if epp_flag: raw_E["white"] += 1
+        if ticks and epp_flag: ticks.count("normalize", "item_insert")
         # print(f"raw_E[\"white\"] = {raw_E["white"]}")
     # print(raw_E)
 
+    if ticks: ticks.count("normalize", "comparator_check") # 最后一次检测到 white 已就位
+
     # 实际过程中应该是8次有序的独立的检测
     for e_color, e_next in zip(exponent_colors, exponent_next_colors):
         while raw_E[e_color] >= 2: # 存量转信器发出信号
             raw_E[e_color] -= 2 # 信号指示黄铜漏斗漏掉2个物品
             if e_next: raw_E[e_next] += 1 # 信号指示投入一个物品表示进位
+            if ticks: ticks.carry("normalize", bool(e_next))
+        if ticks: ticks.count("normalize", "comparator_check")
 
     return rf(raw.s, raw_M, raw_E)
 
-def multiplying(a: rf, b: rf, formatting: bool = False) -> rf:
-    """实现基于位移加法的浮点数乘法"""
+def multiplying(a: rf, b: rf, formatting: bool = False, fast: bool = False, ticks: TickCounter = None) -> rf:
+    """
+    实现基于位移加法的浮点数乘法
+    fast: 为True时用整数运算直接算出结果（multiplying_fast），不逐个物品模拟
+    ticks: 可选的 TickCounter，按阶段统计模拟的操作次数（只适用于逐个模拟的路径）
+    """
+    if fast and ticks: raise ValueError("ticks 只能统计逐个模拟的路径，不能与 fast=True 同时使用")
+    if fast: return multiplying_fast(a, b, formatting)
+    if ticks: ticks.operations += 1
     
     # 模拟计算新符号位
     new_s = ''
@@ -107,73 +135,108 @@ def multiplying(a: rf, b: rf, formatting: bool = False) -> rf:
         new_s = ''
     
     # 模拟计算指数部分
-    raw_E = exponent_add(a.E, b.E)
+    raw_E = exponent_add(a.E, b.E, ticks)
     
     # 计算尾数部分（位移加法乘法）
-    raw_M = mantissa_multiply(a.M, b.M)
+    raw_M = mantissa_multiply(a.M, b.M, ticks)
 
     if not formatting: return rf(new_s, raw_M, raw_E)
 
     # 尾数部分标准化为0.1xx...，同时调整指数部分
-    r = formating(rf(new_s, raw_M, raw_E))
+    r = formating(rf(new_s, raw_M, raw_E), ticks)
     return r
 
-# 测试指数相加部分
-# e_a = {"orange": 1}
-# e_b = {"white": 1, "orange": 1}
-# print(exponent_add(e_a, e_b))
-
-# # 测试to_float和from_float
-# na = 1.4271e+00
-# # na = 0.75
-# print(rf.redstr(na))
-# a = rf.from_string(rf.redstr(na))
-# print(a)
-# print(a.to_float())
-# nb = 1.1470e-05
-# # nb = 0.421875
-# print(rf.redstr(nb))
-# b = rf.from_string(rf.redstr(nb))
-# print(b)
-# print(b.to_float())
-
-# # 测试尾数标准化步骤
-# sa = ".00001011e-1(+2)"
-# a = rf.from_string(sa)
-# # print(a)
-# print(formating(a))
-# print(rf.from_string(".1011e-101(+2)"))
-
-# 测试乘法
-print("### 乘数 a ###")
-# a = rf.from_string(rf.redstr(1.4271e+00))
-# a = rf.from_string(rf.redstr(-0.421875))
-# a = rf.from_string(rf.redstr(1.7347))
-# sa = ".11011e-111(+2)" # 0.84375 * 2^(-5)
-sa = ".00001101e-10110(+2)"
-a = rf.from_string(sa)
-print("[红石浮点数表示]")
-print(a)
-print(f"[二进制转写]\n{sa}")
-print(f"[十进制数值]")
-print(f"{a.to_float()}")
-
-print("### 乘数 b ###")
-# b = rf.from_string(rf.redstr(-1.1470e-05))
-# b = rf.from_string("-.11e-100(+2)") # -0.75 * 2^(-2)
-# b = rf.from_string(rf.redstr(1.7347))
-# sb = "-.11e-100(+2)" # -0.75 * 2^(-2)
-sb = "-.0001110001e-100010(+2)"
-b = rf.from_string(sb)
-print("[红石浮点数表示]")
-print(b)
-print(f"[二进制转写]\n{sb}")
-print(f"[十进制数值]")
-print(f"{b.to_float()}")
-
-print("### 计算结果 r ###")
-r = multiplying(a, b, True)
-print("[红石浮点数表示]")
-print(r)
-print(f"[十进制数值]")
-print(f"{r.to_float()}")
\ No newline at end of file
+# ===== 整数快速路径 =====
+# 结果与上面逐个物品模拟的版本完全相同，只是直接用整数的移位、加法和 bit_length 算出来
+# rf.mantissa 为 16 位整数（white 为最高位 2^-1），rf.exponent 为 8 位整数（white 为最低位）
+
+def exponent_add_fast(e_a: int, e_b: int) -> int:
+    """与 exponent_add 相同：加上补码表示的 -2，gray 之外的进位丢弃"""
+    return (e_a + e_b + 0b11111110) & 0xFF
+
+def mantissa_multiply_fast(m_a: int, m_b: int) -> int:
+    """
+    与 mantissa_multiply 相同：m_a 的第 i 个通道 (2^-(i+1)) 开启时，把 m_b 右移 i+1 位累加，
+    移出 black 的位直接丢弃（每个部分积单独截断），white 之外的进位丢弃
+    """
+    result = 0
+    for i in range(16):
+        if (m_a >> (15 - i)) & 1:
+            result += m_b >> (i + 1)
+    return result & 0xFFFF
+
+def formating_fast(raw: rf) -> rf:
+    """
+    与 formating 相同：尾数左移到 white 为 1，每移一位指数加 1
+    尾数为 0 时原样返回（逐个模拟的 formating 在这种情况下不会结束）
+    """
+    if raw.mantissa == 0: return rf(raw.sign, 0, raw.exponent)
+    shift = 16 - raw.mantissa.bit_length()
+    return rf(raw.sign, raw.mantissa << shift, (raw.exponent + shift) & 0xFF)
+
+def multiplying_fast(a: rf, b: rf, formatting: bool = False) -> rf:
+    """multiplying 的整数版本"""
+    raw = rf(a.sign ^ b.sign, mantissa_multiply_fast(a.mantissa, b.mantissa), exponent_add_fast(a.exponent, b.exponent))
+    if not formatting: return raw
+    return formating_fast(raw)
+
+if __name__ == "__main__":
+    # 测试指数相加部分
+    # e_a = {"orange": 1}
+    # e_b = {"white": 1, "orange": 1}
+    # print(exponent_add(e_a, e_b))
+
+    # # 测试to_float和from_float
+    # na = 1.4271e+00
+    # # na = 0.75
+    # print(rf.redstr(na))
+    # a = rf.from_string(rf.redstr(na))
+    # print(a)
+    # print(a.to_float())
+    # nb = 1.1470e-05
+    # # nb = 0.421875
+    # print(rf.redstr(nb))
+    # b = rf.from_string(rf.redstr(nb))
+    # print(b)
+    # print(b.to_float())
+
+    # # 测试尾数标准化步骤
+    # sa = ".00001011e-1(+2)"
+    # a = rf.from_string(sa)
+    # # print(a)
+    # print(formating(a))
+    # print(rf.from_string(".1011e-101(+2)"))
+
+    # 测试乘法
+    print("### 乘数 a ###")
+    # a = rf.from_string(rf.redstr(1.4271e+00))
+    # a = rf.from_string(rf.redstr(-0.421875))
+    # a = rf.from_string(rf.redstr(1.7347))
+    # sa = ".11011e-111(+2)" # 0.84375 * 2^(-5)
+    sa = ".00001101e-10110(+2)"
+    a = rf.from_string(sa)
+    print("[红石浮点数表示]")
+    print(a)
+    print(f"[二进制转写]\n{sa}")
+    print(f"[十进制数值]")
+    print(f"{a.to_float(verbose=True)}")
+
+    print("### 乘数 b ###")
+    # b = rf.from_string(rf.redstr(-1.1470e-05))
+    # b = rf.from_string("-.11e-100(+2)") # -0.75 * 2^(-2)
+    # b = rf.from_string(rf.redstr(1.7347))
+    # sb = "-.11e-100(+2)" # -0.75 * 2^(-2)
+    sb = "-.0001110001e-100010(+2)"
+    b = rf.from_string(sb)
+    print("[红石浮点数表示]")
+    print(b)
+    print(f"[二进制转写]\n{sb}")
+    print(f"[十进制数值]")
+    print(f"{b.to_float(verbose=True)}")
+
+    print("### 计算结果 r ###")
+    r = multiplying(a, b, True)
+    print("[红石浮点数表示]")
+    print(r)
+    print(f"[十进制数值]")
+    print(f"{r.to_float(verbose=True)}")
\ No newline at end of file
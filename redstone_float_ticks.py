@@ -0,0 +1,133 @@
+# 红石浮点数运算的游戏刻（game tick）开销统计
+#   ticks = TickCounter()
+#   multiplying(a, b, True, ticks=ticks)
+#   ticks.print_report()
+# 只统计 redstone_float_multiply 中逐个模拟的操作次数，再按开销表换算成游戏刻，用来估计机器的规模和比较不同设计
+from collections import Counter
+
+# 每种操作的开销，单位为游戏刻（1 红石刻 = 2 游戏刻），可按实际机器调整
+DEFAULT_TICK_COSTS = {
+    "comparator_check": 2,  # 比较器 / 存量转信器检测一次，1 红石刻
+    "hopper_drain": 8,      # 黄铜漏斗漏掉一个物品，漏斗每 8 游戏刻传输一个物品
+    "item_insert": 4,       # 投掷器投入一个物品（进位、部分积、指数加一或预填的补码）
+}
+
+# multiplying 的各个阶段
+STAGES = ("exponent_add", "mantissa_channels", "carry", "normalize")
+
+class TickCounter:
+    def __init__(self, costs: dict[str: int] = None):
+        """
+        :param costs: 覆盖 DEFAULT_TICK_COSTS 中的部分开销
+        """
+        self.costs = dict(DEFAULT_TICK_COSTS, **(costs or {}))
+        self.operations = 0  # 统计了多少次 multiplying
+        self.counts = {stage: Counter() for stage in STAGES}
+        self.channel_counts = [Counter() for _ in range(16)]  # 16 个尾数检测通道分别统计
+
+    def count(self, stage: str, op: str, n: int = 1, channel: int = None):
+        self.counts[stage][op] += n
+        if channel is not None:
+            self.channel_counts[channel][op] += n
+
+    def carry(self, stage: str, inserted: bool):
+        """一次进位：黄铜漏斗漏掉 2 个物品，下一位投入 1 个物品（最高位的进位直接丢弃）"""
+        self.counts[stage]["hopper_drain"] += 2
+        if inserted:
+            self.counts[stage]["item_insert"] += 1
+
+    def move(self, stage: str):
+        """标准化时一个物品移到上一位：漏掉 1 个，投入 1 个"""
+        self.counts[stage]["hopper_drain"] += 1
+        self.counts[stage]["item_insert"] += 1
+
+    def _ticks(self, counter: Counter) -> int:
+        return sum(n * self.costs[op] for op, n in counter.items())
+
+    def ticks(self, stage: str = None) -> int:
+        """指定阶段（或全部阶段）串行执行时的总游戏刻"""
+        if stage is not None:
+            return self._ticks(self.counts[stage])
+        return sum(self._ticks(counter) for counter in self.counts.values())
+
+    def channel_ticks(self) -> list[int]:
+        return [self._ticks(counter) for counter in self.channel_counts]
+
+    def critical_path_ticks(self) -> int:
+        """16 个尾数通道并行工作时的总游戏刻：尾数阶段只算最慢的通道"""
+        return self.ticks() - self.ticks("mantissa_channels") + max(self.channel_ticks())
+
+    def merge(self, other: 'TickCounter'):
+        """合并另一个计数器，例如多进程分别统计之后汇总"""
+        self.operations += other.operations
+        for stage in STAGES:
+            self.counts[stage].update(other.counts[stage])
+        for mine, theirs in zip(self.channel_counts, other.channel_counts):
+            mine.update(theirs)
+
+    def reset(self):
+        self.operations = 0
+        for counter in self.counts.values():
+            counter.clear()
+        for counter in self.channel_counts:
+            counter.clear()
+
+    def report(self) -> dict:
+        total = self.ticks()
+        per_op = max(self.operations, 1)
+        stages = {
+            stage: {
+                "counts": dict(self.counts[stage]),
+                "ticks": self.ticks(stage),
+                "ticks_per_operation": self.ticks(stage) / per_op,
+                "share": self.ticks(stage) / total if total else 0.0,
+            }
+            for stage in STAGES
+        }
+        return {
+            "operations": self.operations,
+            "costs": dict(self.costs),
+            "stages": stages,
+            "total_ticks": total,
+            "ticks_per_operation": total / per_op,
+            "critical_path_ticks_per_operation": self.critical_path_ticks() / per_op,
+            "channel_ticks_per_operation": [t / per_op for t in self.channel_ticks()],
+            "bottleneck": max(STAGES, key=self.ticks) if total else None,
+        }
+
+    def print_report(self):
+        r = self.report()
+        print(f"[TICKS] {r['operations']} multiplications, costs (game ticks): {r['costs']}")
+        for stage, info in r["stages"].items():
+            counts = ", ".join(f"{op}={n}" for op, n in sorted(info["counts"].items()))
+            print(f"  {stage:18s} {info['ticks_per_operation']:10.1f} gt/op  {100 * info['share']:5.1f}%  ({counts})")
+        print(f"  {'total (serial)':18s} {r['ticks_per_operation']:10.1f} gt/op  = {r['ticks_per_operation'] / 20:.2f} s/op")
+        print(f"  {'parallel channels':18s} {r['critical_path_ticks_per_operation']:10.1f} gt/op")
+        busiest = max(range(16), key=lambda i: r["channel_ticks_per_operation"][i])
+        print(f"  bottleneck stage: {r['bottleneck']}, busiest mantissa channel: {busiest} "
+              f"({r['channel_ticks_per_operation'][busiest]:.1f} gt/op)")
+
+if __name__ == "__main__":
+    # 对随机的权重 x 激活值统计一次乘法的平均开销
+    import argparse
+    import json
+    import random
+
+    from redstone_float import RedstoneFloat as rf
+    from redstone_float_multiply import multiplying
+
+    parser = argparse.ArgumentParser(description="Estimate game ticks per redstone float multiplication")
+    parser.add_argument("--samples", type=int, default=2000)
+    parser.add_argument("--costs", type=json.loads, default=None,
+                        help='override tick costs, e.g. \'{"hopper_drain": 4}\'')
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    ticks = TickCounter(args.costs)
+    for _ in range(args.samples):
+        a = rf.from_float(rng.uniform(-1, 1))
+        b = rf.from_float(rng.uniform(-1.5, 1.5))
+        if a.mantissa and b.mantissa:
+            multiplying(a, b, True, ticks=ticks)
+    ticks.print_report()
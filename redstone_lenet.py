@@ -22,16 +22,79 @@ def shift_image(img, dx, dy):
     shifted[rows_dst, cols_dst] = img[rows_src, cols_src]
     return shifted
 
-def custom_skeletonize(binary):
-    # Step 1: Skeletonize the binary image
-    skeleton = skeletonize(binary).astype(np.uint8)
+def shift_image_batch(imgs, dx, dy):
+    """shift_image 的批量版本：imgs 为 [N][H][W]，整批一起平移"""
+    shifted = np.zeros_like(imgs)
+    h, w = imgs.shape[-2:]
+    rows_src, rows_dst = (slice(0, h - dy), slice(dy, h)) if dy >= 0 else (slice(-dy, h), slice(0, h + dy))
+    cols_src, cols_dst = (slice(0, w - dx), slice(dx, w)) if dx >= 0 else (slice(-dx, w), slice(0, w + dx))
+    shifted[..., rows_dst, cols_dst] = imgs[..., rows_src, cols_src]
+    return shifted
 
-    # Step 2: Generate 3 slightly thickened variants by copying pixels
+# variants 列表中每一项对应的变种编号（0: variant1, 1: variant2, 2: variant3）
+VARIANT_CHOICES = [0, 1, 0, 1, 2]
+
+def skeleton_variants(skeleton):
+    """Generate 3 slightly thickened variants by copying pixels"""
     variant1 = skeleton | shift_image(skeleton, -1, 0)  # left
     variant2 = skeleton | shift_image(skeleton, 0, 1)   # down
     variant3 = skeleton | shift_image(skeleton, -1, 0) \
                          | shift_image(skeleton, 0, 1) \
                          | shift_image(skeleton, -1, 1)  # left, down, left-down
+    return variant1, variant2, variant3
+
+def random_quadrant_merge(variants, rng):
+    """
+    custom_skeletonize 第3步的批量版本，全部用数组操作完成
+    variants: uint8 array [N][3][H][W]，依次为 variant1, variant2, variant3
+    rng: np.random.Generator，固定种子即可复现
+    return: uint8 array [N][H][W]
+    """
+    N, _, h, w = variants.shape
+    mid_x = rng.integers(w // 3, 2 * w // 3, size=N)
+    mid_y = rng.integers(h // 3, 2 * h // 3, size=N)
+    # 四块（左上、右上、左下、右下）各自选用的变种，同样减小变种3出现的概率
+    choice = np.asarray(VARIANT_CHOICES)[rng.integers(5, size=(N, 4))]
+
+    bottom = np.arange(h)[None, :, None] >= mid_y[:, None, None]
+    right = np.arange(w)[None, None, :] >= mid_x[:, None, None]
+    quadrant = (bottom * 2 + right).reshape(N, -1)  # [N, h*w]，取值 0~3
+    pick = np.take_along_axis(choice, quadrant, axis=1).reshape(N, 1, h, w)
+    return np.take_along_axis(variants, pick, axis=1)[:, 0]
+
+def skeleton_variants_batch(skeletons):
+    """
+    skeleton_variants 的批量版本
+    skeletons: uint8 array [N][H][W]
+    return: uint8 array [N][3][H][W]，依次为 variant1, variant2, variant3
+    """
+    left = shift_image_batch(skeletons, -1, 0)
+    down = shift_image_batch(skeletons, 0, 1)
+    variant1 = skeletons | left
+    variant2 = skeletons | down
+    variant3 = variant1 | down | shift_image_batch(skeletons, -1, 1)
+    return np.stack([variant1, variant2, variant3], axis=1)
+
+def custom_skeletonize_batch(binary, rng=None):
+    """
+    custom_skeletonize 的批量版本，输出分布与逐张调用相同
+    binary: bool array [N][H][W]
+    rng: np.random.Generator，固定种子即可复现
+    return: uint8 array [N][H][W]
+    """
+    if rng is None:
+        rng = np.random.default_rng()
+    # skeletonize 只能逐张做（对3维数组会变成3D骨架化）
+    skeletons = np.stack([skeletonize(b) for b in binary]).astype(np.uint8) if len(binary) \
+        else np.zeros(np.shape(binary), dtype=np.uint8)
+    return random_quadrant_merge(skeleton_variants_batch(skeletons), rng)
+
+def custom_skeletonize(binary):
+    # Step 1: Skeletonize the binary image
+    skeleton = skeletonize(binary).astype(np.uint8)
+
+    # Step 2: Generate 3 slightly thickened variants by copying pixels
+    variant1, variant2, variant3 = skeleton_variants(skeleton)
     
     variants = [variant1, variant2, variant1, variant2, variant3] # 减小变种3出现的概率
 
@@ -50,24 +113,28 @@ def custom_skeletonize(binary):
 
     return new_img
 
-class SkeletonizeTransform:
-    def __call__(self, img):
-        # 确保图像是灰度
-        img = img.convert('L')
+def binarize_image(img):
+    """PIL 图像 → 15x15 二值化 numpy 数组（True/False），即骨架化之前的部分"""
+    # 确保图像是灰度
+    img = img.convert('L')
 
-        # Resize 到 15x15（可以改成你想要的大小）
-        img = img.resize((15, 15))
+    # Resize 到 15x15（可以改成你想要的大小）
+    img = img.resize((15, 15))
 
-        # 转为 numpy 数组
-        arr = np.array(img)
+    # 转为 numpy 数组
+    arr = np.array(img)
 
-        # 若最大值不为0，则进行缩放
-        max_val = arr.max()
-        if max_val > 0:
-            arr = arr * (255.0 / max_val)
+    # 若最大值不为0，则进行缩放
+    max_val = arr.max()
+    if max_val > 0:
+        arr = arr * (255.0 / max_val)
 
-        # 二值化
-        binary = arr > 96  # True/False array
+    # 二值化
+    return arr > 96  # True/False array
+
+class SkeletonizeTransform:
+    def __call__(self, img):
+        binary = binarize_image(img)
 
         # 执行骨架化（skeletonize expects boolean array）
         skeleton = custom_skeletonize(binary)
@@ -81,4 +148,3 @@ class SkeletonizeTransform:
 transform = transforms.Compose([
     SkeletonizeTransform()
 ])
-
@@ -0,0 +1,144 @@
+# 预先算好的骨架化增强库（.rlb），训练时不再每个 epoch 重复 resize / 二值化 / skeletonize
+#   python redstone_lenet_bank.py --data ./data                  → data/skeleton_bank.rlb
+#   python redstone_lenet_bank.py --data ./data --test-split     → data/skeleton_bank_test.rlb
+#
+# 每张图存 4 个位压缩平面（各 29 字节）：skeleton, variant1, variant2, variant3
+# 文件布局（小端）：
+#   文件头 16 字节：magic "RLNB", 版本, 平面数, 图像个数
+#   平面区：个数 x 4 x 29 字节
+#   标签区：个数 x 1 字节
+# 训练时的随机四块拼接只是对映射出来的数组做一次 random_quadrant_merge
+import argparse
+import os
+import struct
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from redstone_lenet_packed import IMAGE_SIZE, PIXELS, PACKED_BYTES, pack_images
+
+MAGIC = b"RLNB"
+VERSION = 1
+PLANES = 4  # skeleton, variant1, variant2, variant3
+HEADER = struct.Struct("<4sHHQ")
+DEFAULT_PATH = "data/skeleton_bank.rlb"
+DEFAULT_TEST_PATH = "data/skeleton_bank_test.rlb"
+
+def _bank_planes(raw_images):
+    """原始 28x28 灰度图 → [N, 4, 29] 打包平面"""
+    from PIL import Image
+    from skimage.morphology import skeletonize
+    from redstone_lenet import binarize_image, skeleton_variants_batch
+
+    planes = np.empty((len(raw_images), PLANES, IMAGE_SIZE, IMAGE_SIZE), dtype=np.uint8)
+    for n, raw in enumerate(raw_images):
+        planes[n, 0] = skeletonize(binarize_image(Image.fromarray(raw)))
+    planes[:, 1:] = skeleton_variants_batch(planes[:, 0])
+    return pack_images(planes).reshape(len(raw_images), PLANES, PACKED_BYTES)
+
+def build_bank(path, raw_images, labels, workers=None, chunk=2048):
+    """
+    raw_images: uint8 [N, 28, 28]，例如 evaluate.load_mnist_raw 的结果
+    labels: [N]
+    骨架化是一次性的开销，按 chunk 分给进程池
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    chunks = [raw_images[s:s + chunk] for s in range(0, len(raw_images), chunk)]
+    with open(path, "wb") as f, ProcessPoolExecutor(max_workers=workers) as pool:
+        f.write(HEADER.pack(MAGIC, VERSION, PLANES, len(raw_images)))
+        for planes in pool.map(_bank_planes, chunks):
+            f.write(planes.tobytes())
+        f.write(np.asarray(labels, dtype=np.uint8).tobytes())
+
+class SkeletonBank:
+    """
+    bank = SkeletonBank("data/skeleton_bank.rlb")
+    images = bank.sample(np.arange(len(bank)), np.random.default_rng(0))  # uint8 [N, 15, 15]
+    """
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            magic, version, planes, count = HEADER.unpack(f.read(HEADER.size))
+        if magic != MAGIC:
+            raise ValueError("不是 .rlb 骨架库文件")
+        if version != VERSION or planes != PLANES:
+            raise ValueError(f"不支持的 .rlb 版本: {version} / {planes} 个平面")
+        self.path = path
+        self.planes = np.memmap(path, dtype=np.uint8, mode="r", offset=HEADER.size,
+                                shape=(count, PLANES, PACKED_BYTES))
+        self.labels = np.memmap(path, dtype=np.uint8, mode="r", offset=HEADER.size + count * PLANES * PACKED_BYTES,
+                                shape=(count,))
+
+    def __len__(self):
+        return len(self.labels)
+
+    def _unpack(self, indices, planes):
+        packed = self.planes[indices][:, planes]
+        bits = np.unpackbits(packed, axis=2, count=PIXELS)
+        return bits.reshape(len(packed), len(planes), IMAGE_SIZE, IMAGE_SIZE)
+
+    def skeletons(self, indices):
+        """未增强的骨架，uint8 [len(indices), 15, 15]"""
+        return self._unpack(indices, [0])[:, 0]
+
+    def sample(self, indices, rng):
+        """与 custom_skeletonize 同分布的增强结果，uint8 [len(indices), 15, 15]"""
+        from redstone_lenet import random_quadrant_merge
+        return random_quadrant_merge(self._unpack(indices, [1, 2, 3]), rng)
+
+    def epoch(self, seed, epoch=0, batch_size=65536):
+        """
+        整个库的一轮增强结果，种子由 (seed, epoch) 决定，可复现
+        return: (images uint8 [N, 15, 15], labels int64 [N])
+        """
+        rng = np.random.default_rng((seed, epoch))
+        images = np.empty((len(self), IMAGE_SIZE, IMAGE_SIZE), dtype=np.uint8)
+        for start in range(0, len(self), batch_size):
+            indices = np.arange(start, min(start + batch_size, len(self)))
+            images[start:start + len(indices)] = self.sample(indices, rng)
+        return images, np.asarray(self.labels, dtype=np.int64)
+
+def bank_dataset(path, seed=0):
+    """
+    供 redstone_lenet_train 使用的 torch Dataset，元素与 MNIST(transform=transform) 相同：
+    ([1, 15, 15] float tensor, label)。每个 epoch 开始时调用 set_epoch 重新拼接一次
+    """
+    import torch
+    from torch.utils.data import Dataset
+
+    class SkeletonBankDataset(Dataset):
+        def __init__(self):
+            self.bank = SkeletonBank(path)
+            self.set_epoch(0)
+
+        def set_epoch(self, epoch):
+            images, labels = self.bank.epoch(seed, epoch)
+            self.images = torch.from_numpy(images.astype(np.float32)).unsqueeze(1)
+            self.targets = torch.from_numpy(labels)
+
+        def __len__(self):
+            return len(self.bank)
+
+        def __getitem__(self, index):
+            return self.images[index], int(self.targets[index])
+
+    return SkeletonBankDataset()
+
+def main(argv=None):
+    from evaluate import load_mnist_raw
+
+    parser = argparse.ArgumentParser(description="Precompute the skeleton augmentation bank from local MNIST")
+    parser.add_argument("--data", default="./data", help="directory containing MNIST/raw (torchvision layout)")
+    parser.add_argument("--test-split", action="store_true", help="build the bank for t10k instead of train")
+    parser.add_argument("--out", default=None)
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    out = args.out or (DEFAULT_TEST_PATH if args.test_split else DEFAULT_PATH)
+    raw_images, labels = load_mnist_raw(args.data, train=not args.test_split)
+    build_bank(out, raw_images, labels, workers=args.workers)
+    print(f"Wrote {out}: {len(labels)} images, {os.path.getsize(out)} bytes")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,169 @@
+# predict 的缓存层
+# 键：打包后的 29 字节图像本身（对 0/1 图像来说就是一个无冲突的哈希）+ 权重文件的 sha256 指纹
+# 内存里是有上限的 LRU，可选再加一个 sqlite 持久化存储，重启后仍然有效；同一个 sqlite 文件可以给多个权重文件共用
+# 每隔 check_interval 秒最多 stat 一次权重文件，文件变了才重新计算指纹，redstone_lenet.pth 变了就自动重新加载并作废旧的缓存。
+# 新结果先放在内存缓冲里，攒够 commit_every 个或 flush / close 时才一次性写入 sqlite，冷启动时不会每次都 fsync；
+# 写入之间不占着 sqlite 的写锁，多个实例可以共用同一个文件。
+# 用导出的 .rlw 时指纹同时包含它的源 .pth：.pth 改了而 .rlw 还没重新导出时，直接从 .pth 加载
+import os
+import sqlite3
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from redstone_lenet_forward import load_weights, predict
+from redstone_lenet_packed import pack_image
+from redstone_lenet_weights import file_sha256, is_stale
+
+class PredictionCache:
+    """
+    cache = PredictionCache("redstone_lenet.pth", maxsize=4096, store_path="predictions.sqlite")
+    cache.predict(image)
+    cache.stats()
+    source_path: .rlw 的源 .pth，默认为同名的 .pth（存在时）
+    check_interval: 两次检查权重文件之间至少间隔的秒数，0 表示每次调用都检查
+    commit_every: 攒够多少个新结果写一次 sqlite；用完之后调用 close()，否则最后不足一批的结果不会写入
+    """
+    def __init__(self, weights_path="redstone_lenet.pth", maxsize=4096, store_path=None, source_path=None,
+                 check_interval=1.0, commit_every=256):
+        self.weights_path = weights_path
+        if source_path is None and weights_path.endswith(".rlw"):
+            candidate = weights_path[:-len(".rlw")] + ".pth"
+            source_path = candidate if os.path.exists(candidate) else None
+        self.source_path = source_path
+        # sqlite 里按权重文件区分，作废时只删这个文件自己的旧结果
+        self.store_key = os.path.abspath(weights_path)
+        self.maxsize = maxsize
+        self.check_interval = check_interval
+        self.commit_every = commit_every
+        self.memory = OrderedDict()
+        self.pending = {}  # 还没写入 sqlite 的结果：{image: prediction}
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.weights = None
+        self.fingerprint = None
+        self._stat = None
+        self._checked_at = None
+
+        self.store = None
+        if store_path is not None:
+            self.store = sqlite3.connect(store_path)
+            columns = [row[1] for row in self.store.execute("PRAGMA table_info(predictions)")]
+            if columns and "weights" not in columns:
+                # 旧格式（只按指纹区分）的缓存直接丢掉
+                self.store.execute("DROP TABLE predictions")
+            self.store.execute("CREATE TABLE IF NOT EXISTS predictions ("
+                               "weights TEXT NOT NULL, fingerprint TEXT NOT NULL, image BLOB NOT NULL, "
+                               "prediction INTEGER NOT NULL, PRIMARY KEY (weights, fingerprint, image))")
+        self._check_weights()
+
+    def _check_weights(self):
+        """权重文件（以及源 .pth）的 mtime/大小/inode 变了才重新计算指纹"""
+        now = time.monotonic()
+        if self._checked_at is not None and now - self._checked_at < self.check_interval:
+            return
+        self._checked_at = now
+        paths = [self.weights_path] + ([self.source_path] if self.source_path else [])
+        stat = []
+        for path in paths:
+            st = os.stat(path)
+            stat.append((st.st_mtime_ns, st.st_size, st.st_ino))
+        if stat == self._stat:
+            return
+        self._stat = stat
+        fingerprint = "-".join(file_sha256(path).hex() for path in paths)
+        if fingerprint == self.fingerprint:
+            return
+        if self.fingerprint is not None:
+            self.invalidations += 1
+        self.fingerprint = fingerprint
+        stale = self.source_path is not None and is_stale(self.weights_path, self.source_path)
+        self.weights = load_weights(self.source_path if stale else self.weights_path)
+        self.memory.clear()
+        self.pending.clear()
+        if self.store is not None:
+            # 这个权重文件旧指纹下的结果不会再被用到，其它权重文件的结果保留
+            self.store.execute("DELETE FROM predictions WHERE weights = ? AND fingerprint != ?",
+                               (self.store_key, fingerprint))
+            self.store.commit()
+
+    def predict(self, binary_image):
+        """
+        binary_image: 15x15 list/array of 0/1，或 pack_image 打包的 29 字节
+        """
+        self._check_weights()
+        if isinstance(binary_image, (bytes, bytearray)):
+            key = bytes(binary_image)
+        else:
+            arr = np.asarray(binary_image)
+            if ((arr != 0) & (arr != 1)).any():
+                raise ValueError("只能缓存 0/1 图像")
+            key = pack_image(arr)
+
+        if key in self.memory:
+            self.memory.move_to_end(key)
+            self.hits += 1
+            return self.memory[key]
+
+        prediction = self.pending.get(key)
+        if prediction is not None:
+            self.disk_hits += 1
+        elif self.store is not None:
+            row = self.store.execute("SELECT prediction FROM predictions "
+                                     "WHERE weights = ? AND fingerprint = ? AND image = ?",
+                                     (self.store_key, self.fingerprint, key)).fetchone()
+            if row is not None:
+                prediction = row[0]
+                self.disk_hits += 1
+        if prediction is None:
+            self.misses += 1
+            prediction = predict(key, self.weights)
+            if self.store is not None:
+                self.pending[key] = prediction
+                if len(self.pending) >= self.commit_every:
+                    self.flush()
+
+        self.memory[key] = prediction
+        if len(self.memory) > self.maxsize:
+            self.memory.popitem(last=False)
+            self.evictions += 1
+        return prediction
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "size": len(self.memory),
+            "pending": len(self.pending),
+            "fingerprint": self.fingerprint,
+        }
+
+    def flush(self):
+        """把缓冲里的新结果在一个事务里写入 sqlite"""
+        if self.store is None or not self.pending:
+            return
+        self.store.executemany("INSERT OR REPLACE INTO predictions VALUES (?, ?, ?, ?)",
+                               [(self.store_key, self.fingerprint, key, prediction)
+                                for key, prediction in self.pending.items()])
+        self.store.commit()
+        self.pending.clear()
+
+    def clear(self):
+        self.memory.clear()
+        self.pending.clear()
+        if self.store is not None:
+            self.store.execute("DELETE FROM predictions WHERE weights = ?", (self.store_key,))
+            self.store.commit()
+
+    def close(self):
+        if self.store is not None:
+            self.flush()
+            self.store.close()
+            self.store = None
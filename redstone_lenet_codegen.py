@@ -0,0 +1,159 @@
+# 把固定的权重编译成专用的 Python 模块：卷积核、全连接层全部展开成直线代码，
+# rsr 量化后的权重和偏置直接写成常数，量化为 0 的权重对应的乘法直接去掉。
+# 结果与 redstone_lenet_forward.predict 逐位相同（rsr 下的乘积与部分和都是精确的，求和顺序不影响结果）。
+#   predict = load_specialized("redstone_lenet.rlw").predict
+#   python redstone_lenet_codegen.py                   # 生成 / 复用缓存，并与 predict 比较速度
+# 生成的模块按量化后权重的 sha256 缓存在 .rlcache/ 下，权重不变时直接导入
+import hashlib
+import importlib.util
+import os
+
+import numpy as np
+
+from redstone_lenet_forward import rsr_array
+
+GENERATOR_VERSION = 1
+DEFAULT_CACHE_DIR = ".rlcache"
+
+def quantized_weights(weight_dict):
+    """{name: rsr 后的 float64 数组}"""
+    return {key: rsr_array(np.asarray(value, dtype=np.float64)) for key, value in weight_dict.items()}
+
+def weights_hash(weight_dict):
+    """量化后权重的 sha256（十六进制），量化结果相同的权重共用同一个生成的模块"""
+    h = hashlib.sha256(f"redstone-lenet-codegen-{GENERATOR_VERSION}".encode())
+    for key, value in sorted(quantized_weights(weight_dict).items()):
+        h.update(key.encode())
+        h.update(str(value.shape).encode())
+        h.update(value.tobytes())
+    return h.hexdigest()
+
+def _sum_expression(terms, bias):
+    """
+    terms: [(输入表达式, 权重)]，bias: 偏置；权重为 0 的项不出现在表达式里
+    偏置写在最前面，所有项都为 0 时表达式就是偏置本身
+    """
+    parts = [repr(float(bias))]
+    for operand, weight in terms:
+        if weight:
+            parts.append(f"{operand} * {float(weight)!r}")
+    return " + ".join(parts)
+
+def generate_source(weight_dict, stride=2, image_size=15):
+    """return: 生成模块的源代码"""
+    q = quantized_weights(weight_dict)
+    K = 3
+    out = (image_size - K) // stride + 1
+    kernel = q['conv1.weight'][0][0]
+    lines = [
+        "# 由 redstone_lenet_codegen.py 自动生成，不要手动修改",
+        f"# weights sha256: {weights_hash(weight_dict)}",
+        "from redstone_lenet_forward import rsr, argmax",
+        "from redstone_lenet_packed import unpack_image",
+        "",
+        "U = 2 ** -14",
+        "",
+        "def forward(binary_image):",
+        "    if isinstance(binary_image, (bytes, bytearray)):",
+        "        binary_image = unpack_image(binary_image)",
+        "    x = [v for row in binary_image for v in row]",
+        "    binary = set(x) <= {0, 1}",
+        "    if not binary:",
+        "        x = [rsr(v) for v in x]",
+        "",
+        "    # ===== Conv Layer（3x3 卷积核展开），relu_cut =====",
+    ]
+    for i in range(out):
+        for j in range(out):
+            terms = [(f"x[{(i*stride+ki) * image_size + j*stride+kj}]", kernel[ki][kj])
+                     for ki in range(K) for kj in range(K)]
+            lines.append(f"    c{i * out + j} = max(0.0, min({_sum_expression(terms, q['conv1.bias'][0])}, 1.0))")
+    conv_names = [f"c{n}" for n in range(out * out)]
+    lines += [
+        "    # 输入为 0/1 时卷积输出已经是 2^-14 的整数倍，rsr 不改变它们",
+        "    if not binary:",
+        f"        {', '.join(conv_names)} = [rsr(v) for v in ({', '.join(conv_names)})]",
+        "",
+    ]
+
+    inputs = conv_names
+    for layer in ("fc1", "fc2", "fc3"):
+        weight, bias = q[f'{layer}.weight'], q[f'{layer}.bias']
+        prefix = layer[-1]
+        lines.append(f"    # ===== {layer.upper()} =====")
+        if layer != "fc1":
+            # Hard Tanh 的输出是 2^-28 的整数倍，这里就是 rsr（取值在 [-1, 1]，不需要范围检查）
+            for name in inputs:
+                lines.append(f"    {name} = round({name} * 16384.0) * U")
+        names = [f"h{prefix}_{n}" for n in range(len(weight))]
+        for name, row, b in zip(names, weight, bias):
+            lines.append(f"    {name} = {_sum_expression(list(zip(inputs, row)), b)}")
+        if layer != "fc3":
+            for name in names:
+                lines.append(f"    {name} = max(-1.0, min({name}, 1.0))")
+        lines.append("")
+        inputs = names
+    lines += [
+        f"    return [{', '.join(inputs)}]",
+        "",
+        "def predict(binary_image):",
+        "    return argmax(forward(binary_image))",
+        "",
+    ]
+    return "\n".join(lines)
+
+def _import_file(path, name):
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def load_specialized(weights, cache_dir=DEFAULT_CACHE_DIR):
+    """
+    weights: 权重文件路径（.pth / .rlw），或 load_weights 的结果
+    return: 生成的模块，提供 forward(image) / predict(image)；缓存里已有同样权重的模块时直接导入
+    """
+    if isinstance(weights, str):
+        from redstone_lenet_forward import load_weights
+        weights = load_weights(weights)
+    digest = weights_hash(weights)
+    name = f"redstone_lenet_specialized_{digest[:16]}"
+    path = os.path.join(cache_dir, name + ".py")
+    if not os.path.exists(path):
+        os.makedirs(cache_dir, exist_ok=True)
+        # 先写临时文件再改名，多个进程同时生成时不会读到写了一半的文件
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(generate_source(weights))
+        os.replace(tmp_path, path)
+    return _import_file(path, name)
+
+if __name__ == "__main__":
+    import glob
+    import time
+
+    from redstone_lenet_forward import forward, load_weights, predict
+    from redstone_lenet_packed import read_csv_image
+
+    weights = load_weights("redstone_lenet.rlw")
+    start = time.perf_counter()
+    specialized = load_specialized(weights)
+    print(f"load_specialized: {(time.perf_counter() - start) * 1e3:.1f} ms ({specialized.__file__})")
+
+    images = [read_csv_image(path) for path in sorted(glob.glob("pre_draw/*.csv"))]
+    rng = np.random.default_rng(0)
+    images += (rng.random((300, 15, 15)) < 0.3).astype(int).tolist()
+    images += rng.choice([0.0, 0.25, 0.5, 1.0], size=(20, 15, 15)).tolist()  # 非 0/1 的输入走 rsr 路径
+
+    def per_image(fn):
+        start = time.perf_counter()
+        out = [fn(img) for img in images]
+        return out, (time.perf_counter() - start) / len(images)
+
+    expected, t_interpreted = per_image(lambda img: forward(img, weights))
+    actual, t_specialized = per_image(specialized.forward)
+    assert actual == expected
+    assert [specialized.predict(img) for img in images] == [predict(img, weights) for img in images]
+    print(f"predict (interpreted): {t_interpreted * 1e6:8.1f} us/image")
+    print(f"specialized:           {t_specialized * 1e6:8.1f} us/image")
+    print(f"speedup:               {t_interpreted / t_specialized:8.1f}x on {len(images)} images, identical logits")
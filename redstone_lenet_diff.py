@@ -0,0 +1,258 @@
+# torch 模型（RedstoneLeNet.forward：真正的 tanh、不量化的 float32）与手写推理（predict：Hard Tanh、rsr 量化）的差分测试
+#   python redstone_lenet_diff.py --random 1000000 --perturbed 1000000 --workers 8
+#   python redstone_lenet_diff.py --data ./data --dataset 60000 --out-dir diff_worst
+#   python redstone_lenet_diff.py --corpus pre_draw/pre_draw.rlp --random 0 --perturbed 0
+# 输入来源：
+#   random     随机 0/1 网格，每张图的点亮比例在 [0.02, 0.5] 里均匀抽取
+#   perturbed  pre_draw 的手绘骨架随机平移 ±1 格，再翻转 0 ~ 4 个像素
+#   dataset    MNIST 原图（--data），在工作进程里骨架化；corpus 为打包好的 .rlp 图像集
+# 随机输入在工作进程里按分片的种子生成，不经过进程间传输；手写推理用 forward_batch（与 predict 逐位相同）。
+# 报告 argmax 不一致的比例、logit 误差的分布，并把最差的输入保存为 .rlp 和 JSON，便于用 classify.py 查看。
+import argparse
+import heapq
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from redstone_lenet_packed import pack_images, unpack_images, read_corpus, write_corpus
+
+SOURCES = ("random", "perturbed", "dataset", "corpus")
+# 每张图 logit 的最大绝对误差落在哪个区间
+ERROR_BINS = np.array([0, 1e-4, 1e-3, 1e-2, 0.05, 0.1, 0.2, 0.5, 1.0, 2.0, np.inf])
+
+# ===== 输入 =====
+
+def random_grids(count, rng):
+    density = rng.uniform(0.02, 0.5, size=(count, 1, 1))
+    return (rng.random((count, 15, 15)) < density).astype(np.uint8)
+
+def perturbed_skeletons(count, rng, max_flips=4):
+    from redstone_lenet import shift_image_batch
+
+    packed, _ = read_corpus("pre_draw/pre_draw.rlp")
+    base = unpack_images(packed)
+    images = base[rng.integers(len(base), size=count)]
+    shifts = rng.integers(-1, 2, size=(count, 2))
+    for dx, dy in np.unique(shifts, axis=0):
+        same = (shifts[:, 0] == dx) & (shifts[:, 1] == dy)
+        images[same] = shift_image_batch(images[same], int(dx), int(dy))
+    flips = rng.integers(max_flips + 1, size=count)
+    for k in range(1, max_flips + 1):
+        rows = np.flatnonzero(flips >= k)
+        images[rows, rng.integers(15, size=len(rows)), rng.integers(15, size=len(rows))] ^= 1
+    return images
+
+# ===== 工作进程 =====
+
+_model = None
+_weights = None
+
+def _init_worker(weights_path):
+    global _model, _weights
+    import torch
+    from redstone_lenet_class import RedstoneLeNet
+    from redstone_lenet_forward import load_weights
+
+    # 多个进程各自占满所有核只会互相抢，每个进程一个线程
+    torch.set_num_threads(1)
+    _model = RedstoneLeNet()
+    _model.load_state_dict(torch.load(weights_path, map_location="cpu"))
+    _model.eval()
+    _weights = {key: np.asarray(value, dtype=np.float64) for key, value in load_weights(weights_path).items()}
+
+def compare_batch(images):
+    """
+    images: uint8 [N, 15, 15] of 0/1
+    return: (torch logits float64 [N, 10], 手写推理的 logits [N, 10])
+    """
+    import torch
+    from redstone_lenet_forward import forward_batch
+
+    with torch.no_grad():
+        reference = _model(torch.from_numpy(images.astype(np.float32)).unsqueeze(1)).double().numpy()
+    return reference, forward_batch(images, _weights)
+
+def _run_shard(source, shard_id, count, seed, raw=None, top_k=20):
+    """
+    source 为 random / perturbed 时在这里生成 count 张图；dataset 时 raw 为 28x28 原图，corpus 时 raw 为打包的图像
+    return: 分片的统计（见 merge_stats）与这个分片里最差的 top_k 个输入
+    """
+    rng = np.random.default_rng([seed, SOURCES.index(source), shard_id])
+    if source == "random":
+        images = random_grids(count, rng)
+    elif source == "perturbed":
+        images = perturbed_skeletons(count, rng)
+    elif source == "dataset":
+        from PIL import Image
+        from redstone_lenet import binarize_image, custom_skeletonize
+        np.random.seed(seed + shard_id)
+        images = np.stack([custom_skeletonize(binarize_image(Image.fromarray(r))) for r in raw]).astype(np.uint8)
+    else:
+        images = unpack_images(raw)
+
+    reference, manual = compare_batch(images)
+    error = np.abs(manual - reference).max(axis=1)
+    disagree = reference.argmax(axis=1) != manual.argmax(axis=1)
+    stats = {
+        "images": len(images),
+        "disagree": int(disagree.sum()),
+        "error_hist": np.histogram(error, ERROR_BINS)[0],
+        "error_sum": float(np.abs(manual - reference).sum()),
+        "error_sq_sum": float(((manual - reference) ** 2).sum()),
+        "error_max": float(error.max()) if len(error) else 0.0,
+    }
+    # 最差的输入：先看 argmax 是否不一致，再看 logit 的最大误差
+    order = np.lexsort((-error, ~disagree))[:top_k]
+    worst = [((bool(disagree[i]), float(error[i])), source, shard_id, int(i), pack_images(images[i:i + 1])[0],
+              reference[i].tolist(), manual[i].tolist()) for i in order]
+    return source, stats, worst
+
+# ===== 汇总 =====
+
+def merge_stats(total, stats):
+    for key, value in stats.items():
+        if key == "error_max":
+            total[key] = max(total.get(key, 0.0), value)
+        else:
+            total[key] = total.get(key, 0) + value
+    return total
+
+def summarize(stats):
+    """return: dict，disagreement_rate、mean_abs_error（每个 logit）、rms_error、max_error、error_hist"""
+    n = max(stats["images"], 1)
+    return {
+        "images": stats["images"],
+        "disagree": stats["disagree"],
+        "disagreement_rate": stats["disagree"] / n,
+        "mean_abs_error": stats["error_sum"] / (n * 10),
+        "rms_error": (stats["error_sq_sum"] / (n * 10)) ** 0.5,
+        "max_error": stats["error_max"],
+        "error_hist": [int(v) for v in stats["error_hist"]],
+    }
+
+def run_diff(weights_path, plan, workers=None, chunk=8192, seed=0, top_k=20, progress=True):
+    """
+    plan: [(source, count, raw)]，raw 只有 dataset / corpus 需要
+    return: (report {source: summarize(...)}，多个来源时还有 "all"；worst，按严重程度从高到低排序)
+    """
+    totals = {}
+    worst = []
+    done, total_images = 0, sum(count for _, count, _ in plan)
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(weights_path,)) as pool:
+        futures = []
+        for source, count, raw in plan:
+            # 骨架化比推理慢得多，MNIST 用更小的分片，让进程池均匀分摊
+            size = max(chunk // 32, 1) if source == "dataset" else chunk
+            for shard_id, s in enumerate(range(0, count, size)):
+                n = min(size, count - s)
+                futures.append(pool.submit(_run_shard, source, shard_id, n, seed,
+                                           None if raw is None else raw[s:s + n], top_k))
+        for future in as_completed(futures):
+            source, stats, shard_worst = future.result()
+            merge_stats(totals.setdefault(source, {}), stats)
+            for item in shard_worst:
+                # 堆里保留最差的 top_k 个，按 (是否不一致, 误差) 比较，(来源, 分片, 下标) 保证不会比较到后面的数组
+                entry = item[:4] + (item,)
+                if len(worst) < top_k:
+                    heapq.heappush(worst, entry)
+                else:
+                    heapq.heappushpop(worst, entry)
+            done += stats["images"]
+            if progress:
+                elapsed = time.perf_counter() - start
+                rate = sum(t["disagree"] for t in totals.values()) / done
+                print(f"[{done}/{total_images}] disagreement {100 * rate:.3f}%  {done / elapsed:.0f} images/s",
+                      file=sys.stderr, flush=True)
+    report = {source: summarize(totals[source]) for source, _, _ in plan if source in totals}
+    if len(report) > 1:
+        combined = {}
+        for stats in totals.values():
+            merge_stats(combined, stats)
+        report["all"] = summarize(combined)
+    return report, [entry[-1] for entry in sorted(worst, reverse=True)]
+
+def save_worst(out_dir, worst):
+    """worst.rlp（标签为 torch 模型的预测）和 worst.json（来源、误差和两边的 logits）"""
+    os.makedirs(out_dir, exist_ok=True)
+    packed = np.array([item[4] for item in worst], dtype=np.uint8).reshape(-1, 29)
+    labels = [int(np.argmax(item[5])) for item in worst]
+    write_corpus(os.path.join(out_dir, "worst.rlp"), unpack_images(packed), labels)
+    records = [{
+        "rank": rank, "source": source, "shard": shard_id, "index": index,
+        "disagree": disagree, "max_error": error,
+        "torch_prediction": int(np.argmax(reference)), "manual_prediction": int(np.argmax(manual)),
+        "torch_logits": reference, "manual_logits": manual,
+    } for rank, ((disagree, error), source, shard_id, index, _, reference, manual) in enumerate(worst)]
+    with open(os.path.join(out_dir, "worst.json"), "w") as f:
+        json.dump(records, f, indent=1)
+
+def print_report(report):
+    print(f"{'source':>10s} {'images':>10s} {'disagree':>9s} {'rate':>8s} {'mean |e|':>9s} {'rms e':>8s} "
+          f"{'max e':>7s}")
+    for source, s in report.items():
+        print(f"{source:>10s} {s['images']:10d} {s['disagree']:9d} {100 * s['disagreement_rate']:7.3f}% "
+              f"{s['mean_abs_error']:9.5f} {s['rms_error']:8.5f} {s['max_error']:7.3f}")
+    summary = report.get("all", next(iter(report.values())))
+    print("max |logit error| per image:")
+    for lo, hi, count in zip(ERROR_BINS[:-1], ERROR_BINS[1:], summary["error_hist"]):
+        print(f"  {f'[{lo:g}, {hi:g})':>14s} {count:10d}  {100 * count / max(summary['images'], 1):7.3f}%")
+
+def main(argv=None):
+    from evaluate import load_mnist_raw
+
+    parser = argparse.ArgumentParser(description="Compare RedstoneLeNet (torch) with the manual rsr engine on many inputs")
+    parser.add_argument("--weights", default="redstone_lenet.pth", help="state dict (.pth); the torch model needs it")
+    parser.add_argument("--random", type=int, default=100000, help="random 0/1 grids")
+    parser.add_argument("--perturbed", type=int, default=100000, help="shifted / bit-flipped pre_draw skeletons")
+    parser.add_argument("--data", default=None, help="directory containing MNIST/raw, skeletonized in the workers")
+    parser.add_argument("--dataset", type=int, default=None, help="MNIST images to use (default: all)")
+    parser.add_argument("--test-split", action="store_true", help="use t10k instead of the training split")
+    parser.add_argument("--corpus", default=None, help=".rlp corpus of 0/1 images")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--chunk", type=int, default=8192, help="images per task (MNIST tasks use chunk / 32)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--top", type=int, default=20, help="worst inputs to keep")
+    parser.add_argument("--out-dir", default=None, help="save worst.rlp / worst.json here")
+    parser.add_argument("--json", default=None, help="write the report as JSON")
+    args = parser.parse_args(argv)
+
+    plan = []
+    if args.random:
+        plan.append(("random", args.random, None))
+    if args.perturbed:
+        plan.append(("perturbed", args.perturbed, None))
+    if args.data:
+        raw, _ = load_mnist_raw(args.data, train=not args.test_split)
+        raw = raw[:args.dataset]
+        plan.append(("dataset", len(raw), raw))
+    if args.corpus:
+        packed, _ = read_corpus(args.corpus)
+        plan.append(("corpus", len(packed), packed))
+    if not plan:
+        parser.error("nothing to compare")
+
+    start = time.perf_counter()
+    report, worst = run_diff(args.weights, plan, args.workers, args.chunk, args.seed, args.top)
+    elapsed = time.perf_counter() - start
+    total_images = sum(count for _, count, _ in plan)
+
+    print_report(report)
+    print(f"{total_images} images in {elapsed:.1f} s ({total_images / elapsed:.0f} images/s, {args.workers} workers)")
+    if worst:
+        top = worst[0]
+        print(f"worst: {top[1]} shard {top[2]} index {top[3]}, disagree={top[0][0]}, max |logit error| {top[0][1]:.4f}")
+    if args.out_dir:
+        save_worst(args.out_dir, worst)
+        print(f"Saved {len(worst)} worst inputs to {args.out_dir}/worst.rlp and worst.json")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=1)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,129 @@
+# 定点整数推理，与红石机器的实际做法一致
+# 所有数值都以2^-14为单位的整数存储（即 rsr 的结果乘以2^14）。
+# 两个定点数相乘得到2^-28为单位的整数，每层累加完后只做一次舍入回到2^-14。
+# 由于 rsr 下的浮点运算本身是精确的，这里的结果与 redstone_lenet_forward.predict 完全一致。
+import operator
+
+from redstone_lenet_forward import rsr_int, argmax
+from redstone_lenet_packed import PIXELS, PACKED_BYTES, IMAGE_SIZE
+
+FRAC_BITS = 14
+ONE_WIDE = 1 << (2 * FRAC_BITS)   # 1.0，单位2^-28（乘积的单位）
+
+def round_shift(n, bits=FRAC_BITS):
+    """n / 2^bits 四舍六入五成双，与 rsr 里的 round 一致"""
+    q, r = divmod(n, 1 << bits)
+    half = 1 << (bits - 1)
+    if r > half or (r == half and q & 1):
+        q += 1
+    return q
+
+def unpack_fixed(packed):
+    """29 字节的打包图像 → 15x15 定点输入（0 或 2^14）"""
+    bits = int.from_bytes(packed, 'big') >> (PACKED_BYTES * 8 - PIXELS)
+    pixels = [((bits >> shift) & 1) << FRAC_BITS for shift in range(PIXELS - 1, -1, -1)]
+    return [pixels[i:i + IMAGE_SIZE] for i in range(0, PIXELS, IMAGE_SIZE)]
+
+def conv2d_fixed(input_q, weight_q, bias_q, stride=2):
+    """
+    input_q: 15x15 定点整数（单位2^-14）
+    weight_q: [1][1][3][3] 定点整数
+    bias_q: [1] 定点整数
+    return: 7x7 定点整数（单位2^-14），已做 ReLU 截断
+    """
+    K = 3
+    H_out = (len(input_q) - K) // stride + 1
+    W_out = (len(input_q[0]) - K) // stride + 1
+    kernel = weight_q[0][0]
+    bias = bias_q[0] << FRAC_BITS
+    output = []
+    for i in range(H_out):
+        rows = input_q[i*stride:i*stride+K]
+        row_out = []
+        for j in range(W_out):
+            acc = bias
+            for row, k_row in zip(rows, kernel):
+                acc += sum(map(operator.mul, row[j*stride:j*stride+K], k_row))
+            # relu_cut
+            acc = max(0, min(acc, ONE_WIDE))
+            row_out.append(round_shift(acc))
+        output.append(row_out)
+    return output
+
+def linear_fixed(input_q, weight_q, bias_q):
+    """
+    input_q: [N] 定点整数（单位2^-14）
+    weight_q: [M, N] 定点整数
+    bias_q: [M] 定点整数
+    return: [M] 未舍入的累加值（单位2^-28）
+    """
+    return [sum(map(operator.mul, row, input_q)) + (b << FRAC_BITS)
+            for row, b in zip(weight_q, bias_q)]
+
+def tanh_fixed(acc):
+    """Hard Tanh 后舍入回2^-14，acc 单位为2^-28"""
+    return round_shift(max(-ONE_WIDE, min(acc, ONE_WIDE)))
+
+def forward_fixed(binary_image, weight_q):
+    """
+    binary_image: 15x15 list of 0/1
+    weight_q: load_weights(path, fixed_point=True) 的结果
+    return: logits, list [10] of int，单位2^-28
+    binary_image 也可以是 pack_image 打包的 29 字节，此时直接从位得到定点输入
+    """
+    # ===== 输入量化 =====
+    if isinstance(binary_image, (bytes, bytearray)):
+        x = unpack_fixed(binary_image)
+    else:
+        x = [[rsr_int(v) for v in row] for row in binary_image]
+
+    # ===== Conv Layer =====
+    x = conv2d_fixed(x, weight_q['conv1.weight'], weight_q['conv1.bias'], stride=2)
+
+    # ===== Flatten =====
+    x = [v for row in x for v in row]
+
+    # ===== FC1 =====
+    x = [tanh_fixed(v) for v in linear_fixed(x, weight_q['fc1.weight'], weight_q['fc1.bias'])]
+
+    # ===== FC2 =====
+    x = [tanh_fixed(v) for v in linear_fixed(x, weight_q['fc2.weight'], weight_q['fc2.bias'])]
+
+    # ===== FC3 =====
+    return linear_fixed(x, weight_q['fc3.weight'], weight_q['fc3.bias'])
+
+def logits_to_float(logits_q):
+    """定点 logits 转为浮点，数值与 redstone_lenet_forward.forward 完全相同"""
+    return [v / ONE_WIDE for v in logits_q]
+
+def predict_fixed(binary_image, weight_q):
+    return argmax(forward_fixed(binary_image, weight_q))
+
+if __name__ == "__main__":
+    import glob
+    import random
+    import time
+
+    from redstone_lenet_forward import load_weights, predict, quantize_weights
+
+    weights = load_weights("redstone_lenet.pth")
+    weights_q = quantize_weights(weights)
+
+    images = []
+    for path in sorted(glob.glob("pre_draw/*.csv")):
+        with open(path) as f:
+            images.append([[int(v) for v in line.split(',')] for line in f if line.strip()])
+    random.seed(0)
+    images += [[[int(random.random() < 0.3) for _ in range(15)] for _ in range(15)] for _ in range(200)]
+
+    def per_image(fn, w):
+        start = time.perf_counter()
+        preds = [fn(img, w) for img in images]
+        return preds, (time.perf_counter() - start) / len(images)
+
+    preds_float, t_float = per_image(predict, weights)
+    preds_fixed, t_fixed = per_image(predict_fixed, weights_q)
+    assert preds_float == preds_fixed
+    print(f"predict:       {t_float * 1e6:8.1f} us/image")
+    print(f"predict_fixed: {t_fixed * 1e6:8.1f} us/image")
+    print(f"speedup:       {t_float / t_fixed:8.1f}x on {len(images)} images")
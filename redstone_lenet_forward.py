@@ -1,5 +1,8 @@
 import math
-import torch
+import time
+import numpy as np
+
+from redstone_lenet_packed import is_packed, unpack_image, unpack_images
 
 def relu_cut(x):
     return max(0.0, min(x, 1.0))
@@ -26,6 +29,22 @@ def rsr(x):
     nearest_value = nearest_multiple * unit
     return nearest_value
 
+def rsr_int(x):
+    """与 rsr 相同的舍入，但返回2^-14的整数倍数本身（定点数）"""
+    x = float(x)
+    if not (-2 <= x <= 2):
+        raise ValueError(f"输入值必须在 2^-14 到 2 之间，输入值为{x}")
+    return round(x / 2 ** -14)
+
+def rsr_array(x):
+    """rsr 的 NumPy 版本，对整个数组逐元素取最近的2^-14整数倍"""
+    x = np.asarray(x, dtype=np.float64)
+    if not (np.all(x >= -2) and np.all(x <= 2)):
+        raise ValueError(f"输入值必须在 2^-14 到 2 之间，输入值范围为[{x.min()}, {x.max()}]")
+    unit = 2 ** -14
+    # np.round 与 round 一样是四舍六入五成双
+    return np.round(x / unit) * unit
+
 def conv2d_manual(input_tensor, weight, bias, stride=2):
     """
     input_tensor: list of list of float, shape [28][28]
@@ -73,14 +92,35 @@ def linear_manual(input_vec, weight_matrix, bias_vec):
         output.append(acc)
     return output
 
-def load_weights(filepath):
+def quantize_weights(weight_dict):
+    """
+    把 list 形式的权重一次性转换为2^-14整数倍的定点整数，供 redstone_lenet_fixed 使用
+    """
+    def quantize(value):
+        if isinstance(value, list):
+            return [quantize(v) for v in value]
+        return rsr_int(value)
+    return {key: quantize(value) for key, value in weight_dict.items()}
+
+def load_weights(filepath, fixed_point=False):
     """
     加载后立即转换为普通list
+    fixed_point: 为True时直接返回定点整数形式（见 quantize_weights）
+    filepath 为 export_weights.py 导出的 .rlw 文件时不需要 torch
     """
+    if filepath.endswith('.rlw'):
+        from redstone_lenet_weights import load_compiled_weights
+        compiled = load_compiled_weights(filepath, fixed_point=fixed_point)
+        return {key: value.tolist() for key, value in compiled.items()}
+
+    # torch 只在加载 .pth 时才需要，放到这里避免拖慢只做推理的进程启动
+    import torch
     raw_weights = torch.load(filepath, map_location=torch.device('cpu'))
     clean_weights = {}
     for key, value in raw_weights.items():
         clean_weights[key] = value.cpu().numpy().tolist()
+    if fixed_point:
+        return quantize_weights(clean_weights)
     return clean_weights
 
 def argmax(vec):
@@ -95,45 +135,183 @@ def argmax(vec):
             max_idx = i
     return max_idx
 
-def predict(binary_image, weight_dict):
+def forward(binary_image, weight_dict):
     """
     binary_image: 15x15 list of 0/1
     weight_dict: torch.load from redstone_lenet.pth, into list-based form
+    return: logits, list [10]
+    binary_image 也可以是 pack_image 打包的 29 字节
+    注册了逐层 hook（register_layer_hook）时每层算完调用一次 hook，没有 hook 时只多几次判断
     """
-    # print(f"[DEBUG] input:")
-    # print(f"[DEBUG] type(binary_image) = {type(binary_image)}")
-    # print(f"[DEBUG] len(binary_image) = {len(binary_image)}")
+    if isinstance(binary_image, (bytes, bytearray)):
+        binary_image = unpack_image(binary_image)
+    return _forward_layers(binary_image, weight_dict, _emit if _hooks_active else None)
 
+def _forward_layers(binary_image, weight_dict, emit=None):
+    """
+    emit: 可选，每层算完调用 emit(layer, start, output, macs, rsr_calls)，start 为这一层开始的时刻
+    """
     # ===== Conv Layer =====
+    start = time.perf_counter() if emit else None
     w_conv = weight_dict['conv1.weight']  # shape [1,1,3,3]
     b_conv = weight_dict['conv1.bias']    # shape [1]
-    x = conv2d_manual(binary_image, w_conv, b_conv, stride=2)  # → [1, 7, 7]
-    # print(f"[DEBUG] after Conv Layer:")
-    # print(f"[DEBUG] type(x) = {type(x)}")
-    # print(f"[DEBUG] len(x) = {len(x)}")
+    x = conv2d_manual(binary_image, w_conv, b_conv, stride=2)  # → [7, 7]
+    if emit:
+        outputs = len(x) * len(x[0])
+        emit("conv", start, x, outputs * 9, outputs * (2 * 9 + 1))
 
     # ===== Flatten =====
+    start = time.perf_counter() if emit else None
     x = flatten(x)  # shape [49]
-    # print(f"[DEBUG] after Flatten:")
-    # print(f"[DEBUG] type(x) = {type(x)}")
-    # print(f"[DEBUG] len(x) = {len(x)}")
+    if emit:
+        emit("flatten", start, x, 0, 0)
+
+    # ===== FC1 / FC2 / FC3 =====
+    # fc1: [30, 49]，fc2: [30, 30]，fc3: [10, 30]，只有 fc3 之后没有 Hard Tanh
+    for layer in ("fc1", "fc2", "fc3"):
+        start = time.perf_counter() if emit else None
+        w, b = weight_dict[f'{layer}.weight'], weight_dict[f'{layer}.bias']
+        x = linear_manual(x, w, b)
+        if layer != "fc3":
+            x = [tanh(v) for v in x]
+        if emit:
+            emit(layer, start, x, *_linear_counts(w))
+    return x
+
+# ===== 逐层 hook =====
+
+LAYERS = ("conv", "flatten", "fc1", "fc2", "fc3")
+_layer_hooks = {layer: [] for layer in LAYERS}
+_hooks_active = False
+
+class HookHandle:
+    """register_layer_hook 的返回值，调用 remove() 注销"""
+    def __init__(self, layer, callback):
+        self.layer = layer
+        self.callback = callback
+
+    def remove(self):
+        global _hooks_active
+        hooks = _layer_hooks[self.layer]
+        if self.callback in hooks:
+            hooks.remove(self.callback)
+        _hooks_active = any(_layer_hooks.values())
+
+def register_layer_hook(layer, callback):
+    """
+    forward 每算完一层调用一次 callback(layer, output, info)
+    layer: LAYERS 之一；output: 这一层（含激活函数）的输出，不要修改它
+    info: {"seconds": 这一层的耗时, "macs": 乘加次数, "rsr_calls": rsr 调用次数}
+    return: HookHandle
+    """
+    global _hooks_active
+    if layer not in _layer_hooks:
+        raise ValueError(f"未知的层 {layer!r}，可选 {LAYERS}")
+    _layer_hooks[layer].append(callback)
+    _hooks_active = True
+    return HookHandle(layer, callback)
+
+def clear_layer_hooks():
+    global _hooks_active
+    for hooks in _layer_hooks.values():
+        hooks.clear()
+    _hooks_active = False
+
+def _emit(layer, start, output, macs, rsr_calls):
+    info = {"seconds": time.perf_counter() - start, "macs": macs, "rsr_calls": rsr_calls}
+    for callback in list(_layer_hooks[layer]):
+        callback(layer, output, info)
+
+def _linear_counts(weight_matrix):
+    """linear_manual 的乘加次数与 rsr 调用次数：每次乘加 2 次，每个偏置 1 次"""
+    macs = sum(len(row) for row in weight_matrix)
+    return macs, 2 * macs + len(weight_matrix)
+
+def predict(binary_image, weight_dict):
+    """
+    binary_image: 15x15 list of 0/1
+    weight_dict: torch.load from redstone_lenet.pth, into list-based form
+    """
+    # ===== Argmax 输出结果 =====
+    return argmax(forward(binary_image, weight_dict))
+
+def conv2d_batch(images, weight, bias, stride=2):
+    """
+    conv2d_manual 的批量版本
+    images: array [N][15][15]
+    weight: [1][1][3][3]
+    bias: [1]
+    return: array [N][7][7]
+    """
+    K = 3
+    x = rsr_array(images)
+    w = rsr_array(weight)[0][0]
+    N, H, W = x.shape
+    H_out = (H - K) // stride + 1
+    W_out = (W - K) // stride + 1
+    output = np.zeros((N, H_out, W_out))
+
+    # 每个卷积核元素对应一次整批的跨步切片乘加
+    for ki in range(K):
+        for kj in range(K):
+            window = x[:, ki:ki + stride*(H_out-1) + 1:stride, kj:kj + stride*(W_out-1) + 1:stride]
+            output += window * w[ki][kj]
+    output += rsr_array(bias)[0]
+    return np.clip(output, 0.0, 1.0)
+
+def linear_batch(input_mat, weight_matrix, bias_vec):
+    """
+    linear_manual 的批量版本
+    input_mat: array [N, In]
+    weight_matrix: [Out, In]
+    bias_vec: [Out]
+    return: array [N, Out]
+    """
+    # 所有操作数都是2^-14的整数倍，乘积与求和在float64中都是精确的，
+    # 所以累加顺序不影响结果，与 linear_manual 逐位相同
+    # 从0.0开始累加，与 linear_manual 一样不会产生-0.0
+    output = np.zeros((input_mat.shape[0], len(weight_matrix)))
+    output += rsr_array(input_mat) @ rsr_array(weight_matrix).T
+    output += rsr_array(bias_vec)
+    return output
+
+def forward_batch(images, weight_dict):
+    """
+    forward 的批量版本
+    images: array [N][15][15] of 0/1
+    weight_dict: load_weights 的结果，或同样键名的 NumPy 数组
+    return: logits, array [N, 10]
+    images 也可以是 pack_images / read_corpus 得到的 [N, 29] uint8 打包数组
+    """
+    if is_packed(images):
+        images = unpack_images(images)
+    images = np.asarray(images, dtype=np.float64)
+    if images.ndim == 2:
+        images = images[np.newaxis]
+
+    # ===== Conv Layer =====
+    x = conv2d_batch(images, weight_dict['conv1.weight'], weight_dict['conv1.bias'], stride=2)  # → [N, 7, 7]
+
+    # ===== Flatten =====
+    x = x.reshape(x.shape[0], -1)  # shape [N, 49]
 
     # ===== FC1 =====
-    w1 = weight_dict['fc1.weight']  # [30, 49]
-    b1 = weight_dict['fc1.bias']    # [30]
-    x = linear_manual(x, w1, b1)
-    x = [tanh(v) for v in x]
+    x = linear_batch(x, weight_dict['fc1.weight'], weight_dict['fc1.bias'])
+    x = np.clip(x, -1, 1)
 
     # ===== FC2 =====
-    w2 = weight_dict['fc2.weight']  # [30, 30]
-    b2 = weight_dict['fc2.bias']
-    x = linear_manual(x, w2, b2)
-    x = [tanh(v) for v in x]
+    x = linear_batch(x, weight_dict['fc2.weight'], weight_dict['fc2.bias'])
+    x = np.clip(x, -1, 1)
 
     # ===== FC3 =====
-    w3 = weight_dict['fc3.weight']  # [10, 30]
-    b3 = weight_dict['fc3.bias']
-    x = linear_manual(x, w3, b3)
+    x = linear_batch(x, weight_dict['fc3.weight'], weight_dict['fc3.bias'])
+    return x
 
-    # ===== Argmax 输出结果 =====
-    return argmax(x)
+def predict_batch(images, weight_dict):
+    """
+    predict 的批量版本，与逐张调用 predict 的结果完全一致
+    images: array [N][15][15] of 0/1
+    return: array [N] of predicted labels
+    """
+    # np.argmax 与 argmax 一样，并列时取第一个
+    return np.argmax(forward_batch(images, weight_dict), axis=1)
@@ -0,0 +1,115 @@
+# 增量推理：边画边识别时，一次只改动一个像素
+# stride 2 的 3x3 卷积里一个像素最多影响 4 个卷积输出，每个卷积输出只影响 fc1 的一列（30 个累加器），
+# 所以保存卷积累加值和 fc1 的累加值，翻转像素时只更新受影响的部分，再重新算很小的 fc2 / fc3。
+# 所有部分和都是 2^-28 的整数倍，在 float64 中精确，增量更新的结果与从头计算的 forward 逐位相同。
+#   model = IncrementalPredictor(load_weights("redstone_lenet.rlw"))
+#   model.set_pixel(7, 3, 1)
+#   model.predict()
+import operator
+
+from redstone_lenet_forward import rsr, relu_cut, tanh, argmax
+from redstone_lenet_sparse import prepare_sparse
+
+class IncrementalPredictor:
+    def __init__(self, weight_dict, image=None, image_size=15):
+        self.sparse = prepare_sparse(weight_dict)
+        self.image_size = image_size
+        self.fc2 = ([[rsr(w) for w in row] for row in weight_dict['fc2.weight']], [rsr(b) for b in weight_dict['fc2.bias']])
+        self.fc3 = ([[rsr(w) for w in row] for row in weight_dict['fc3.weight']], [rsr(b) for b in weight_dict['fc3.bias']])
+        self.clear()
+        if image is not None:
+            self.load(image)
+
+    def clear(self):
+        """清空画布"""
+        sparse = self.sparse
+        self.image = [[0] * self.image_size for _ in range(self.image_size)]
+        self.conv_acc = [0.0] * (sparse.out_size * sparse.out_size)  # 卷积的乘积和，不含偏置
+        self.conv_q = [rsr(relu_cut(sparse.conv_bias))] * len(self.conv_acc)  # relu_cut 后再 rsr，即 fc1 的输入
+        # fc1 的乘积和（不含偏置），从输入全为当前 conv_q 开始
+        self.fc1_acc = [0.0] * len(sparse.fc1_bias)
+        for q, column in zip(self.conv_q, sparse.fc1_columns):
+            if q:
+                self.fc1_acc = [a + q * w for a, w in zip(self.fc1_acc, column)]
+        self._logits = None
+        self.updates = 0  # 被更新的卷积输出个数，用来观察增量更新的工作量
+
+    def load(self, image):
+        """用整张图替换画布（逐个像素增量更新）"""
+        for r, row in enumerate(image):
+            for c, value in enumerate(row):
+                self.set_pixel(r, c, value)
+
+    def set_pixel(self, r, c, value):
+        """
+        把像素 (r, c) 设为 value，只更新受影响的卷积输出和 fc1 累加值
+        return: 像素是否真的改变了
+        """
+        old = self.image[r][c]
+        if old == value:
+            return False
+        self.image[r][c] = value
+        delta = rsr(value) - rsr(old)
+        if not delta:
+            return True
+
+        sparse = self.sparse
+        for index, w in sparse.pixel_targets[r][c]:
+            self.conv_acc[index] += delta * w
+            q = rsr(relu_cut(self.conv_acc[index] + sparse.conv_bias))
+            dq = q - self.conv_q[index]
+            if dq:
+                self.conv_q[index] = q
+                self.fc1_acc = [a + dq * w1 for a, w1 in zip(self.fc1_acc, sparse.fc1_columns[index])]
+            self.updates += 1
+        self._logits = None
+        return True
+
+    def logits(self):
+        """与 forward(self.image, weight_dict) 逐位相同，只重新计算 fc1 的激活和 fc2 / fc3"""
+        if self._logits is None:
+            x = [tanh(a + b) for a, b in zip(self.fc1_acc, self.sparse.fc1_bias)]
+            for layer, activation in ((self.fc2, tanh), (self.fc3, None)):
+                rows, bias = layer
+                xq = [rsr(v) for v in x]
+                x = [sum(map(operator.mul, xq, row), 0.0) + b for row, b in zip(rows, bias)]
+                if activation is not None:
+                    x = [activation(v) for v in x]
+            self._logits = x
+        return self._logits
+
+    def predict(self):
+        return argmax(self.logits())
+
+if __name__ == "__main__":
+    # 模拟边画边识别：按笔画顺序逐个点亮像素，每一步都取一次预测
+    import time
+
+    from redstone_lenet_forward import load_weights, predict
+    from redstone_lenet_packed import read_csv_image
+
+    weights = load_weights("redstone_lenet.rlw")
+    image = read_csv_image("pre_draw/dig9_a.csv")
+    strokes = [(r, c) for r in range(15) for c in range(15) if image[r][c]]
+
+    start = time.perf_counter()
+    canvas = [[0] * 15 for _ in range(15)]
+    full = []
+    for r, c in strokes:
+        canvas[r][c] = 1
+        full.append(predict(canvas, weights))
+    t_full = (time.perf_counter() - start) / len(strokes)
+
+    start = time.perf_counter()
+    model = IncrementalPredictor(weights)
+    incremental = []
+    for r, c in strokes:
+        model.set_pixel(r, c, 1)
+        incremental.append(model.predict())
+    t_incremental = (time.perf_counter() - start) / len(strokes)
+
+    assert incremental == full
+    print(f"{len(strokes)} strokes, final prediction {incremental[-1]}")
+    print(f"predict per stroke:     {t_full * 1e6:8.1f} us")
+    print(f"incremental per stroke: {t_incremental * 1e6:8.1f} us ({t_full / t_incremental:.1f}x), "
+          f"{model.updates / len(strokes):.1f} conv outputs updated per stroke")
@@ -0,0 +1,158 @@
+# redstone_lenet_server.py 的压测工具：concurrency 个保持连接的客户端在 duration 秒内不停发送 /predict
+#   python redstone_lenet_loadgen.py --url http://127.0.0.1:8015 --concurrency 64 --duration 5
+#   python redstone_lenet_loadgen.py --unix /tmp/redstone_lenet.sock
+#   python redstone_lenet_loadgen.py --compare                # 在本进程里启动服务，比较不合批与合批的吞吐量
+# 请求用 pre_draw 的手绘数字，响应的预测与 --weights（默认 default_weights_path）下 predict 的结果不一致时计为错误
+import argparse
+import asyncio
+import glob
+import json
+import sys
+import time
+from urllib.parse import urlsplit
+
+import numpy as np
+
+from redstone_lenet_packed import read_csv_image
+
+def request_bodies(weight_dict=None):
+    """return: [(请求报文体, 期望的预测)]，期望值用 weight_dict 下的 predict 算出；weight_dict 为 None 时期望值为 None，不检查"""
+    from redstone_lenet_forward import predict
+    bodies = []
+    for path in sorted(glob.glob("pre_draw/*.csv")):
+        image = read_csv_image(path)
+        expected = predict(image, weight_dict) if weight_dict is not None else None
+        bodies.append((json.dumps({"image": image}).encode(), expected))
+    return bodies
+
+async def _open(url=None, unix=None):
+    if unix is not None:
+        return await asyncio.open_unix_connection(unix)
+    parts = urlsplit(url)
+    return await asyncio.open_connection(parts.hostname, parts.port or 80)
+
+async def _post(reader, writer, body):
+    writer.write(b"POST /predict HTTP/1.1\r\nHost: localhost\r\nContent-Type: application/json\r\n"
+                 b"Content-Length: %d\r\n\r\n" % len(body) + body)
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        if name.strip().lower() == "content-length":
+            length = int(value)
+    return status, json.loads(await reader.readexactly(length))
+
+async def fetch_metrics(url=None, unix=None):
+    reader, writer = await _open(url, unix)
+    writer.write(b"GET /metrics HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n\r\n")
+    data = await reader.read()
+    writer.close()
+    return json.loads(data.partition(b"\r\n\r\n")[2])
+
+async def run_load(url=None, unix=None, concurrency=64, duration=5.0, bodies=None):
+    """
+    return: dict(requests, errors, throughput_rps, latency_ms{p50, p95, p99})，延迟在客户端测量
+    """
+    bodies = bodies or request_bodies()
+    latencies, errors = [], 0
+    stop_at = time.perf_counter() + duration
+
+    async def client(offset):
+        nonlocal errors
+        reader, writer = await _open(url, unix)
+        i = offset
+        try:
+            while time.perf_counter() < stop_at:
+                body, expected = bodies[i % len(bodies)]
+                start = time.perf_counter()
+                status, payload = await _post(reader, writer, body)
+                latencies.append(time.perf_counter() - start)
+                if status != 200 or (expected is not None and payload["prediction"] != expected):
+                    errors += 1
+                i += 1
+        finally:
+            writer.close()
+            await writer.wait_closed()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client(k) for k in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    p50, p95, p99 = np.percentile(np.array(latencies) * 1e3, [50, 95, 99]).tolist() if latencies else (0.0,) * 3
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput_rps": len(latencies) / elapsed,
+        "latency_ms": {"p50": p50, "p95": p95, "p99": p99},
+    }
+
+def print_row(name, result, server_metrics=None):
+    lat = result["latency_ms"]
+    batch = f"{server_metrics['mean_batch_size']:10.1f}" if server_metrics else f"{'':>10s}"
+    print(f"{name:>16s} {result['throughput_rps']:10.0f} {lat['p50']:8.2f} {lat['p95']:8.2f} {lat['p99']:8.2f} "
+          f"{batch} {result['errors']:7d}")
+
+async def compare(weight_dict, max_batches, concurrency, duration, max_wait_ms, workers):
+    """在本进程里依次以不同的 max_batch 启动服务并压测，max_batch=1 即每个请求单独推理"""
+    from redstone_lenet_server import start_server, stop_server
+
+    bodies = request_bodies(weight_dict)
+
+    results = {}
+    for max_batch in max_batches:
+        server, batcher, executor = await start_server(weight_dict, port=0, max_batch=max_batch,
+                                                       max_wait_ms=max_wait_ms, workers=workers)
+        url = "http://127.0.0.1:%d" % server.sockets[0].getsockname()[1]
+        try:
+            await run_load(url, concurrency=concurrency, duration=0.3, bodies=bodies)  # 预热
+            batcher.metrics.reset()
+            result = await run_load(url, concurrency=concurrency, duration=duration, bodies=bodies)
+            print_row(f"max_batch={max_batch}", result, batcher.metrics.snapshot())
+            results[max_batch] = result
+        finally:
+            await stop_server(server, batcher, executor)
+    return results
+
+HEADER = f"{'':>16s} {'req/s':>10s} {'p50 ms':>8s} {'p95 ms':>8s} {'p99 ms':>8s} {'mean batch':>10s} {'errors':>7s}"
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load-test redstone_lenet_server.py")
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument("--url", default="http://127.0.0.1:8015")
+    target.add_argument("--unix", default=None)
+    target.add_argument("--compare", action="store_true", help="start servers in-process and compare batching")
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--duration", type=float, default=5.0)
+    parser.add_argument("--max-batch", type=int, nargs="+", default=[1, 64], help="with --compare")
+    parser.add_argument("--max-wait-ms", type=float, default=2.0, help="with --compare")
+    parser.add_argument("--workers", type=int, default=1, help="with --compare")
+    parser.add_argument("--weights", default=None, help="weights the server uses, to check its predictions")
+    args = parser.parse_args(argv)
+
+    from classify import default_weights_path
+    from redstone_lenet_forward import load_weights
+
+    weights = load_weights(args.weights or default_weights_path())
+    print(HEADER)
+    if args.compare:
+        results = asyncio.run(compare(weights, args.max_batch, args.concurrency, args.duration,
+                                      args.max_wait_ms, args.workers))
+        base = results[args.max_batch[0]]["throughput_rps"]
+        for max_batch, result in results.items():
+            print(f"max_batch={max_batch}: {result['throughput_rps'] / base:.2f}x throughput")
+        return 1 if any(r["errors"] for r in results.values()) else 0
+
+    async def run():
+        result = await run_load(args.url, args.unix, args.concurrency, args.duration, request_bodies(weights))
+        return result, await fetch_metrics(args.url, args.unix)
+
+    result, server_metrics = asyncio.run(run())
+    print_row("client", result, server_metrics)
+    print("server metrics: " + json.dumps(server_metrics))
+    return 1 if result["errors"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,169 @@
+# 15x15 0/1 图像的位压缩格式：225 位按行优先打包成 29 字节（最后 7 位补 0）
+#
+# 图像集文件（.rlp，小端）：
+#   文件头 16 字节：magic "RLNP", 版本, 标志位(1=带标签), 图像个数
+#   图像区：个数 x 29 字节
+#   标签区：个数 x 1 字节（仅当带标签时）
+# read_corpus 用 np.memmap 映射，几百万张图也只占页缓存，一次读入即可
+import csv
+import struct
+
+import numpy as np
+
+IMAGE_SIZE = 15
+PIXELS = IMAGE_SIZE * IMAGE_SIZE
+PACKED_BYTES = (PIXELS + 7) // 8  # 29
+
+MAGIC = b"RLNP"
+VERSION = 1
+FLAG_LABELS = 1
+HEADER = struct.Struct("<4sHHQ")
+
+# ===== csv =====
+
+def read_csv_image(path):
+    """读取 pre_draw/ 里的 15x15 0/1 csv"""
+    with open(path, newline='') as csvfile:
+        return [[int(v) for v in row] for row in csv.reader(csvfile) if row]
+
+def write_csv_image(path, image):
+    with open(path, 'w', newline='') as csvfile:
+        spamwriter = csv.writer(csvfile, quotechar='|', quoting=csv.QUOTE_MINIMAL)
+        for row in image:
+            spamwriter.writerow([int(i) for i in row])
+
+# ===== 打包 / 解包 =====
+
+def pack_images(images):
+    """
+    images: [N][15][15] 的 0/1 数组、list 或 [N][1][15][15] 的 tensor
+    return: uint8 array [N, 29]
+    """
+    images = np.asarray(images)
+    bits = images.reshape(-1, PIXELS) != 0
+    return np.packbits(bits, axis=1)
+
+def unpack_images(packed):
+    """
+    packed: uint8 array [N, 29]
+    return: uint8 array [N, 15, 15]
+    """
+    packed = np.asarray(packed, dtype=np.uint8).reshape(-1, PACKED_BYTES)
+    bits = np.unpackbits(packed, axis=1, count=PIXELS)
+    return bits.reshape(-1, IMAGE_SIZE, IMAGE_SIZE)
+
+def pack_image(image):
+    """单张图 → 29 字节的 bytes"""
+    return pack_images(image)[0].tobytes()
+
+def unpack_image(packed):
+    """29 字节 → 15x15 list of 0/1，纯 Python，供逐张推理使用"""
+    bits = int.from_bytes(packed, 'big') >> (PACKED_BYTES * 8 - PIXELS)
+    shift = PIXELS
+    rows = []
+    for _ in range(IMAGE_SIZE):
+        row = []
+        for _ in range(IMAGE_SIZE):
+            shift -= 1
+            row.append((bits >> shift) & 1)
+        rows.append(row)
+    return rows
+
+def is_packed(images):
+    """判断 forward_batch 等收到的是不是 [N, 29] 的打包数组"""
+    return isinstance(images, np.ndarray) and images.dtype == np.uint8 \
+        and images.ndim == 2 and images.shape[1] == PACKED_BYTES
+
+def csv_to_packed(path):
+    return pack_image(read_csv_image(path))
+
+def packed_to_csv(path, packed):
+    write_csv_image(path, unpack_image(packed))
+
+def to_tensor(packed):
+    """[N, 29] → float32 tensor [N, 1, 15, 15]，与 SkeletonizeTransform 的输出一致"""
+    import torch
+    return torch.from_numpy(unpack_images(packed).astype(np.float32)).unsqueeze(1)
+
+# ===== 图像集文件 =====
+
+class CorpusWriter:
+    """
+    流式写入 .rlp 文件，图像数在关闭时回填到文件头
+    with CorpusWriter("digits.rlp", labels=True) as w:
+        w.write(images, labels)
+    """
+    def __init__(self, path, labels=False):
+        self.path = path
+        self.with_labels = labels
+        self.count = 0
+        self.labels = bytearray()
+        self.f = open(path, "wb")
+        self.f.write(HEADER.pack(MAGIC, VERSION, 0, 0))
+
+    def write(self, images, labels=None):
+        packed = images if is_packed(images) else pack_images(images)
+        if self.with_labels:
+            if labels is None or len(labels) != len(packed):
+                raise ValueError("每张图都需要一个标签")
+            self.labels += np.asarray(labels, dtype=np.uint8).tobytes()
+        self.f.write(np.ascontiguousarray(packed).tobytes())
+        self.count += len(packed)
+
+    def close(self):
+        if self.f.closed:
+            return
+        if self.with_labels:
+            self.f.write(self.labels)
+        self.f.seek(0)
+        self.f.write(HEADER.pack(MAGIC, VERSION, FLAG_LABELS if self.with_labels else 0, self.count))
+        self.f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def write_corpus(path, images, labels=None):
+    with CorpusWriter(path, labels=labels is not None) as w:
+        w.write(images, labels)
+
+def read_corpus(path):
+    """
+    return: (packed, labels)，都是只读的 np.memmap，labels 在文件不带标签时为 None
+    """
+    with open(path, "rb") as f:
+        magic, version, flags, count = HEADER.unpack(f.read(HEADER.size))
+    if magic != MAGIC:
+        raise ValueError("不是 .rlp 图像集文件")
+    if version != VERSION:
+        raise ValueError(f"不支持的 .rlp 版本: {version}")
+    if count == 0:
+        return np.zeros((0, PACKED_BYTES), dtype=np.uint8), (np.zeros(0, dtype=np.uint8) if flags & FLAG_LABELS else None)
+    packed = np.memmap(path, dtype=np.uint8, mode="r", offset=HEADER.size, shape=(count, PACKED_BYTES))
+    labels = None
+    if flags & FLAG_LABELS:
+        labels = np.memmap(path, dtype=np.uint8, mode="r", offset=HEADER.size + count * PACKED_BYTES, shape=(count,))
+    return packed, labels
+
+def iter_batches(packed, batch_size=4096):
+    """按批解包，内存占用只和 batch_size 有关"""
+    for start in range(0, len(packed), batch_size):
+        yield start, unpack_images(packed[start:start + batch_size])
+
+if __name__ == "__main__":
+    # 把 pre_draw/ 里的 csv 打包成一个带标签的图像集，标签取自文件名 digN
+    import glob
+    import os
+    import re
+
+    paths = [p for p in sorted(glob.glob("pre_draw/dig*.csv"))]
+    images = [read_csv_image(p) for p in paths]
+    labels = [int(re.match(r"dig(\d)", os.path.basename(p)).group(1)) for p in paths]
+    write_corpus("pre_draw/pre_draw.rlp", images, labels)
+
+    packed, read_labels = read_corpus("pre_draw/pre_draw.rlp")
+    assert (unpack_images(packed) == np.array(images)).all() and list(read_labels) == labels
+    csv_bytes = sum(os.path.getsize(p) for p in paths)
+    print(f"{len(paths)} images: csv {csv_bytes} bytes → rlp {os.path.getsize('pre_draw/pre_draw.rlp')} bytes")
@@ -0,0 +1,232 @@
+# 定点精度扫描：rsr 固定为 2^-14 的网格和 [-2, 2] 的范围，这里把小数位数和舍入方式当成参数，
+# 在同一个评估集上一次算出所有 (位数, 舍入方式) 组合的准确率，找出够用的最小位宽。
+#   python redstone_lenet_precision.py                                  # t10k 骨架库，8 ~ 16 位，nearest / truncate
+#   python redstone_lenet_precision.py --bits 4 5 6 7 8 10 12 14 --plot precision.png
+#   python redstone_lenet_precision.py --corpus pre_draw/pre_draw.rlp --bits 6 8 10
+# 评估集默认取 data/skeleton_bank_test.rlb（不存在时用 --data 下的 MNIST 建一次，之后直接读缓存）。
+# 舍入方式：nearest 为四舍六入五成双（即 rsr），truncate 为向 0 截断（红石浮点的符号-幅值表示里直接丢掉低位）。
+# 所有组合共用的部分只算一次：输入是 0/1，任何位宽下量化都不改变它，卷积的 3x3 窗口只展开一次；
+# 之后每一层都把组合放在第一维，用一次批量矩阵乘法算完所有组合。位数不超过 20 时乘积与部分和在 float64 中精确，
+# 14 位 nearest 的结果与 forward_batch（即 predict）逐位相同。
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+MODES = ("nearest", "truncate")
+MAX_BITS = 20
+
+def quantize(x, bits, mode="nearest", limit=2.0):
+    """
+    bits: 小数位数，网格为 2^-bits；bits 为 None 时不量化
+    超出 [-limit, limit] 的值饱和到边界（rsr 会直接报错，扫描时只计数，见 sweep 的 saturated）
+    """
+    x = np.asarray(x, dtype=np.float64)
+    if bits is not None:
+        unit = 2.0 ** -bits
+        x = (np.round(x / unit) if mode == "nearest" else np.trunc(x / unit)) * unit
+    return np.clip(x, -limit, limit)
+
+def _quantize_stack(x, configs, limit):
+    """
+    x: [C, ...]，第 c 个切片按 configs[c] 量化
+    return: (量化结果 [C, ...], 每个组合里被饱和的值的个数 [C])
+    """
+    saturated = (np.abs(x) > limit).reshape(len(configs), -1).sum(axis=1)
+    return np.stack([quantize(xc, bits, mode, limit) for xc, (bits, mode) in zip(x, configs)]), saturated
+
+def conv_patches(images, kernel=3, stride=2):
+    """0/1 图像 [N, 15, 15] → 卷积窗口 [N, 49, 9]，与量化位数无关，所有组合共用"""
+    images = np.asarray(images, dtype=np.float64)
+    n, h, w = images.shape
+    out = (h - kernel) // stride + 1
+    patches = np.empty((n, out * out, kernel * kernel))
+    for ki in range(kernel):
+        for kj in range(kernel):
+            window = images[:, ki:ki + stride * (out - 1) + 1:stride, kj:kj + stride * (out - 1) + 1:stride]
+            patches[:, :, ki * kernel + kj] = window.reshape(n, -1)
+    return patches
+
+def quantized_weight_stack(weight_dict, configs, limit=2.0):
+    """return: ({name: [C, ...] 量化后的权重}, 超出范围被饱和的权重个数)，权重的饱和与位数无关"""
+    stacks, saturated = {}, 0
+    for name, value in weight_dict.items():
+        value = np.asarray(value, dtype=np.float64)
+        stacks[name] = np.stack([quantize(value, bits, mode, limit) for bits, mode in configs])
+        saturated += int((np.abs(value) > limit).sum())
+    return stacks, saturated
+
+def forward_sweep(patches, stacks, configs, limit=2.0):
+    """
+    patches: conv_patches 的结果 [N, 49, 9]
+    stacks: quantized_weight_stack 的结果
+    return: (logits [C, N, 10], 每个组合里被饱和的激活值个数 [C])
+    第 c 个 logits 与按 configs[c] 量化的 forward_batch 相同（不发生饱和时）
+    """
+    kernel = stacks['conv1.weight'].reshape(len(configs), -1)                    # [C, 9]
+    x = np.einsum('npk,ck->cnp', patches, kernel) + stacks['conv1.bias'][:, :1, None]
+    x = np.clip(x, 0.0, 1.0)                                                     # [C, N, 49]
+    saturated = np.zeros(len(configs), dtype=np.int64)
+    for layer in ("fc1", "fc2", "fc3"):
+        x, count = _quantize_stack(x, configs, limit)
+        saturated += count
+        x = np.matmul(x, stacks[f'{layer}.weight'].transpose(0, 2, 1)) + stacks[f'{layer}.bias'][:, None, :]
+        if layer != "fc3":
+            x = np.clip(x, -1.0, 1.0)
+    return x, saturated
+
+def sweep(images, labels, weight_dict, bits_list, modes=MODES, limit=2.0, chunk=4096):
+    """
+    一次评估所有 (bits, mode) 组合，另外带一个不量化的 float 参考（bits 为 None）
+    return: dict(configs, accuracy [C], agreement [C]（与 14 位 nearest 即 predict 的预测一致的比例），
+                 saturated [C]（被饱和到 ±limit 的权重与激活值个数）, seconds)
+    """
+    if max(bits_list) > MAX_BITS:
+        raise ValueError(f"bits 超过 {MAX_BITS} 时 float64 不能精确表示乘积和部分和")
+    images = np.asarray(images)
+    if not np.isin(images, (0, 1)).all():
+        raise ValueError("评估集必须是 0/1 图像")
+    configs = [(None, "float")] + [(bits, mode) for mode in modes for bits in sorted(bits_list)] + [(14, "nearest")]
+    labels = np.asarray(labels, dtype=np.int64)
+
+    start = time.perf_counter()
+    stacks, weight_saturated = quantized_weight_stack(weight_dict, configs, limit)
+    saturated = np.full(len(configs), weight_saturated, dtype=np.int64)
+    correct = np.zeros(len(configs), dtype=np.int64)
+    agree = np.zeros(len(configs), dtype=np.int64)
+    for s in range(0, len(labels), chunk):
+        logits, count = forward_sweep(conv_patches(images[s:s + chunk]), stacks, configs, limit)
+        saturated += count
+        preds = logits.argmax(axis=2)                                            # [C, n]
+        correct += (preds == labels[s:s + chunk]).sum(axis=1)
+        agree += (preds == preds[-1]).sum(axis=1)
+    seconds = time.perf_counter() - start
+    total = max(len(labels), 1)
+    # 最后一个组合是 rsr 本身，只作为一致率的参考，不出现在结果里
+    return {
+        "configs": configs[:-1],
+        "accuracy": (correct / total)[:-1],
+        "agreement": (agree / total)[:-1],
+        "saturated": saturated[:-1],
+        "seconds": seconds,
+        "images": len(labels),
+    }
+
+def minimum_bits(result, tolerance):
+    """return: {mode: 准确率不低于 float 参考减去 tolerance 的最小位数（都达不到时为 None）}"""
+    reference = result["accuracy"][0]
+    found = {}
+    for (bits, mode), acc in zip(result["configs"], result["accuracy"]):
+        if bits is None:
+            continue
+        found.setdefault(mode, None)
+        if acc >= reference - tolerance and (found[mode] is None or bits < found[mode]):
+            found[mode] = bits
+    return found
+
+def print_table(result):
+    reference = result["accuracy"][0]
+    print(f"{'bits':>6s} {'mode':>9s} {'accuracy':>9s} {'vs float':>9s} {'= predict':>10s} {'saturated':>9s}")
+    for (bits, mode), acc, agree, sat in zip(result["configs"], result["accuracy"], result["agreement"],
+                                             result["saturated"]):
+        print(f"{'-' if bits is None else bits:>6} {mode:>9s} {100 * acc:8.2f}% {100 * (acc - reference):+8.2f} "
+              f"{100 * agree:9.2f}% {sat:9d}")
+
+def plot_curve(result, path):
+    """准确率随位数变化的曲线，每种舍入方式一条，float 参考为水平虚线"""
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    fig, ax = plt.subplots(figsize=(6, 4))
+    for mode in dict.fromkeys(mode for bits, mode in result["configs"] if bits is not None):
+        points = [(bits, acc) for (bits, m), acc in zip(result["configs"], result["accuracy"]) if m == mode]
+        ax.plot(*zip(*points), marker="o", label=mode)
+    ax.axhline(result["accuracy"][0], linestyle="--", color="gray", label="float (no rounding)")
+    ax.set_xlabel("fractional bits")
+    ax.set_ylabel("accuracy")
+    ax.set_title(f"RedstoneLeNet accuracy vs fixed-point width ({result['images']} images)")
+    ax.grid(True, alpha=0.3)
+    ax.legend()
+    fig.tight_layout()
+    fig.savefig(path)
+    plt.close(fig)
+
+def load_eval_set(args):
+    """
+    return: (images uint8 [N, 15, 15], labels)
+    默认用骨架库（与训练时同分布的骨架化结果），不存在时从 --data 的 MNIST 建一次
+    """
+    from evaluate import synthetic_fixtures
+    from redstone_lenet_packed import read_corpus, unpack_images
+
+    if args.corpus:
+        packed, labels = read_corpus(args.corpus)
+        if labels is None:
+            raise SystemExit(f"{args.corpus} 不带标签，无法评估")
+        images, labels = unpack_images(packed), np.asarray(labels)
+    elif args.synthetic:
+        images, labels = synthetic_fixtures(args.synthetic, seed=args.seed)
+    else:
+        from redstone_lenet_bank import DEFAULT_PATH, DEFAULT_TEST_PATH, SkeletonBank, build_bank
+        path = args.bank or (DEFAULT_PATH if args.train_split else DEFAULT_TEST_PATH)
+        if not os.path.exists(path):
+            from evaluate import load_mnist_raw
+            print(f"Building {path} from {args.data} (one-time)", file=sys.stderr)
+            raw_images, raw_labels = load_mnist_raw(args.data, train=args.train_split)
+            build_bank(path, raw_images, raw_labels)
+        images, labels = SkeletonBank(path).epoch(args.seed)
+    if args.limit is not None and args.limit < len(labels):
+        indices = np.sort(np.random.default_rng(args.seed).choice(len(labels), args.limit, replace=False))
+        images, labels = images[indices], labels[indices]
+    return images, np.asarray(labels, dtype=np.int64)
+
+def main(argv=None):
+    from redstone_lenet_forward import load_weights
+
+    parser = argparse.ArgumentParser(description="Sweep fixed-point widths and rounding modes for RedstoneLeNet")
+    parser.add_argument("--bits", type=int, nargs="+", default=list(range(8, 17)), help="fractional bit widths")
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    parser.add_argument("--range", type=float, default=2.0, dest="value_range", help="values saturate to [-range, range]")
+    parser.add_argument("--tolerance", type=float, default=0.005, help="accuracy loss allowed for the minimum width")
+    parser.add_argument("--weights", default="redstone_lenet.pth")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--bank", default=None, help="skeleton bank (.rlb); default data/skeleton_bank_test.rlb")
+    source.add_argument("--corpus", help="labelled .rlp corpus of 0/1 images")
+    source.add_argument("--synthetic", type=int, help="evaluate on this many jittered pre_draw fixtures")
+    parser.add_argument("--data", default="./data", help="MNIST used to build the bank when it does not exist")
+    parser.add_argument("--train-split", action="store_true", help="use the training bank instead of t10k")
+    parser.add_argument("--limit", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--plot", default=None, help="save the accuracy-vs-bits curve to this image")
+    parser.add_argument("--compare-predict", type=int, default=200,
+                        help="time predict on this many images to estimate the per-width cost without the sweep")
+    args = parser.parse_args(argv)
+
+    weights = load_weights(args.weights)
+    images, labels = load_eval_set(args)
+    result = sweep(images, labels, weights, args.bits, args.modes, args.value_range)
+    print_table(result)
+    for mode, bits in minimum_bits(result, args.tolerance).items():
+        print(f"minimum width ({mode}, within {100 * args.tolerance:g} points of float): "
+              f"{'none in range' if bits is None else f'{bits} fractional bits'}")
+
+    configs = len(result["configs"])
+    print(f"{configs} configurations x {result['images']} images in {result['seconds']:.2f} s")
+    if args.compare_predict:
+        from redstone_lenet_forward import predict
+        sample = images[:args.compare_predict].tolist()
+        start = time.perf_counter()
+        for img in sample:
+            predict(img, weights)
+        per_image = (time.perf_counter() - start) / len(sample)
+        print(f"one predict pass per configuration would take ~{per_image * result['images'] * configs:.0f} s")
+    if args.plot:
+        plot_curve(result, args.plot)
+        print(f"Saved {args.plot}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,95 @@
+# 逐层统计 predict 的耗时，看推理时间花在哪里
+#   python redstone_lenet_profile.py                          # pre_draw 下的全部手绘数字
+#   python redstone_lenet_profile.py pre_draw/dig9_a.csv --repeat 50
+# 代码里使用：
+#   with LayerProfiler() as profiler:
+#       for image in images:
+#           predict(image, weights)
+#   profiler.print_report()
+import argparse
+import glob
+import sys
+import time
+
+from redstone_lenet_forward import LAYERS, load_weights, predict, register_layer_hook
+
+class LayerProfiler:
+    """在 with 块内给每一层注册 hook，累计耗时、乘加次数和 rsr 调用次数"""
+    def __init__(self):
+        self.reset()
+        self._handles = []
+
+    def reset(self):
+        self.calls = {layer: 0 for layer in LAYERS}
+        self.seconds = {layer: 0.0 for layer in LAYERS}
+        self.macs = {layer: 0 for layer in LAYERS}
+        self.rsr_calls = {layer: 0 for layer in LAYERS}
+        self.wall_seconds = 0.0
+
+    def _record(self, layer, output, info):
+        self.calls[layer] += 1
+        self.seconds[layer] += info["seconds"]
+        self.macs[layer] += info["macs"]
+        self.rsr_calls[layer] += info["rsr_calls"]
+
+    def __enter__(self):
+        self._handles = [register_layer_hook(layer, self._record) for layer in LAYERS]
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.wall_seconds += time.perf_counter() - self._start
+        for handle in self._handles:
+            handle.remove()
+        self._handles = []
+        return False
+
+    def report(self) -> dict:
+        """return: {layer: {calls, seconds, share, macs, rsr_calls, us_per_call}}，share 是占逐层总耗时的比例"""
+        total = sum(self.seconds.values())
+        return {
+            layer: {
+                "calls": self.calls[layer],
+                "seconds": self.seconds[layer],
+                "share": self.seconds[layer] / total if total else 0.0,
+                "macs": self.macs[layer],
+                "rsr_calls": self.rsr_calls[layer],
+                "us_per_call": 1e6 * self.seconds[layer] / max(self.calls[layer], 1),
+            }
+            for layer in LAYERS
+        }
+
+    def print_report(self):
+        report = self.report()
+        images = max(report["conv"]["calls"], 1)
+        print(f"[PROFILE] {report['conv']['calls']} forward passes, {1e3 * self.wall_seconds:.1f} ms wall")
+        print(f"  {'layer':8s} {'us/image':>10s} {'share':>7s} {'MACs/image':>11s} {'rsr/image':>10s} {'ns/MAC':>8s}")
+        for layer, r in report.items():
+            ns_per_mac = f"{1e9 * r['seconds'] / r['macs']:8.1f}" if r["macs"] else f"{'-':>8s}"
+            print(f"  {layer:8s} {r['us_per_call']:10.1f} {100 * r['share']:6.1f}% "
+                  f"{r['macs'] // images:11d} {r['rsr_calls'] // images:10d} {ns_per_mac}")
+        layers_total = sum(r["seconds"] for r in report.values())
+        if self.wall_seconds:
+            overhead = max(self.wall_seconds - layers_total, 0.0)
+            print(f"  outside the layers (argmax, hooks, caller): {1e6 * overhead / images:.1f} us/image")
+
+def main(argv=None):
+    from redstone_lenet_packed import read_csv_image
+
+    parser = argparse.ArgumentParser(description="Per-layer time breakdown of the manual forward pass")
+    parser.add_argument("files", nargs="*", help="csv drawings (default: pre_draw/dig*.csv)")
+    parser.add_argument("--weights", default="redstone_lenet.rlw")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args(argv)
+
+    images = [read_csv_image(path) for path in (args.files or sorted(glob.glob("pre_draw/dig*.csv")))]
+    weights = load_weights(args.weights)
+    with LayerProfiler() as profiler:
+        for _ in range(args.repeat):
+            for image in images:
+                predict(image, weights)
+    profiler.print_report()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,161 @@
+# 按权重绝对值剪枝全连接层：少一个乘法，Python 里少一次运算，红石机器里也少造一个乘法器
+#   python redstone_lenet_prune.py --sparsity 0.5 --synthetic 2000            # 每个全连接层剪掉 50%
+#   python redstone_lenet_prune.py --threshold 0.05 --finetune 2 --mode tensor  # 剪枝后再微调 2 个 epoch
+#   python redstone_lenet_prune.py --sweep 0.3 0.5 0.7 0.9 --synthetic 2000   # 比较多个剪枝率
+# 剪枝后的 state dict 保存为 .pth（默认 redstone_lenet_pruned.pth），可以直接交给 load_weights / evaluate.py。
+# 报告全连接层的乘加次数、CSR 推理（redstone_lenet_sparse.forward_csr）的速度和 rsr 量化后的准确率；
+# speedup 以未剪枝权重上的逐项推理（forward）为基准。
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import torch
+
+PRUNABLE = ("fc1.weight", "fc2.weight", "fc3.weight")
+
+def magnitude_masks(state_dict, threshold=None, sparsity=None, layers=PRUNABLE):
+    """
+    threshold: 绝对值小于它的权重剪掉
+    sparsity: 每层剪掉绝对值最小的这一比例的权重（0 ~ 1）
+    return: {name: bool tensor}，True 表示保留
+    """
+    if (threshold is None) == (sparsity is None):
+        raise ValueError("threshold 和 sparsity 必须且只能给一个")
+    masks = {}
+    for name in layers:
+        weight = state_dict[name]
+        if threshold is not None:
+            masks[name] = weight.abs() >= threshold
+        else:
+            pruned = int(round(sparsity * weight.numel()))
+            mask = torch.ones(weight.numel(), dtype=torch.bool)
+            # 按绝对值排序后剪掉最小的 pruned 个，并列时也正好剪掉这么多
+            mask[torch.argsort(weight.abs().flatten(), stable=True)[:pruned]] = False
+            masks[name] = mask.reshape(weight.shape)
+    return masks
+
+def prune_state_dict(state_dict, masks):
+    """return: 新的 state dict，被剪掉的权重为 0"""
+    return {name: value * masks[name] if name in masks else value.clone() for name, value in state_dict.items()}
+
+def apply_masks(model, masks):
+    """把 mask 重新应用到模型参数上，作为 train(after_step=...) 使用，保证微调时剪掉的权重一直为 0"""
+    with torch.no_grad():
+        for name, param in model.named_parameters():
+            if name in masks:
+                param.mul_(masks[name].to(param.device))
+
+def finetune(state_dict, masks, epochs, mode="tensor", batch_size=32, lr=0.001, seed=None, root="./data"):
+    """用 redstone_lenet_train.train 在剪枝后的模型上继续训练，return: 微调后的 state dict"""
+    from redstone_lenet_class import RedstoneLeNet
+    from redstone_lenet_train import train
+
+    model = RedstoneLeNet()
+    model.load_state_dict(state_dict)
+    apply_masks(model, masks)
+    model, _ = train(mode, epochs, batch_size, lr, seed=seed, model=model, save_path=None,
+                     after_step=lambda m: apply_masks(m, masks), root=root)
+    return {name: value.detach().cpu().clone() for name, value in model.state_dict().items()}
+
+def layer_sparsity(state_dict, layers=PRUNABLE):
+    """return: {name: 为 0 的权重比例}"""
+    return {name: float((state_dict[name] == 0).float().mean()) for name in layers}
+
+def measure(weights_path, images, labels, needs_transform, speed_images, workers=1, seed=0):
+    """
+    return: dict(macs, dense_macs, us_per_image, dense_us_per_image, accuracy)
+    速度在 speed_images 上逐张计时：us_per_image 是 forward_csr，dense_us_per_image 是逐项计算的 forward；
+    准确率用 evaluate.evaluate（batch 引擎，rsr 量化）
+    """
+    from evaluate import evaluate
+    from redstone_lenet_forward import forward, load_weights
+    from redstone_lenet_sparse import csr_macs, forward_csr, prepare_csr
+
+    weights = load_weights(weights_path)
+    prepared = prepare_csr(weights)
+    macs, dense_macs = csr_macs(prepared)
+
+    start = time.perf_counter()
+    logits = [forward_csr(img, prepared) for img in speed_images]
+    us_per_image = (time.perf_counter() - start) / len(speed_images) * 1e6
+    start = time.perf_counter()
+    reference = [forward(img, weights) for img in speed_images]
+    dense_us_per_image = (time.perf_counter() - start) / len(speed_images) * 1e6
+    # CSR 只是跳过了 0，结果必须与逐项计算相同
+    assert logits == reference
+
+    result = evaluate(images, labels, needs_transform, weights_path, workers, "batch", seed=seed, progress=False)
+    return {"macs": macs, "dense_macs": dense_macs, "us_per_image": us_per_image,
+            "dense_us_per_image": dense_us_per_image, "accuracy": result["accuracy"]}
+
+def print_row(name, m, dense):
+    """speedup 是 dense 权重上 forward 的耗时除以本行 forward_csr 的耗时"""
+    print(f"{name:>10s} {m['macs']:8d} {100 * m['macs'] / m['dense_macs']:6.1f}% {m['us_per_image']:10.1f} "
+          f"{dense['dense_us_per_image'] / m['us_per_image']:7.2f}x {100 * m['accuracy']:8.2f}% "
+          f"{100 * (m['accuracy'] - dense['accuracy']):+7.2f}")
+
+def main(argv=None):
+    from evaluate import load_samples, synthetic_fixtures
+
+    parser = argparse.ArgumentParser(description="Magnitude-prune the fully connected layers of RedstoneLeNet")
+    amount = parser.add_mutually_exclusive_group(required=True)
+    amount.add_argument("--threshold", type=float, help="prune weights with |w| below this")
+    amount.add_argument("--sparsity", type=float, help="fraction of weights to prune in each FC layer")
+    amount.add_argument("--sweep", type=float, nargs="+", help="report several sparsities (nothing is saved)")
+    parser.add_argument("--weights", default="redstone_lenet.pth")
+    parser.add_argument("--out", default="redstone_lenet_pruned.pth")
+    parser.add_argument("--finetune", type=int, default=0, help="epochs of fine-tuning with the masks held fixed")
+    parser.add_argument("--mode", choices=("loader", "tensor"), default="tensor")
+    parser.add_argument("--lr", type=float, default=0.0005)
+    # 评估数据，与 evaluate.py 相同
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--data", default="./data", help="directory containing MNIST/raw (torchvision layout)")
+    source.add_argument("--corpus", help="labelled .rlp corpus of 0/1 images")
+    source.add_argument("--synthetic", type=int, help="evaluate on this many jittered pre_draw fixtures")
+    parser.add_argument("--train-split", action="store_true", help="evaluate on the training split instead of t10k")
+    parser.add_argument("--label", type=int, default=None)
+    parser.add_argument("--limit", type=int, default=2000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+    args.test_split = not args.train_split
+
+    images, labels, needs_transform = load_samples(args)
+    speed_images, _ = synthetic_fixtures(100, seed=args.seed)
+    speed_images = speed_images.tolist()
+    state_dict = torch.load(args.weights, map_location="cpu")
+
+    header = f"{'sparsity':>10s} {'FC MACs':>8s} {'':>7s} {'us/image':>10s} {'speedup':>8s} {'accuracy':>9s} {'delta':>7s}"
+    dense = measure(args.weights, images, labels, needs_transform, speed_images, args.workers, args.seed)
+    print(header)
+    print_row("dense", dense, dense)
+
+    if args.sweep:
+        with tempfile.TemporaryDirectory() as tmp:
+            for sparsity in args.sweep:
+                masks = magnitude_masks(state_dict, sparsity=sparsity)
+                pruned = prune_state_dict(state_dict, masks)
+                if args.finetune:
+                    pruned = finetune(pruned, masks, args.finetune, args.mode, lr=args.lr, seed=args.seed, root=args.data)
+                path = os.path.join(tmp, f"pruned_{sparsity}.pth")
+                torch.save(pruned, path)
+                print_row(f"{sparsity:.2f}", measure(path, images, labels, needs_transform, speed_images,
+                                                     args.workers, args.seed), dense)
+        return 0
+
+    masks = magnitude_masks(state_dict, threshold=args.threshold, sparsity=args.sparsity)
+    pruned = prune_state_dict(state_dict, masks)
+    if args.finetune:
+        pruned = finetune(pruned, masks, args.finetune, args.mode, lr=args.lr, seed=args.seed, root=args.data)
+    torch.save(pruned, args.out)
+    zeros = layer_sparsity(pruned)
+    label = f"{sum(zeros.values()) / len(zeros):.2f}" if args.threshold is None else f"<{args.threshold:g}"
+    print_row(label, measure(args.out, images, labels, needs_transform, speed_images, args.workers, args.seed), dense)
+    print("per-layer sparsity: " + ", ".join(f"{name} {100 * s:.1f}%" for name, s in zeros.items()))
+    print(f"Saved {args.out}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
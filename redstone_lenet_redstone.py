@@ -0,0 +1,216 @@
+# 用红石浮点数（16 位尾数 + 8 位指数）的运算规则跑完整的 RedstoneLeNet 前向传播，
+# 检查机器上的分类结果是否与 predict 相同
+#   python redstone_lenet_redstone.py                          # pre_draw + 合成样本
+#   python redstone_lenet_redstone.py --corpus some.rlp --limit 10000
+# 乘法与 multiplying(a, b, formatting=True) 逐位相同，加法与 redstone_float_add.adding 逐位相同；
+# 累加顺序与 linear_manual / conv2d_manual 相同：先逐项相加，最后加偏置
+# 红石浮点数的绝对值小于 4，而 fc1 / fc3 的累加结果可以超过 10，所以每层按 2 的幂缩放（layer_scales）：
+#   第 l 层的输出整体乘 2^-k_l，k_l 取使 max_row(sum|w| + |b|) * 2^-k_l < 2 的最小值（输入的绝对值不超过 1），
+#   权重乘 2^(k_{l-1} - k_l)、偏置乘 2^-k_l，relu_cut / Hard Tanh 的截断阈值 1 也变成 2^-k_l
+# 乘法只是指数相加，对阶只看指数之差，所以缩放后每一步的尾数与指数范围无限宽时完全相同，只是指数整体偏移；
+# 最后的 logits 乘回 2^k_fc3（argmax 不受影响）
+#   python redstone_lenet_redstone.py --no-rescale             # 不缩放，直接看 4 以内的范围造成的溢出
+import argparse
+import sys
+import time
+
+import numpy as np
+
+import redstone_float_array as rfa
+from redstone_lenet_forward import forward_batch, load_weights, rsr_array
+from redstone_lenet_packed import is_packed, unpack_images
+
+LAYERS = ("conv1", "fc1", "fc2", "fc3")
+
+def layer_scales(weight_dict):
+    """
+    每层输出的缩放指数 {layer: k}，输出整体乘 2^-k，见文件开头的说明
+    k 不小于上一层的 k，缩放后的权重绝对值不会变大
+    """
+    scales, previous = {}, 0
+    for layer in LAYERS:
+        weight = rsr_array(np.asarray(weight_dict[f"{layer}.weight"], dtype=np.float64))
+        bias = rsr_array(np.asarray(weight_dict[f"{layer}.bias"], dtype=np.float64))
+        bound = float(np.max(np.abs(weight).reshape(len(bias), -1).sum(axis=1) + np.abs(bias)))
+        k = previous
+        while bound * 2.0 ** -k >= 2:
+            k += 1
+        scales[layer] = previous = k
+    return scales
+
+def encode_weights(weight_dict, rescale=True):
+    """
+    load_weights 的结果 → {name: (sign, mantissa, exponent)}，另有 "scales": {layer: k}
+    先 rsr 到 2^-14 的整数倍（与 predict 相同），这些值在 16 位尾数里都能精确表示；
+    rescale 时再按 layer_scales 乘以 2 的幂，尾数不变
+    """
+    scales = layer_scales(weight_dict) if rescale else dict.fromkeys(LAYERS, 0)
+    weights_rs = {"scales": scales}
+    for key, value in weight_dict.items():
+        layer, kind = key.split(".")
+        previous = scales[LAYERS[LAYERS.index(layer) - 1]] if layer != LAYERS[0] else 0
+        shift = previous - scales[layer] if kind == "weight" else -scales[layer]
+        weights_rs[key] = rfa.encode(np.ldexp(rsr_array(np.asarray(value, dtype=np.float64)), shift))
+    return weights_rs
+
+def relu_cut(x, limit):
+    """max(0, min(x, limit))，limit 为缩放后的 1"""
+    s, m, e = rfa.clamp_magnitude(x, limit)
+    negative = s == 1
+    return np.where(negative, 0, s), np.where(negative, 0, m), np.where(negative, 0, e)
+
+def tanh(x, limit):
+    """Hard Tanh：绝对值截断到 limit（缩放后的 1）"""
+    return rfa.clamp_magnitude(x, limit)
+
+def scaled_one(weights_rs, layer):
+    return rfa.encode(2.0 ** -weights_rs["scales"][layer])
+
+def accumulate(products, bias, stats=None):
+    """
+    products: [..., K] 的乘积，沿最后一维按顺序累加，再加上 bias
+    """
+    acc = rfa.take(products, 0, axis=-1)
+    for k in range(1, products[0].shape[-1]):
+        acc = rfa.add(acc, rfa.take(products, k, axis=-1), stats)
+    return rfa.add(acc, bias, stats)
+
+def conv2d_redstone(images, weight, bias, limit, stride=2, stats=None):
+    """
+    images: 红石浮点数组 [N, 15, 15]
+    weight: [1, 1, 3, 3]，bias: [1]，limit: relu_cut 的上限
+    return: [N, 7, 7]，已经过 relu_cut
+    """
+    K = 3
+    N, H, W = images[0].shape
+    H_out = (H - K) // stride + 1
+    W_out = (W - K) // stride + 1
+    # 每个输出位置的 9 个输入，顺序与 conv2d_manual 的 ki, kj 循环相同
+    rows = (np.arange(H_out) * stride)[:, None] + np.arange(K)[None, :]  # [H_out, K]
+    cols = (np.arange(W_out) * stride)[:, None] + np.arange(K)[None, :]
+    patches = tuple(part[:, rows[:, None, :, None], cols[None, :, None, :]].reshape(N, H_out, W_out, K * K)
+                    for part in images)
+    products = rfa.multiply(patches, rfa.reshape(weight, (K * K,)), stats=stats)
+    return relu_cut(accumulate(products, rfa.reshape(bias, ()), stats), limit)
+
+def linear_redstone(x, weight, bias, stats=None):
+    """
+    x: [N, In]，weight: [Out, In]，bias: [Out]
+    return: [N, Out]
+    激活值作为乘法的 a（检测通道的一侧），权重作为 b
+    """
+    products = rfa.multiply(rfa.expand(x, 1), rfa.expand(weight, 0), stats=stats)  # [N, Out, In]
+    return accumulate(products, bias, stats)
+
+def forward_redstone(images, weights_rs, stats=None):
+    """
+    images: array [N][15][15] of 0/1，或 [N, 29] 打包数组
+    weights_rs: encode_weights 的结果
+    stats: 可选的 dict，累计 exponent_wrap / overflow / underflow 的次数
+    return: logits * 2^-scales["fc3"]，红石浮点数组 [N, 10]
+    """
+    if is_packed(images):
+        images = unpack_images(images)
+    images = np.asarray(images, dtype=np.float64)
+    if images.ndim == 2:
+        images = images[np.newaxis]
+    x = rfa.encode(images)
+
+    # ===== Conv Layer =====
+    x = conv2d_redstone(x, weights_rs['conv1.weight'], weights_rs['conv1.bias'], scaled_one(weights_rs, 'conv1'),
+                        stride=2, stats=stats)
+
+    # ===== Flatten =====
+    x = rfa.reshape(x, (len(images), -1))  # [N, 49]
+
+    # ===== FC1 =====
+    x = tanh(linear_redstone(x, weights_rs['fc1.weight'], weights_rs['fc1.bias'], stats), scaled_one(weights_rs, 'fc1'))
+
+    # ===== FC2 =====
+    x = tanh(linear_redstone(x, weights_rs['fc2.weight'], weights_rs['fc2.bias'], stats), scaled_one(weights_rs, 'fc2'))
+
+    # ===== FC3 =====
+    return linear_redstone(x, weights_rs['fc3.weight'], weights_rs['fc3.bias'], stats)
+
+def predict_redstone(images, weights_rs, stats=None, chunk=1024):
+    """
+    return: (predictions [N], logits float64 [N, 10])
+    分块计算，中间的 [chunk, 30, 49] 乘积数组不会占用太多内存
+    """
+    if is_packed(images):
+        images = unpack_images(images)
+    images = np.asarray(images)
+    if images.ndim == 2:
+        images = images[np.newaxis]
+    logits = np.empty((len(images), 10))
+    for start in range(0, len(images), chunk):
+        x = forward_redstone(images[start:start + chunk], weights_rs, stats)
+        logits[start:start + chunk] = np.ldexp(rfa.decode(x), weights_rs["scales"]["fc3"])
+    # 与 argmax 一样，并列时取第一个
+    return np.argmax(logits, axis=1), logits
+
+def compare_with_predict(images, weight_dict, chunk=1024, rescale=True):
+    """
+    分别用红石浮点数和 forward_batch（与 predict 逐位相同）计算，统计 argmax 不一致的情况
+    return: dict
+    """
+    stats = {"exponent_wrap": 0, "overflow": 0, "underflow": 0}
+    weights_rs = encode_weights(weight_dict, rescale)
+    start = time.perf_counter()
+    redstone, logits = predict_redstone(images, weights_rs, stats, chunk)
+    elapsed = time.perf_counter() - start
+    if is_packed(images):
+        images = unpack_images(images)
+    reference_logits = np.concatenate([forward_batch(images[s:s + chunk], weight_dict)
+                                       for s in range(0, len(images), chunk)])
+    reference = np.argmax(reference_logits, axis=1)
+    mismatch = np.flatnonzero(redstone != reference)
+    return {
+        "images": len(redstone),
+        "disagreements": len(mismatch),
+        "disagreement_rate": len(mismatch) / max(len(redstone), 1),
+        "mismatch_indices": mismatch,
+        "scales": weights_rs["scales"],
+        "max_logit_error": float(np.max(np.abs(logits - reference_logits))) if len(logits) else 0.0,
+        "images_per_s": len(redstone) / elapsed if elapsed > 0 else float("inf"),
+        "stats": stats,
+    }
+
+def main(argv=None):
+    from redstone_lenet_packed import read_corpus
+    from evaluate import synthetic_fixtures
+
+    parser = argparse.ArgumentParser(description="Run RedstoneLeNet in redstone float arithmetic and compare with predict")
+    parser.add_argument("--weights", default="redstone_lenet.pth")
+    parser.add_argument("--corpus", default=None, help=".rlp corpus (default: pre_draw + synthetic fixtures)")
+    parser.add_argument("--synthetic", type=int, default=5000)
+    parser.add_argument("--limit", type=int, default=None)
+    parser.add_argument("--chunk", type=int, default=1024)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-rescale", action="store_true", help="do not scale the layers into the (-4, 4) range")
+    args = parser.parse_args(argv)
+
+    if args.corpus:
+        images, _ = read_corpus(args.corpus)
+    else:
+        base, _ = read_corpus("pre_draw/pre_draw.rlp")
+        synthetic, _ = synthetic_fixtures(args.synthetic, seed=args.seed)
+        images = np.concatenate([unpack_images(base), synthetic])
+    if args.limit:
+        images = images[:args.limit]
+
+    weight_dict = load_weights(args.weights)
+    result = compare_with_predict(images, weight_dict, args.chunk, rescale=not args.no_rescale)
+    print(f"[REDSTONE] {result['images']} images, {result['images_per_s']:.0f} images/s")
+    print(f"  argmax disagrees with predict: {result['disagreements']} "
+          f"({100 * result['disagreement_rate']:.3f}%), max |logit error| = {result['max_logit_error']:.6f}")
+    print(f"  layer scales (outputs times 2^-k): {result['scales']}")
+    stats = result["stats"]
+    print(f"  exponent wraps: {stats['exponent_wrap']}, add overflows: {stats['overflow']}, "
+          f"underflows: {stats['underflow']}")
+    if result["disagreements"]:
+        print(f"  first mismatches: {result['mismatch_indices'][:10].tolist()}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,347 @@
+# 本地推理服务：asyncio 实现的 HTTP 服务（TCP 或 Unix socket），把并发到达的请求合并成小批次，
+# 交给工作进程用 forward_batch 一次算完，避免每个请求单独调用一次 predict。
+#   python redstone_lenet_server.py --port 8015 --max-batch 64 --max-wait-ms 2
+#   python redstone_lenet_server.py --unix /tmp/redstone_lenet.sock
+#   curl -d '{"image": [[0, 1, ...], ...]}' localhost:8015/predict
+#   curl localhost:8015/metrics
+# POST /predict: JSON {"image": 15x15 的 0/1}，或 Content-Type: application/octet-stream 的 29 字节 pack_image 结果
+#   返回 {"prediction", "logits"}；请求体超过 MAX_BODY 字节时返回 413
+# GET /metrics: 吞吐量、队列深度、批大小和 p50/p95/p99 延迟；GET /health: {"status": "ok"}
+# 压测与批处理的收益见 redstone_lenet_loadgen.py
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+
+from redstone_lenet_packed import PACKED_BYTES, pack_image
+
+# ===== 工作进程 =====
+
+_worker_weights = None
+
+def _init_worker(weight_dict):
+    global _worker_weights
+    _worker_weights = {key: np.asarray(value, dtype=np.float64) for key, value in weight_dict.items()}
+
+def _run_batch(packed):
+    """packed: [N, 29] uint8，return: logits [N, 10]"""
+    from redstone_lenet_forward import forward_batch
+    return forward_batch(packed, _worker_weights)
+
+# ===== 指标 =====
+
+class Metrics:
+    """
+    请求数、批次数、批大小分布，以及最近 window 个请求的延迟（从收到请求到算出结果）
+    """
+    def __init__(self, window=10000):
+        self.latencies = deque(maxlen=window)
+        self.queue_depth = 0
+        self.in_flight = 0
+        self.reset()
+
+    def reset(self):
+        """清零计数和延迟并重新计时，例如压测预热之后；队列深度和在算的批次数是当前状态，不清零"""
+        self.started = time.perf_counter()
+        self.requests = 0
+        self.errors = 0
+        self.batches = 0
+        self.batch_sizes = Counter()
+        self.latencies.clear()
+
+    def record_batch(self, size, latencies):
+        self.batches += 1
+        self.batch_sizes[size] += 1
+        self.requests += size
+        self.latencies.extend(latencies)
+
+    def snapshot(self):
+        elapsed = time.perf_counter() - self.started
+        latencies = np.array(self.latencies) * 1e3
+        p50, p95, p99 = np.percentile(latencies, [50, 95, 99]).tolist() if len(latencies) else (0.0, 0.0, 0.0)
+        return {
+            "uptime_s": round(elapsed, 3),
+            "requests": self.requests,
+            "errors": self.errors,
+            "throughput_rps": round(self.requests / elapsed, 1) if elapsed > 0 else 0.0,
+            "queue_depth": self.queue_depth,
+            "batches_in_flight": self.in_flight,
+            "batches": self.batches,
+            "mean_batch_size": round(self.requests / self.batches, 2) if self.batches else 0.0,
+            "batch_sizes": {str(size): count for size, count in sorted(self.batch_sizes.items())},
+            "latency_ms": {"p50": round(p50, 3), "p95": round(p95, 3), "p99": round(p99, 3)},
+        }
+
+# ===== 微批处理 =====
+
+class MicroBatcher:
+    """
+    submit(packed_image) 把请求放进队列；后台任务取出第一个请求后再等最多 max_wait_ms，
+    或凑够 max_batch 个，然后把这一批交给 executor。最多同时有 max_in_flight 个批次在计算。
+    """
+    def __init__(self, executor, max_batch=64, max_wait_ms=2.0, max_in_flight=1, metrics=None):
+        self.executor = executor
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1e3
+        self.slots = asyncio.Semaphore(max_in_flight)
+        self.metrics = metrics or Metrics()
+        self.queue = asyncio.Queue()
+        self._task = None
+        self._runs = set()
+        self._pending = set()
+
+    def start(self):
+        self._task = asyncio.get_running_loop().create_task(self._collect())
+
+    async def stop(self):
+        """停止收集，排队中和计算中的请求都以 RuntimeError 结束，不会一直等下去"""
+        tasks = [task for task in [self._task, *self._runs] if task is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._task = None
+        error = RuntimeError("server is shutting down")
+        for future in list(self._pending):
+            if not future.done():
+                future.set_exception(error)
+        self._pending.clear()
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.metrics.queue_depth = 0
+
+    async def submit(self, packed_image):
+        """packed_image: 29 字节，return: logits, np.ndarray [10]"""
+        future = asyncio.get_running_loop().create_future()
+        self._pending.add(future)
+        future.add_done_callback(self._pending.discard)
+        self.queue.put_nowait((packed_image, time.perf_counter(), future))
+        self.metrics.queue_depth = self.queue.qsize()
+        return await future
+
+    async def _collect(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self.queue.get_nowait())
+                    continue
+                except asyncio.QueueEmpty:
+                    pass
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            self.metrics.queue_depth = self.queue.qsize()
+            # 等到有空闲的工作进程再发出，排队的请求留在队列里继续凑批
+            await self.slots.acquire()
+            task = loop.create_task(self._run(batch))
+            self._runs.add(task)
+            task.add_done_callback(self._runs.discard)
+
+    async def _run(self, batch):
+        loop = asyncio.get_running_loop()
+        self.metrics.in_flight += 1
+        try:
+            packed = np.frombuffer(b"".join(item[0] for item in batch), dtype=np.uint8).reshape(-1, PACKED_BYTES)
+            logits = await loop.run_in_executor(self.executor, _run_batch, packed)
+        except Exception as e:
+            self.metrics.errors += len(batch)
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        finally:
+            self.metrics.in_flight -= 1
+            self.slots.release()
+        now = time.perf_counter()
+        self.metrics.record_batch(len(batch), [now - item[1] for item in batch])
+        for (_, _, future), row in zip(batch, logits):
+            if not future.done():
+                future.set_result(row)
+
+def make_executor(weight_dict, workers=1):
+    """workers 个工作进程，每个进程只在启动时收到一次权重；workers=0 时在线程里计算"""
+    if workers == 0:
+        _init_worker(weight_dict)
+        return ThreadPoolExecutor(max_workers=1)
+    return ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(weight_dict,))
+
+# ===== HTTP =====
+
+def parse_image(body, content_type):
+    """return: 29 字节的打包图像；格式不对时抛出 ValueError"""
+    if content_type.startswith("application/octet-stream"):
+        if len(body) != PACKED_BYTES:
+            raise ValueError(f"expected {PACKED_BYTES} packed bytes, got {len(body)}")
+        return bytes(body)
+    try:
+        image = np.asarray(json.loads(body)["image"])
+    except (json.JSONDecodeError, UnicodeDecodeError, KeyError, TypeError) as e:
+        raise ValueError(f"expected JSON {{\"image\": 15x15 of 0/1}}: {e}")
+    if image.shape != (15, 15) or not np.isin(image, (0, 1)).all():
+        raise ValueError(f"image must be 15x15 of 0/1, got shape {image.shape}")
+    return pack_image(image.astype(np.uint8))
+
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 413: "Payload Too Large",
+           500: "Internal Server Error"}
+
+# 15x15 的 JSON 图像不到 4 KiB
+MAX_BODY = 8192
+
+class PayloadTooLarge(ValueError):
+    pass
+
+def _response(status, payload, keep_alive=True):
+    body = json.dumps(payload).encode()
+    head = (f"HTTP/1.1 {status} {REASONS[status]}\r\nContent-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\nConnection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+    return head.encode() + body
+
+async def read_request(reader, max_body=MAX_BODY):
+    """
+    return: (method, path, headers, body)，连接已关闭时返回 None
+    Content-Length 不是非负整数时抛出 ValueError，超过 max_body 时抛出 PayloadTooLarge（不读请求体）
+    """
+    line = await reader.readline()
+    if not line:
+        return None
+    method, path, version = line.decode("latin-1").split()
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    if version == "HTTP/1.0" and headers.get("connection", "").lower() != "keep-alive":
+        headers.setdefault("connection", "close")
+    length = headers.get("content-length", "0")
+    if not (length.isascii() and length.isdigit()):
+        raise ValueError(f"invalid Content-Length {length!r}")
+    if int(length) > max_body:
+        raise PayloadTooLarge(f"request body of {length} bytes exceeds {max_body}")
+    body = await reader.readexactly(int(length))
+    return method, path, headers, body
+
+class InferenceServer:
+    def __init__(self, batcher):
+        self.batcher = batcher
+
+    async def handle(self, method, path, headers, body):
+        """return: (status, payload)"""
+        if path == "/health":
+            return 200, {"status": "ok"}
+        if path == "/metrics":
+            return 200, self.batcher.metrics.snapshot()
+        if path != "/predict":
+            return 404, {"error": f"unknown path {path}"}
+        if method != "POST":
+            return 405, {"error": "use POST"}
+        try:
+            packed = parse_image(body, headers.get("content-type", "application/json"))
+        except ValueError as e:
+            self.batcher.metrics.errors += 1
+            return 400, {"error": str(e)}
+        try:
+            logits = await self.batcher.submit(packed)
+        except Exception as e:
+            return 500, {"error": str(e)}
+        return 200, {"prediction": int(np.argmax(logits)), "logits": logits.tolist()}
+
+    async def serve_connection(self, reader, writer):
+        try:
+            while True:
+                try:
+                    request = await read_request(reader)
+                except PayloadTooLarge as e:
+                    # 请求体没有读，连接里剩下的数据无法解析，只能关闭
+                    writer.write(_response(413, {"error": str(e)}, keep_alive=False))
+                    break
+                except (ValueError, asyncio.IncompleteReadError):
+                    writer.write(_response(400, {"error": "malformed request"}, keep_alive=False))
+                    break
+                if request is None:
+                    break
+                status, payload = await self.handle(*request)
+                keep_alive = request[2].get("connection", "").lower() != "close"
+                writer.write(_response(status, payload, keep_alive))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            # 客户端断开
+            pass
+        finally:
+            # 服务关闭时取消了还开着的连接：关闭之后 CancelledError 继续向上传递
+            writer.close()
+
+async def start_server(weight_dict, host="127.0.0.1", port=8015, unix=None,
+                       max_batch=64, max_wait_ms=2.0, workers=1):
+    """
+    启动服务并返回 (server, batcher, executor)，调用方负责关闭
+    port=0 时由系统分配端口，见 server.sockets[0].getsockname()
+    """
+    executor = make_executor(weight_dict, workers)
+    batcher = MicroBatcher(executor, max_batch, max_wait_ms, max_in_flight=max(workers, 1))
+    batcher.start()
+    app = InferenceServer(batcher)
+    if unix is not None:
+        server = await asyncio.start_unix_server(app.serve_connection, path=unix)
+    else:
+        server = await asyncio.start_server(app.serve_connection, host, port)
+    return server, batcher, executor
+
+async def stop_server(server, batcher, executor):
+    server.close()
+    await server.wait_closed()
+    await batcher.stop()
+    executor.shutdown(cancel_futures=True)
+
+def main(argv=None):
+    from classify import default_weights_path
+    from redstone_lenet_forward import load_weights
+
+    parser = argparse.ArgumentParser(description="Serve RedstoneLeNet predictions over HTTP with micro-batching")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8015)
+    parser.add_argument("--unix", default=None, help="listen on this Unix socket instead of TCP")
+    parser.add_argument("--weights", default=None)
+    parser.add_argument("--max-batch", type=int, default=64)
+    parser.add_argument("--max-wait-ms", type=float, default=2.0)
+    parser.add_argument("--workers", type=int, default=1, help="inference processes, 0 runs batches in a thread")
+    args = parser.parse_args(argv)
+
+    weights = load_weights(args.weights or default_weights_path())
+
+    async def run():
+        server, batcher, executor = await start_server(weights, args.host, args.port, args.unix,
+                                                       args.max_batch, args.max_wait_ms, args.workers)
+        where = args.unix or "http://%s:%d" % server.sockets[0].getsockname()[:2]
+        print(f"Serving on {where} (max batch {args.max_batch}, max wait {args.max_wait_ms} ms, "
+              f"{args.workers} workers)", file=sys.stderr)
+        try:
+            await server.serve_forever()
+        finally:
+            await stop_server(server, batcher, executor)
+            if args.unix and os.path.exists(args.unix):
+                os.remove(args.unix)
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
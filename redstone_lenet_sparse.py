@@ -0,0 +1,225 @@
+# 利用稀疏性的推理：骨架化后的 15x15 输入大多是 0，relu_cut 之后的卷积输出也有很多 0，
+# 这里只遍历点亮的像素和非 0 的激活值，跳过所有乘以 0 的项。
+# rsr 下的乘积与部分和在 float64 中都是精确的，少加几个 0 不改变结果，logits 与 forward 逐位相同。
+#   sparse = prepare_sparse(load_weights("redstone_lenet.pth"))
+#   predict_sparse(image, sparse)
+#   python redstone_lenet_sparse.py          # 在骨架图像上与逐项计算的 predict 比较速度
+# 剪枝之后（redstone_lenet_prune.py）权重里的 0 用 CSR 形式跳过：prepare_csr / forward_csr
+import operator
+
+from redstone_lenet_forward import rsr, relu_cut, tanh, linear_manual, argmax
+from redstone_lenet_packed import unpack_image
+
+class SparseWeights:
+    """
+    prepare_sparse 的结果：权重只 rsr 一次，并按稀疏计算需要的方式重新排列
+      pixel_targets[r][c]: 像素 (r, c) 影响的卷积输出 [(输出下标, 权重), ...]，stride 2 时最多 4 个
+      fc1_columns[j]: fc1 第 j 个输入对应的一列权重
+    fc2 / fc3 的输入经过 Hard Tanh 后很少为 0，仍用 linear_manual 逐项计算
+    """
+    def __init__(self, weight_dict, image_size=15, stride=2):
+        K = 3
+        kernel = [[rsr(w) for w in row] for row in weight_dict['conv1.weight'][0][0]]
+        self.conv_bias = rsr(weight_dict['conv1.bias'][0])
+        self.out_size = (image_size - K) // stride + 1
+        self.pixel_targets = [[[] for _ in range(image_size)] for _ in range(image_size)]
+        for i in range(self.out_size):
+            for j in range(self.out_size):
+                for ki in range(K):
+                    for kj in range(K):
+                        self.pixel_targets[i*stride+ki][j*stride+kj].append((i * self.out_size + j, kernel[ki][kj]))
+
+        fc1 = weight_dict['fc1.weight']
+        self.fc1_columns = [[rsr(row[j]) for row in fc1] for j in range(len(fc1[0]))]
+        self.fc1_bias = [rsr(b) for b in weight_dict['fc1.bias']]
+        self.weight_dict = weight_dict
+
+def prepare_sparse(weight_dict):
+    return SparseWeights(weight_dict)
+
+def active_pixels(binary_image):
+    """return: [(r, c, rsr(value)), ...]，只包含 rsr 后不为 0 的像素"""
+    active = []
+    for r, row in enumerate(binary_image):
+        for c, v in enumerate(row):
+            if v:
+                q = rsr(v)
+                if q:
+                    active.append((r, c, q))
+    return active
+
+def conv2d_sparse(active, sparse, stats=None):
+    """
+    active: active_pixels 的结果
+    return: 展平的卷积输出 [49]，已做 relu_cut，与 flatten(conv2d_manual(...)) 相同
+    """
+    acc = [0.0] * (sparse.out_size * sparse.out_size)
+    macs = 0
+    for r, c, v in active:
+        targets = sparse.pixel_targets[r][c]
+        for index, w in targets:
+            acc[index] += v * w
+        macs += len(targets)
+    if stats is not None:
+        stats["conv_macs"] = stats.get("conv_macs", 0) + macs
+    bias = sparse.conv_bias
+    return [relu_cut(a + bias) for a in acc]
+
+def linear_sparse(input_vec, columns, bias_q, stats=None):
+    """
+    只累加 rsr 后不为 0 的输入，与 linear_manual(input_vec, weight, bias) 相同
+    columns: 按列排列的 rsr 后权重，bias_q: rsr 后的偏置
+    """
+    acc = [0.0] * len(bias_q)
+    active = 0
+    for v, column in zip(input_vec, columns):
+        q = rsr(v)
+        if q:
+            acc = [a + q * w for a, w in zip(acc, column)]
+            active += 1
+    if stats is not None:
+        stats["fc1_macs"] = stats.get("fc1_macs", 0) + active * len(bias_q)
+        stats["fc1_active"] = stats.get("fc1_active", 0) + active
+    return [a + b for a, b in zip(acc, bias_q)]
+
+def forward_sparse(binary_image, sparse, stats=None):
+    """
+    binary_image: 15x15 list of 0/1，或 pack_image 打包的 29 字节
+    sparse: prepare_sparse 的结果
+    stats: 可选的 dict，累计实际执行的乘加次数，见 sparsity_report
+    return: logits, list [10]，与 forward 逐位相同
+    """
+    if isinstance(binary_image, (bytes, bytearray)):
+        binary_image = unpack_image(binary_image)
+    active = active_pixels(binary_image)
+    if stats is not None:
+        stats["images"] = stats.get("images", 0) + 1
+        stats["active_pixels"] = stats.get("active_pixels", 0) + len(active)
+
+    # ===== Conv Layer + Flatten =====
+    x = conv2d_sparse(active, sparse, stats)
+
+    # ===== FC1 =====
+    x = linear_sparse(x, sparse.fc1_columns, sparse.fc1_bias, stats)
+    x = [tanh(v) for v in x]
+
+    # ===== FC2 / FC3 =====
+    w = sparse.weight_dict
+    x = [tanh(v) for v in linear_manual(x, w['fc2.weight'], w['fc2.bias'])]
+    return linear_manual(x, w['fc3.weight'], w['fc3.bias'])
+
+def predict_sparse(binary_image, sparse, stats=None):
+    return argmax(forward_sparse(binary_image, sparse, stats))
+
+# ===== 剪枝后的权重：CSR 形式的 linear_manual =====
+
+def to_csr(weight_matrix):
+    """
+    [M, N] 权重 → (values, columns, row_ptr)，只保存 rsr 后不为 0 的项
+    第 i 行的非 0 项为 values[row_ptr[i]:row_ptr[i+1]]，对应的输入下标为 columns[...]
+    """
+    values, columns, row_ptr = [], [], [0]
+    for row in weight_matrix:
+        for j, w in enumerate(row):
+            q = rsr(w)
+            if q:
+                values.append(q)
+                columns.append(j)
+        row_ptr.append(len(values))
+    return values, columns, row_ptr
+
+def linear_csr(input_vec, csr, bias_vec):
+    """
+    与 linear_manual(input_vec, weight_matrix, bias_vec) 逐位相同，跳过被剪掉（为 0）的权重
+    csr: to_csr(weight_matrix) 的结果
+    """
+    values, columns, row_ptr = csr
+    x = [rsr(v) for v in input_vec]
+    output = []
+    for i in range(len(row_ptr) - 1):
+        start, end = row_ptr[i], row_ptr[i + 1]
+        acc = sum(map(operator.mul, map(x.__getitem__, columns[start:end]), values[start:end]), 0.0)
+        acc += rsr(bias_vec[i])
+        output.append(acc)
+    return output
+
+def prepare_csr(weight_dict):
+    """
+    fc1 / fc2 / fc3 的权重转为 CSR，卷积层用 prepare_sparse 的按像素方式，供 forward_csr 使用
+    """
+    prepared = dict(weight_dict)
+    prepared["conv.sparse"] = prepare_sparse(weight_dict)
+    for layer in ("fc1", "fc2", "fc3"):
+        prepared[f"{layer}.csr"] = to_csr(weight_dict[f"{layer}.weight"])
+    return prepared
+
+def csr_macs(prepared):
+    """return: (CSR 实际的乘加次数, 稠密时的乘加次数)，只算全连接层"""
+    sparse_macs = sum(len(prepared[f"{layer}.csr"][0]) for layer in ("fc1", "fc2", "fc3"))
+    dense_macs = sum(len(row) for layer in ("fc1", "fc2", "fc3") for row in prepared[f"{layer}.weight"])
+    return sparse_macs, dense_macs
+
+def forward_csr(binary_image, prepared):
+    """
+    prepared: prepare_csr 的结果
+    return: logits, list [10]，与 forward(binary_image, weight_dict) 逐位相同
+    """
+    if isinstance(binary_image, (bytes, bytearray)):
+        binary_image = unpack_image(binary_image)
+    x = conv2d_sparse(active_pixels(binary_image), prepared["conv.sparse"])
+    x = [tanh(v) for v in linear_csr(x, prepared['fc1.csr'], prepared['fc1.bias'])]
+    x = [tanh(v) for v in linear_csr(x, prepared['fc2.csr'], prepared['fc2.bias'])]
+    return linear_csr(x, prepared['fc3.csr'], prepared['fc3.bias'])
+
+def predict_csr(binary_image, prepared):
+    return argmax(forward_csr(binary_image, prepared))
+
+def sparsity_report(stats, sparse):
+    """
+    forward_sparse 累计的 stats → 实测的稀疏度
+    return: dict，*_density 为实际参与计算的比例，*_mac_saving 为跳过的乘加比例
+    """
+    images = max(stats.get("images", 0), 1)
+    pixels = len(sparse.pixel_targets) ** 2
+    conv_dense = sparse.out_size ** 2 * 9
+    fc1_inputs, fc1_outputs = len(sparse.fc1_columns), len(sparse.fc1_bias)
+    return {
+        "images": stats.get("images", 0),
+        "input_density": stats.get("active_pixels", 0) / (images * pixels),
+        "conv_mac_saving": 1 - stats.get("conv_macs", 0) / (images * conv_dense),
+        "fc1_input_density": stats.get("fc1_active", 0) / (images * fc1_inputs),
+        "fc1_mac_saving": 1 - stats.get("fc1_macs", 0) / (images * fc1_inputs * fc1_outputs),
+    }
+
+if __name__ == "__main__":
+    import time
+
+    import numpy as np
+
+    from evaluate import synthetic_fixtures
+    from redstone_lenet_forward import load_weights, forward
+    from redstone_lenet_packed import read_corpus, unpack_images
+
+    weights = load_weights("redstone_lenet.rlw")
+    sparse = prepare_sparse(weights)
+
+    # 真实的骨架图像：pre_draw 的手绘数字，加上由它们平移、翻转像素得到的样本
+    packed, _ = read_corpus("pre_draw/pre_draw.rlp")
+    synthetic, _ = synthetic_fixtures(300, seed=0)
+    images = np.concatenate([unpack_images(packed), synthetic]).tolist()
+
+    start = time.perf_counter()
+    dense_logits = [forward(img, weights) for img in images]
+    t_dense = (time.perf_counter() - start) / len(images)
+    stats = {}
+    start = time.perf_counter()
+    sparse_logits = [forward_sparse(img, sparse, stats) for img in images]
+    t_sparse = (time.perf_counter() - start) / len(images)
+    assert sparse_logits == dense_logits
+
+    report = sparsity_report(stats, sparse)
+    print(f"input density {100 * report['input_density']:.1f}%, conv MACs skipped {100 * report['conv_mac_saving']:.1f}%, "
+          f"fc1 input density {100 * report['fc1_input_density']:.1f}%, fc1 MACs skipped {100 * report['fc1_mac_saving']:.1f}%")
+    print(f"forward (dense):  {t_dense * 1e6:8.1f} us/image")
+    print(f"forward_sparse:   {t_sparse * 1e6:8.1f} us/image")
+    print(f"speedup:          {t_dense / t_sparse:8.1f}x on {len(images)} images, identical logits")
@@ -1,3 +1,13 @@
+#   python redstone_lenet_train.py                                   # 原来的 DataLoader 方式
+#   python redstone_lenet_train.py --mode tensor --batch-size 256 --threads 4
+# tensor 模式把预处理好的数据集一次性放进连续的 tensor，每个 epoch 只打乱下标，没有 collate 开销
+# 随机增强与 DataLoader 方式一样每个 epoch 重做一次：有骨架库时只是重新拼接，没有时要把 transform 全部重做
+import argparse
+import os
+import random
+import time
+
+import numpy as np
 import torch
 import torch.nn as nn
 import torch.optim as optim
@@ -6,36 +16,59 @@ from torch.utils.data import DataLoader, random_split
 
 from redstone_lenet_class import RedstoneLeNet
 from redstone_lenet import transform
-
-# Load dataset and split into train and validation
-full_train_dataset = torchvision.datasets.MNIST(root="./data", train=True, transform=transform, download=True)
-train_size = int(0.8 * len(full_train_dataset))
-val_size = len(full_train_dataset) - train_size
-train_dataset, val_dataset = random_split(full_train_dataset, [train_size, val_size])
-
-train_loader = DataLoader(train_dataset, batch_size=32, shuffle=True)
-val_loader = DataLoader(val_dataset, batch_size=32, shuffle=False)
-
-# Test dataset
-test_dataset = torchvision.datasets.MNIST(root="./data", train=False, transform=transform, download=True)
-test_loader = DataLoader(test_dataset, batch_size=32, shuffle=False)
-
-print(torch.cuda.is_available())  # Should return True
-print(torch.cuda.device_count())  # Should be at least 1
-print(torch.cuda.get_device_name(0))  # Should print "GeForce GTX 1660 Ti"
-
-# Initialize model, loss function, and optimizer
-device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-model = RedstoneLeNet().to(device)
-criterion = nn.CrossEntropyLoss()
-optimizer = optim.Adam(model.parameters(), lr=0.001)
-
-# Training loop with validation
-num_epochs = 4
-for epoch in range(num_epochs):
+from redstone_lenet_bank import DEFAULT_PATH, DEFAULT_TEST_PATH, bank_dataset
+
+def load_datasets(root="./data", use_bank=None, seed=None):
+    """
+    有预先算好的骨架库时直接用它（先运行 python redstone_lenet_bank.py），省去每个 epoch 的骨架化
+    seed: 骨架库随机拼接的种子，None 时每次运行都不同
+    return: (full_train_dataset, test_dataset)
+    """
+    # 骨架库的默认位置是 data/ 下，换了 root 就到 root 下找
+    train_bank = os.path.join(root, os.path.basename(DEFAULT_PATH))
+    test_bank = os.path.join(root, os.path.basename(DEFAULT_TEST_PATH))
+    if use_bank is None:
+        use_bank = os.path.exists(train_bank) and os.path.exists(test_bank)
+    if use_bank:
+        if seed is None:
+            seed = int(np.random.SeedSequence().entropy % 2 ** 32)
+        return bank_dataset(train_bank, seed=seed), bank_dataset(test_bank, seed=seed + 1)
+    full_train_dataset = torchvision.datasets.MNIST(root=root, train=True, transform=transform, download=True)
+    test_dataset = torchvision.datasets.MNIST(root=root, train=False, transform=transform, download=True)
+    return full_train_dataset, test_dataset
+
+def load_tensors(dataset):
+    """
+    把数据集一次性读成连续的 tensor
+    return: (images float32 [N, 1, 15, 15], labels int64 [N])
+    骨架库数据集直接取现成的数组；普通 MNIST 会在这里把 transform 做一遍，每调用一次得到一组新的随机增强
+    """
+    if hasattr(dataset, "images"):
+        return dataset.images.contiguous(), dataset.targets.to(torch.int64)
+    images, labels = zip(*(dataset[i] for i in range(len(dataset))))
+    return torch.stack(images).contiguous(), torch.tensor(labels, dtype=torch.int64)
+
+def iterate_batches(images, labels, batch_size, shuffle=False, generator=None):
+    """按下标排列切片出 (images, labels) 批次，代替 DataLoader"""
+    n = len(labels)
+    order = torch.randperm(n, generator=generator) if shuffle else None
+    for start in range(0, n, batch_size):
+        if order is None:
+            yield images[start:start + batch_size], labels[start:start + batch_size]
+        else:
+            index = order[start:start + batch_size]
+            yield images[index], labels[index]
+
+def train_epoch(model, batches, criterion, optimizer, device, after_step=None):
+    """
+    batches: 可迭代的 (images, labels)，DataLoader 或 iterate_batches
+    after_step: 每次 optimizer.step() 之后调用，例如剪枝时重新应用 mask
+    return: (avg_train_loss, samples_per_s)
+    """
     model.train()
-    total_loss = 0
-    for images, labels in train_loader:
+    total_loss, count, steps = 0.0, 0, 0
+    start = time.perf_counter()
+    for images, labels in batches:
         images, labels = images.to(device), labels.to(device)
 
         optimizer.zero_grad()
@@ -43,43 +76,129 @@ for epoch in range(num_epochs):
         loss = criterion(outputs, labels)
         loss.backward()
         optimizer.step()
+        if after_step is not None:
+            after_step(model)
 
         total_loss += loss.item()
+        count += labels.size(0)
+        steps += 1
+    elapsed = time.perf_counter() - start
+    return total_loss / max(steps, 1), count / elapsed if elapsed > 0 else float("inf")
 
-    avg_train_loss = total_loss / len(train_loader)
-
-    # Validation loop
+def evaluate(model, batches, criterion, device):
+    """return: (avg_loss, accuracy in %)"""
     model.eval()
-    val_loss = 0
+    total_loss, steps = 0.0, 0
     correct, total = 0, 0
     with torch.no_grad():
-        for images, labels in val_loader:
+        for images, labels in batches:
             images, labels = images.to(device), labels.to(device)
             outputs = model(images)
-            loss = criterion(outputs, labels)
-            val_loss += loss.item()
+            total_loss += criterion(outputs, labels).item()
+            steps += 1
 
             _, predicted = torch.max(outputs, 1)
             total += labels.size(0)
             correct += (predicted == labels).sum().item()
-    
-    avg_val_loss = val_loss / len(val_loader)
-    val_accuracy = 100 * correct / total
-
-    print(f"Epoch {epoch+1}/{num_epochs}, Train Loss: {avg_train_loss:.4f}, Val Loss: {avg_val_loss:.4f}, Val Accuracy: {val_accuracy:.2f}%")
-
-# Save the trained model
-torch.save(model.state_dict(), "redstone_lenet.pth")
-
-# Final test accuracy
-model.eval()
-correct, total = 0, 0
-with torch.no_grad():
-    for images, labels in test_loader:
-        images, labels = images.to(device), labels.to(device)
-        outputs = model(images)
-        _, predicted = torch.max(outputs, 1)
-        total += labels.size(0)
-        correct += (predicted == labels).sum().item()
-
-print(f"Test Accuracy: {100 * correct / total:.2f}%")
+    return total_loss / max(steps, 1), 100 * correct / max(total, 1)
+
+def describe_device(device):
+    print(torch.cuda.is_available())  # Should return True on the GPU box
+    if device.type == "cuda":
+        print(torch.cuda.device_count())  # Should be at least 1
+        print(torch.cuda.get_device_name(0))  # Should print "GeForce GTX 1660 Ti"
+    else:
+        print(f"Training on CPU with {torch.get_num_threads()} thread(s)")
+
+def train(mode="loader", num_epochs=4, batch_size=32, lr=0.001, threads=None, device=None, seed=None,
+          model=None, save_path="redstone_lenet.pth", after_step=None, root="./data"):
+    """
+    mode: "loader" 为原来的 DataLoader 方式；"tensor" 为整块 tensor + 下标排列
+    model: 传入已有模型时在其基础上继续训练（例如剪枝后的微调）
+    return: (model, test_accuracy)
+    """
+    if threads:
+        torch.set_num_threads(threads)
+    if device is None:
+        device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    # 没有给种子时用全局随机数（generator=None），每次运行的初始化、划分、打乱顺序和随机增强都不同
+    generator = None
+    if seed is not None:
+        torch.manual_seed(seed)
+        np.random.seed(seed)  # custom_skeletonize 的随机拼接用的是 np.random
+        random.seed(seed)
+        generator = torch.Generator().manual_seed(seed)
+    describe_device(device)
+
+    # Load dataset and split into train and validation
+    full_train_dataset, test_dataset = load_datasets(root, seed=seed)
+    train_size = int(0.8 * len(full_train_dataset))
+    val_size = len(full_train_dataset) - train_size
+    train_dataset, val_dataset = random_split(full_train_dataset, [train_size, val_size], generator=generator)
+
+    if mode == "tensor":
+        train_index = torch.tensor(train_dataset.indices)
+        val_index = torch.tensor(val_dataset.indices)
+        test_images, test_labels = load_tensors(test_dataset)
+        # all_images / all_labels 在每个 epoch 开始时重新生成
+        val_batches = lambda: iterate_batches(all_images[val_index], all_labels[val_index], batch_size)
+        test_batches = lambda: iterate_batches(test_images, test_labels, batch_size)
+    else:
+        val_loader = DataLoader(val_dataset, batch_size=batch_size, shuffle=False)
+        test_loader = DataLoader(test_dataset, batch_size=batch_size, shuffle=False)
+        val_batches = lambda: val_loader
+        test_batches = lambda: test_loader
+
+    # Initialize model, loss function, and optimizer
+    if model is None:
+        model = RedstoneLeNet()
+    model = model.to(device)
+    criterion = nn.CrossEntropyLoss()
+    optimizer = optim.Adam(model.parameters(), lr=lr)
+
+    # Training loop with validation
+    for epoch in range(num_epochs):
+        if hasattr(full_train_dataset, "set_epoch"):
+            full_train_dataset.set_epoch(epoch)  # 重新随机拼接一次，相当于每个 epoch 重新做 transform
+        if mode == "tensor":
+            all_images, all_labels = load_tensors(full_train_dataset)
+            train_images, train_labels = all_images[train_index], all_labels[train_index]
+            train_batches = iterate_batches(train_images, train_labels, batch_size, shuffle=True, generator=generator)
+        else:
+            train_batches = DataLoader(train_dataset, batch_size=batch_size, shuffle=True, generator=generator)
+
+        avg_train_loss, samples_per_s = train_epoch(model, train_batches, criterion, optimizer, device, after_step)
+        avg_val_loss, val_accuracy = evaluate(model, val_batches(), criterion, device)
+
+        print(f"Epoch {epoch+1}/{num_epochs}, Train Loss: {avg_train_loss:.4f}, Val Loss: {avg_val_loss:.4f}, "
+              f"Val Accuracy: {val_accuracy:.2f}%, {samples_per_s:.0f} samples/s")
+
+    # Save the trained model
+    if save_path:
+        torch.save(model.state_dict(), save_path)
+
+    # Final test accuracy
+    _, test_accuracy = evaluate(model, test_batches(), criterion, device)
+    print(f"Test Accuracy: {test_accuracy:.2f}%")
+    return model, test_accuracy
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Train RedstoneLeNet on skeletonized MNIST")
+    parser.add_argument("--mode", choices=("loader", "tensor"), default="loader",
+                        help="DataLoader batches, or the whole dataset as in-memory tensors")
+    parser.add_argument("--epochs", type=int, default=4)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--lr", type=float, default=0.001)
+    parser.add_argument("--threads", type=int, default=None, help="torch.set_num_threads")
+    parser.add_argument("--device", choices=("auto", "cpu", "cuda"), default="auto")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--save", default="redstone_lenet.pth")
+    parser.add_argument("--data", default="./data")
+    args = parser.parse_args(argv)
+
+    device = None if args.device == "auto" else torch.device(args.device)
+    train(args.mode, args.epochs, args.batch_size, args.lr, args.threads, device, args.seed,
+          save_path=args.save, root=args.data)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+# 编译后的权重文件（.rlw），不依赖 torch，用 mmap 零拷贝加载
+#
+# 文件布局（小端）：
+#   文件头 64 字节：magic "RLNW", 版本, 张量个数, 定点小数位数, 保留, 源 .pth 的 sha256
+#   张量表：每个张量 64 字节：名字, 类型(0=float32, 1=int32 定点), 维数, 形状[4], 数据偏移
+#   数据区：每个张量的原始字节，按 64 字节对齐
+# 每个参数存两份：原始 float32 和 rsr 量化后的 int32（2^-14 的整数倍）
+import hashlib
+import mmap
+import struct
+
+import numpy as np
+
+MAGIC = b"RLNW"
+VERSION = 1
+FRAC_BITS = 14
+HEADER = struct.Struct("<4sHHHH32s20x")
+ENTRY = struct.Struct("<32sBB6x4IQ")
+ALIGN = 64
+KIND_FLOAT = 0
+KIND_FIXED = 1
+DTYPES = {KIND_FLOAT: np.dtype("<f4"), KIND_FIXED: np.dtype("<i4")}
+
+def file_sha256(filepath):
+    h = hashlib.sha256()
+    with open(filepath, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 16), b""):
+            h.update(chunk)
+    return h.digest()
+
+def _align(offset):
+    return (offset + ALIGN - 1) // ALIGN * ALIGN
+
+def write_compiled_weights(filepath, state_dict, source_sha256=bytes(32)):
+    """
+    state_dict: {name: array-like}，例如 torch.load 的结果转成 numpy
+    source_sha256: 源 .pth 的 sha256，用于检查 .rlw 是否过期
+    """
+    from redstone_lenet_forward import rsr_array
+
+    tensors = []
+    for name, value in state_dict.items():
+        value = np.asarray(value, dtype=np.float32)
+        if value.ndim > 4:
+            raise ValueError(f"{name}: 最多支持4维，实际为{value.ndim}维")
+        fixed = np.round(rsr_array(value) * 2 ** FRAC_BITS).astype(np.int32)
+        tensors.append((name, KIND_FLOAT, value))
+        tensors.append((name, KIND_FIXED, fixed))
+
+    offset = _align(HEADER.size + ENTRY.size * len(tensors))
+    entries = []
+    for name, kind, value in tensors:
+        encoded = name.encode("utf-8")
+        if len(encoded) > 32:
+            raise ValueError(f"张量名过长: {name}")
+        shape = list(value.shape) + [0] * (4 - value.ndim)
+        entries.append(ENTRY.pack(encoded, kind, value.ndim, *shape, offset))
+        offset = _align(offset + value.nbytes)
+
+    with open(filepath, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(tensors), FRAC_BITS, 0, source_sha256))
+        for entry in entries:
+            f.write(entry)
+        for (_, kind, value), entry in zip(tensors, entries):
+            f.seek(ENTRY.unpack(entry)[-1])
+            f.write(value.astype(DTYPES[kind], copy=False).tobytes())
+        f.truncate(offset)
+
+def read_header(buffer):
+    magic, version, count, frac_bits, _, source_sha256 = HEADER.unpack_from(buffer, 0)
+    if magic != MAGIC:
+        raise ValueError("不是 .rlw 权重文件")
+    if version != VERSION:
+        raise ValueError(f"不支持的 .rlw 版本: {version}")
+    return count, frac_bits, source_sha256
+
+def load_compiled_weights(filepath, fixed_point=False):
+    """
+    用 mmap 只读映射 .rlw 文件，返回 {name: ndarray}，数组直接指向映射的内存，不做拷贝
+    多个进程加载同一个文件时共享同一份页缓存
+    fixed_point: 为True时返回 int32 定点权重（2^-14 的整数倍），否则返回 float32 原始权重
+    """
+    with open(filepath, "rb") as f:
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    count, frac_bits, _ = read_header(buffer)
+    if frac_bits != FRAC_BITS:
+        raise ValueError(f"定点小数位数不匹配: {frac_bits} != {FRAC_BITS}")
+
+    want = KIND_FIXED if fixed_point else KIND_FLOAT
+    weights = {}
+    for i in range(count):
+        raw_name, kind, ndim, *shape, offset = ENTRY.unpack_from(buffer, HEADER.size + i * ENTRY.size)
+        if kind != want:
+            continue
+        shape = tuple(shape[:ndim])
+        dtype = DTYPES[kind]
+        weights[raw_name.rstrip(b"\0").decode("utf-8")] = np.frombuffer(
+            buffer, dtype=dtype, count=int(np.prod(shape)), offset=offset).reshape(shape)
+    return weights
+
+def is_stale(compiled_path, source_path):
+    """源 .pth 变了之后 .rlw 需要重新导出"""
+    with open(compiled_path, "rb") as f:
+        _, _, source_sha256 = read_header(f.read(HEADER.size))
+    return source_sha256 != file_sha256(source_path)
+
+if __name__ == "__main__":
+    import time
+
+    start = time.perf_counter()
+    weights = load_compiled_weights("redstone_lenet.rlw")
+    weights_q = load_compiled_weights("redstone_lenet.rlw", fixed_point=True)
+    elapsed = time.perf_counter() - start
+    for name, value in weights.items():
+        print(f"{name}: {value.dtype} {value.shape} / {weights_q[name].dtype}")
+    print(f"loaded in {elapsed * 1e3:.2f} ms, stale: {is_stale('redstone_lenet.rlw', 'redstone_lenet.pth')}")
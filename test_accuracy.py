@@ -24,7 +24,8 @@ pred_limit = 100
 
 # 特定标签的样本
 target_label = 9
-indices = [i for i, (_, label) in enumerate(mnist_dataset) if label == target_label]
+# 直接读 targets，不要为了取标签把 6 万张图都做一遍骨架化
+indices = [i for i, label in enumerate(mnist_dataset.targets.tolist()) if label == target_label]
 sample_indices = random.sample(indices, pred_limit)
 
 images = []
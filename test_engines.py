@@ -0,0 +1,627 @@
+import glob
+import os
+
+import numpy as np
+
+from redstone_lenet_forward import load_weights, quantize_weights, forward, predict, forward_batch, predict_batch
+from redstone_lenet_forward import LAYERS, register_layer_hook, clear_layer_hooks
+from redstone_lenet_fixed import forward_fixed, predict_fixed, logits_to_float
+from redstone_lenet_sparse import prepare_sparse, forward_sparse, sparsity_report, prepare_csr, forward_csr, csr_macs
+from redstone_lenet_incremental import IncrementalPredictor
+from redstone_lenet_codegen import load_specialized, weights_hash
+from classify_bulk import iter_paths, iter_records, classify_stream
+from redstone_lenet_packed import read_csv_image, pack_images, pack_image, unpack_images, write_corpus, read_corpus
+
+weights = load_weights("redstone_lenet.pth")
+weights_q = quantize_weights(weights)
+
+def random_images(count, seed=0, density=0.3):
+    """随机的 0/1 图像，density 为点亮像素的比例"""
+    rng = np.random.default_rng(seed)
+    return (rng.random((count, 15, 15)) < density).astype(np.int64)
+
+def raw_digits(count, seed=0):
+    """假的 28x28 灰度“手写数字”：几条随机的粗笔画，给骨架化 / 骨架库的测试用"""
+    rng = np.random.default_rng(seed)
+    raw = np.zeros((count, 28, 28), dtype=np.uint8)
+    for img in raw:
+        for _ in range(rng.integers(1, 4)):
+            r, c = rng.integers(4, 20, size=2)
+            if rng.random() < 0.5:
+                img[r:r + 3, c:c + rng.integers(5, 9)] = 255
+            else:
+                img[r:r + rng.integers(5, 9), c:c + 3] = 255
+    return raw, rng.integers(10, size=count).astype(np.uint8)
+
+def pre_draw_images():
+    paths = sorted(glob.glob("pre_draw/*.csv"))
+    return paths, np.array([read_csv_image(p) for p in paths])
+
+def assert_batch_matches_scalar(images):
+    logits = forward_batch(images, weights)
+    preds = predict_batch(images, weights)
+    for img, row, pred in zip(images, logits, preds):
+        expected = forward(img.tolist(), weights)
+        # 逐位相同，而不只是近似相等
+        assert row.tolist() == expected, (row.tolist(), expected)
+        assert pred == predict(img.tolist(), weights)
+
+def test_batch_matches_scalar_on_random_images():
+    for density in (0.1, 0.3, 0.6):
+        assert_batch_matches_scalar(random_images(200, seed=int(density * 10), density=density))
+
+def test_batch_matches_scalar_on_pre_draw():
+    _, images = pre_draw_images()
+    assert_batch_matches_scalar(images)
+
+def assert_fixed_matches_float(images):
+    for img in images:
+        img = img.tolist()
+        expected = forward(img, weights)
+        assert logits_to_float(forward_fixed(img, weights_q)) == expected
+        assert predict_fixed(img, weights_q) == predict(img, weights)
+
+def test_fixed_matches_float_on_random_images():
+    for seed, density in enumerate((0.05, 0.2, 0.4, 0.7)):
+        assert_fixed_matches_float(random_images(500, seed=100 + seed, density=density))
+
+def test_fixed_matches_float_on_pre_draw():
+    _, images = pre_draw_images()
+    assert_fixed_matches_float(images)
+
+def test_sparse_matches_dense():
+    sparse = prepare_sparse(weights)
+    _, drawn = pre_draw_images()
+    stats = {}
+    for img in list(drawn) + list(random_images(100, seed=7, density=0.15)):
+        assert forward_sparse(img.tolist(), sparse, stats) == forward(img.tolist(), weights)
+    report = sparsity_report(stats, sparse)
+    assert 0 < report["input_density"] < 1 and 0 < report["conv_mac_saving"] < 1
+
+def test_csr_matches_dense_on_pruned_weights():
+    # 剪掉绝对值小于 0.1 的全连接权重
+    pruned = {key: [[w if abs(w) >= 0.1 else 0.0 for w in row] for row in value] if key.startswith("fc") and
+              key.endswith("weight") else value for key, value in weights.items()}
+    prepared = prepare_csr(pruned)
+    macs, dense_macs = csr_macs(prepared)
+    assert 0 < macs < dense_macs == 30 * 49 + 30 * 30 + 10 * 30
+    _, drawn = pre_draw_images()
+    for img in list(drawn) + list(random_images(50, seed=9)):
+        assert forward_csr(img.tolist(), prepared) == forward(img.tolist(), pruned)
+
+def test_incremental_matches_forward():
+    model = IncrementalPredictor(weights)
+    assert model.logits() == forward([[0] * 15 for _ in range(15)], weights)
+    rng = np.random.default_rng(8)
+    # 随机点亮和擦除像素，每一步都与从头计算的 forward 逐位相同
+    for r, c, v in zip(rng.integers(15, size=300), rng.integers(15, size=300), rng.random(300) < 0.7):
+        model.set_pixel(int(r), int(c), int(v))
+        assert model.logits() == forward(model.image, weights)
+    _, drawn = pre_draw_images()
+    model = IncrementalPredictor(weights, drawn[0].tolist())
+    assert model.predict() == predict(drawn[0].tolist(), weights)
+
+def test_specialized_matches_forward(tmp_path):
+    cache_dir = str(tmp_path / "rlcache")
+    specialized = load_specialized(weights, cache_dir=cache_dir)
+    assert weights_hash(weights) in open(specialized.__file__).read()
+    # 第二次直接使用缓存的文件
+    assert load_specialized(weights, cache_dir=cache_dir).__file__ == specialized.__file__
+    _, drawn = pre_draw_images()
+    rng = np.random.default_rng(10)
+    images = list(drawn) + list(random_images(100, seed=10)) + list(rng.choice([0.0, 0.5, 0.75, 1.0], (20, 15, 15)))
+    for img in images:
+        assert specialized.forward(img.tolist()) == forward(img.tolist(), weights)
+    assert specialized.forward(pack_image(drawn[0])) == forward(drawn[0].tolist(), weights)
+
+def test_load_weights_fixed_point():
+    assert load_weights("redstone_lenet.pth", fixed_point=True) == weights_q
+
+def test_engines_accept_packed_images():
+    images = random_images(100, seed=7)
+    packed = pack_images(images)
+    assert (forward_batch(packed, weights) == forward_batch(images, weights)).all()
+    for img, row in zip(images, packed):
+        expected = forward(img.tolist(), weights)
+        assert forward(row.tobytes(), weights) == expected
+        assert forward(pack_image(img), weights) == expected
+        assert logits_to_float(forward_fixed(row.tobytes(), weights_q)) == expected
+
+def test_evaluate_process_pool():
+    from evaluate import synthetic_fixtures, evaluate
+    images, labels = synthetic_fixtures(90, seed=4)
+    expected = predict_batch(images, weights)
+    confusion = np.zeros((10, 10), dtype=np.int64)
+    np.add.at(confusion, (labels, expected), 1)
+
+    # 分片按完成顺序汇总，结果与分片大小和进程数无关
+    for engine in ("batch", "fixed"):
+        result = evaluate(images, labels.astype(np.int64), False, "redstone_lenet.pth", workers=2,
+                          engine=engine, chunk=32, progress=False)
+        assert result["total"] == 90 and result["workers"] == 2
+        assert (result["confusion"] == confusion).all()
+        assert result["accuracy"] == np.mean(expected == labels)
+
+    # 原始灰度图在工作进程里骨架化，每个分片单独设种子，结果与进程数无关
+    raw, raw_labels = raw_digits(24, seed=4)
+    results = [evaluate(raw, raw_labels.astype(np.int64), True, "redstone_lenet.pth", workers=workers,
+                        chunk=8, seed=1, progress=False) for workers in (1, 2)]
+    assert (results[0]["confusion"] == results[1]["confusion"]).all() and results[0]["total"] == 24
+
+def test_skeleton_bank_build_and_epoch(tmp_path):
+    from PIL import Image
+    from skimage.morphology import skeletonize
+    from redstone_lenet import binarize_image, skeleton_variants
+    from redstone_lenet_bank import build_bank, SkeletonBank
+    raw, labels = raw_digits(20, seed=2)
+    path = str(tmp_path / "bank" / "skeleton_bank.rlb")
+    # 分成几个进程池的块之后按原来的顺序写入
+    build_bank(path, raw, labels, workers=2, chunk=7)
+    bank = SkeletonBank(path)
+    assert len(bank) == 20 and (bank.labels == labels).all()
+    skeletons = np.stack([skeletonize(binarize_image(Image.fromarray(r))) for r in raw]).astype(np.uint8)
+    assert (bank.skeletons(np.arange(20)) == skeletons).all()
+    variants = np.stack([skeleton_variants(s) for s in skeletons])
+    assert (bank._unpack(np.arange(20), [1, 2, 3]) == variants).all()
+
+    # 每个 epoch 由 (seed, epoch) 决定；拼接结果包含骨架，且不超出最粗的变种3
+    images, epoch_labels = bank.epoch(seed=5, epoch=0, batch_size=6)
+    assert images.shape == (20, 15, 15) and images.dtype == np.uint8
+    assert (epoch_labels == labels).all() and epoch_labels.dtype == np.int64
+    assert ((images | skeletons) == images).all() and ((images | variants[:, 2]) == variants[:, 2]).all()
+    assert (bank.epoch(seed=5, epoch=0, batch_size=6)[0] == images).all()
+    assert not (bank.epoch(seed=5, epoch=1, batch_size=6)[0] == images).all()
+
+    with open(str(tmp_path / "bad.rlb"), "wb") as f:
+        f.write(b"XXXX" + bytes(12))
+    try:
+        SkeletonBank(str(tmp_path / "bad.rlb"))
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("SkeletonBank should reject a file without the RLNB magic")
+
+def test_layer_hooks():
+    _, images = pre_draw_images()
+    expected = forward(images[0].tolist(), weights)
+    seen = []
+    handle = register_layer_hook("fc1", lambda layer, output, info: seen.append((layer, len(output), info)))
+    try:
+        # 注册 hook 不改变结果
+        assert forward(images[0].tolist(), weights) == expected
+        assert [(layer, n) for layer, n, _ in seen] == [("fc1", 30)]
+        assert seen[0][2]["macs"] == 30 * 49 and seen[0][2]["rsr_calls"] == 30 * (2 * 49 + 1)
+        assert seen[0][2]["seconds"] >= 0
+        order = []
+        for layer in LAYERS:
+            register_layer_hook(layer, lambda layer, output, info: order.append(layer))
+        forward(images[0].tolist(), weights)
+        assert order == list(LAYERS)
+    finally:
+        handle.remove()
+        clear_layer_hooks()
+    # 注销之后不再调用
+    count = len(seen)
+    forward(images[0].tolist(), weights)
+    assert len(seen) == count
+
+def test_corpus_round_trip(tmp_path):
+    path = str(tmp_path / "corpus.rlp")
+    images = random_images(50, seed=8)
+    labels = list(range(10)) * 5
+    write_corpus(path, images, labels)
+    packed, read_labels = read_corpus(path)
+    assert (unpack_images(packed) == images).all()
+    assert list(read_labels) == labels
+
+def test_bulk_classify_matches_predict(tmp_path):
+    import io
+    import json
+    bad = str(tmp_path / "bad.csv")
+    with open(bad, "w") as f:
+        f.write("1,2\n")
+    # 形状正确但不是 0/1，与服务端一样拒绝
+    not_binary = str(tmp_path / "not_binary.csv")
+    with open(not_binary, "w") as f:
+        f.write("\n".join([",".join(["2"] * 15)] * 15) + "\n")
+    csvs = sorted(glob.glob("pre_draw/*.csv"))
+    paths = csvs[:5] + [bad] + csvs[5:] + ["pre_draw/pre_draw.rlp", not_binary]
+    out = io.StringIO()
+    records = iter_records(iter_paths(["-"], io.StringIO("\n".join(paths))), workers=0, chunk=4)
+    images, errors, _ = classify_stream(records, weights, out, batch_size=5)
+    lines = [json.loads(line) for line in out.getvalue().splitlines()]
+    packed, _ = read_corpus("pre_draw/pre_draw.rlp")
+    assert errors == 2 and images == len(csvs) + len(packed) == len(lines) - 2
+    # 输出与输入顺序相同，出错的文件也在原来的位置
+    expected = [(path, None) for path in paths[:-2]] + [("pre_draw/pre_draw.rlp", i) for i in range(len(packed))]
+    assert [(line["file"], line.get("index")) for line in lines] == expected + [(not_binary, None)]
+    assert "error" in lines[5] and "error" in lines[-1]
+    for line in lines:
+        if "error" in line:
+            continue
+        image = unpack_images(packed)[line["index"]] if "index" in line else read_csv_image(line["file"])
+        assert line["prediction"] == predict(np.asarray(image).tolist(), weights)
+    del packed
+
+def test_server_batches_concurrent_requests():
+    import asyncio
+    from redstone_lenet_server import start_server, stop_server
+    from redstone_lenet_loadgen import request_bodies, run_load
+
+    bodies = request_bodies(weights)
+    assert len(bodies) > 0 and all(expected is not None for _, expected in bodies)
+
+    async def run():
+        server, batcher, executor = await start_server(weights, port=0, max_batch=16, max_wait_ms=5, workers=0)
+        url = "http://127.0.0.1:%d" % server.sockets[0].getsockname()[1]
+        try:
+            result = await run_load(url, concurrency=16, duration=0.5, bodies=bodies)
+            return result, batcher.metrics.snapshot()
+        finally:
+            await stop_server(server, batcher, executor)
+
+    result, metrics = asyncio.run(run())
+    assert result["requests"] > 0 and result["errors"] == 0
+    assert metrics["requests"] == result["requests"]
+    assert metrics["mean_batch_size"] > 1
+
+def test_server_stop_fails_pending_requests():
+    import asyncio
+    import threading
+    from concurrent.futures import ThreadPoolExecutor
+    from redstone_lenet_server import MicroBatcher, Metrics, _init_worker
+
+    _init_worker(weights)
+    packed = bytes(pack_image(np.zeros((15, 15), dtype=np.uint8)))
+    release = threading.Event()
+    executor = ThreadPoolExecutor(max_workers=1)
+
+    async def run():
+        # 第一批卡在工作线程里，第二个请求留在队列中，stop 之后两者都要以异常结束
+        batcher = MicroBatcher(executor, max_batch=1, max_wait_ms=0, max_in_flight=1)
+        batcher.start()
+        executor.submit(release.wait)
+        clients = [asyncio.ensure_future(batcher.submit(packed)) for _ in range(2)]
+        await asyncio.sleep(0.05)
+        assert batcher.metrics.in_flight == 1
+        await batcher.stop()
+        return await asyncio.wait_for(asyncio.gather(*clients, return_exceptions=True), 1.0)
+
+    try:
+        results = asyncio.run(run())
+    finally:
+        release.set()
+        executor.shutdown()
+    assert all(isinstance(r, RuntimeError) for r in results)
+
+    metrics = Metrics()
+    metrics.errors = 3
+    metrics.record_batch(2, [0.001, 0.002])
+    metrics.reset()
+    snapshot = metrics.snapshot()
+    assert snapshot["requests"] == snapshot["errors"] == snapshot["batches"] == 0
+    assert snapshot["batch_sizes"] == {} and len(metrics.latencies) == 0
+
+def test_server_rejects_bad_content_length():
+    import asyncio
+    from redstone_lenet_server import InferenceServer, MAX_BODY, start_server, stop_server
+
+    async def exchange(port, length):
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(f"POST /predict HTTP/1.1\r\nContent-Length: {length}\r\n\r\n".encode())
+        await writer.drain()
+        response = await reader.read()
+        writer.close()
+        return int(response.split()[1])
+
+    class Writer:
+        def write(self, data):
+            pass
+
+        async def drain(self):
+            pass
+
+        def close(self):
+            self.closed = True
+
+    async def run():
+        server, batcher, executor = await start_server(weights, port=0, workers=0)
+        port = server.sockets[0].getsockname()[1]
+        try:
+            statuses = [await exchange(port, length) for length in (MAX_BODY + 1, 10 ** 9, -5, "abc", "1_0")]
+        finally:
+            await stop_server(server, batcher, executor)
+        # 取消等待请求的连接：关闭之后 CancelledError 继续向上传递
+        writer = Writer()
+        task = asyncio.ensure_future(InferenceServer(None).serve_connection(asyncio.StreamReader(), writer))
+        await asyncio.sleep(0)
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        return statuses, task.cancelled(), getattr(writer, "closed", False)
+
+    statuses, cancelled, closed = asyncio.run(run())
+    assert statuses == [413, 413, 400, 400, 400]
+    assert cancelled and closed
+
+def test_diff_shard_reports_disagreements():
+    import redstone_lenet_diff as diff
+    diff._init_worker("redstone_lenet.pth")
+    source, stats, worst = diff._run_shard("perturbed", 0, 200, seed=3, top_k=5)
+    assert source == "perturbed" and stats["images"] == 200 == sum(stats["error_hist"])
+    # 最差的输入排在前面，手写推理一侧的 logits 就是 forward 的结果
+    assert [item[0] for item in worst] == sorted((item[0] for item in worst), reverse=True)
+    for (disagree, _), _, _, _, packed, reference, manual in worst:
+        assert manual == forward(unpack_images(packed[None])[0].tolist(), weights)
+        assert disagree == (np.argmax(reference) != np.argmax(manual))
+    report = diff.summarize(stats)
+    assert report["disagree"] == round(report["disagreement_rate"] * 200)
+
+def test_redstone_float_forward_agrees_with_predict():
+    from evaluate import synthetic_fixtures
+    from redstone_lenet_redstone import encode_weights, layer_scales, forward_redstone, predict_redstone, compare_with_predict
+    import redstone_float_array as rfa
+
+    _, images = pre_draw_images()
+    synthetic, _ = synthetic_fixtures(40, seed=0)
+    images = np.concatenate([images, synthetic])
+
+    # 原始权重：每层按 2 的幂缩放后累加不会超出 (-4, 4)，不会溢出也不会回绕
+    scales = layer_scales(weights)
+    assert list(scales.values()) == sorted(scales.values()) and scales["fc3"] > 0
+    weights_rs = encode_weights(weights)
+    stats = {}
+    logits = np.ldexp(rfa.decode(forward_redstone(images[:4], weights_rs, stats)), scales["fc3"])
+    assert np.abs(logits - forward_batch(images[:4], weights)).max() < 1e-2
+    assert stats.get("overflow", 0) == stats.get("underflow", 0) == stats.get("exponent_wrap", 0) == 0
+    predictions, _ = predict_redstone(images, weights_rs, chunk=16)
+    result = compare_with_predict(images, weights, chunk=16)
+    assert result["stats"] == {"exponent_wrap": 0, "overflow": 0, "underflow": 0}
+    assert result["disagreements"] == np.count_nonzero(predictions != [predict(img.tolist(), weights) for img in images])
+    assert result["disagreement_rate"] <= 0.02 and result["max_logit_error"] < 1e-2
+
+    # 不缩放时 fc1 / fc3 的累加超出范围，指数回绕，分类大多不再一致
+    unscaled = compare_with_predict(images, weights, chunk=16, rescale=False)
+    assert unscaled["scales"] == dict.fromkeys(scales, 0) and unscaled["stats"]["overflow"] > 0
+    assert unscaled["disagreements"] > result["disagreements"]
+    assert unscaled["mismatch_indices"].tolist() == sorted(unscaled["mismatch_indices"].tolist())
+
+def test_precision_sweep_matches_rsr_at_14_bits():
+    from redstone_lenet_precision import conv_patches, quantized_weight_stack, forward_sweep, sweep, minimum_bits
+    images = random_images(300, seed=9)
+    configs = [(14, "nearest"), (6, "truncate")]
+    stacks, _ = quantized_weight_stack(weights, configs)
+    logits, saturated = forward_sweep(conv_patches(images), stacks, configs)
+    assert (logits[0] == forward_batch(images, weights)).all()
+    assert not (logits[1] == logits[0]).all()
+    assert saturated.tolist() == [0, 0]
+
+    labels = predict_batch(images, weights)
+    result = sweep(images, labels, weights, [4, 6, 14], chunk=128)
+    accuracy = dict(zip(result["configs"], result["accuracy"]))
+    assert accuracy[(14, "nearest")] == 1.0 == accuracy[(None, "float")]
+    # 截断总是朝 0 丢掉低位，同样位数下不比最近舍入更准
+    for bits in (4, 6):
+        assert accuracy[(bits, "truncate")] <= accuracy[(bits, "nearest")] < 1.0
+    assert minimum_bits(result, tolerance=0.01) == {"nearest": 14, "truncate": 14}
+    assert minimum_bits(result, tolerance=0.05) == {"nearest": 6, "truncate": 6}
+    assert not result["saturated"].any()
+
+    # 范围收窄到 ±0.75 后激活值会被饱和，饱和的个数随位数和舍入方式变化
+    narrow = sweep(images, labels, weights, [4, 6, 14], limit=0.75, chunk=128)
+    assert narrow["saturated"].min() > 0 and len(set(narrow["saturated"].tolist())) > 1
+
+def test_iterate_batches():
+    import torch
+    from redstone_lenet_train import iterate_batches
+    images = torch.arange(10, dtype=torch.float32).reshape(10, 1, 1, 1)
+    labels = torch.arange(10)
+    batches = list(iterate_batches(images, labels, 4))
+    assert [len(y) for _, y in batches] == [4, 4, 2]
+    assert torch.cat([y for _, y in batches]).tolist() == list(range(10))
+
+    def shuffled(generator):
+        batches = list(iterate_batches(images, labels, 4, shuffle=True, generator=generator))
+        for x, y in batches:
+            assert x.flatten().long().tolist() == y.tolist()
+        return torch.cat([y for _, y in batches]).tolist()
+    first = shuffled(torch.Generator().manual_seed(1))
+    assert sorted(first) == list(range(10)) and first != list(range(10))
+    assert shuffled(torch.Generator().manual_seed(1)) == first
+    assert sorted(shuffled(None)) == list(range(10))
+
+def test_train_tensor_mode_on_bank(tmp_path):
+    import torch
+    from redstone_lenet_bank import build_bank
+    from redstone_lenet_train import load_datasets, train
+    raw, labels = raw_digits(40, seed=1)
+    build_bank(str(tmp_path / "skeleton_bank.rlb"), raw, labels, workers=1)
+    build_bank(str(tmp_path / "skeleton_bank_test.rlb"), raw[:10], labels[:10], workers=1)
+    train_set, test_set = load_datasets(str(tmp_path))
+    assert (len(train_set), len(test_set)) == (40, 10)
+
+    # 同样的种子：模型初始化、划分、打乱顺序和骨架库的拼接都相同，训练结果完全相同
+    results = []
+    for seed in (3, 3, 4):
+        model, accuracy = train("tensor", 2, 8, seed=seed, save_path=None, root=str(tmp_path))
+        results.append(model.state_dict())
+    for name, value in results[0].items():
+        assert torch.equal(value, results[1][name])
+    assert not all(torch.equal(value, results[2][name]) for name, value in results[0].items())
+
+def test_train_tensor_mode_reaugments_each_epoch(monkeypatch):
+    import torch
+    import redstone_lenet_train
+
+    class RandomDataset(torch.utils.data.Dataset):
+        """每次取样都重新随机生成图像，记录被取样的次数，代替带随机 transform 的 MNIST"""
+        def __init__(self, count):
+            self.count = count
+            self.calls = 0
+        def __len__(self):
+            return self.count
+        def __getitem__(self, index):
+            self.calls += 1
+            return torch.from_numpy((np.random.random((1, 15, 15)) < 0.3).astype(np.float32)), index % 10
+
+    datasets = RandomDataset(20), RandomDataset(5)
+    monkeypatch.setattr(redstone_lenet_train, "load_datasets", lambda root, seed=None: datasets)
+    redstone_lenet_train.train("tensor", 3, 8, seed=0, save_path=None)
+    # 没有骨架库时每个 epoch 都把整个训练集重新 transform 一遍，测试集只在最后用一次
+    assert datasets[0].calls == 3 * 20 and datasets[1].calls == 5
+
+def constant_state_dict(label):
+    """fc3 的权重全为 0、偏置只在 label 处为正：任何图像都预测为 label"""
+    import torch
+    state = {name: torch.tensor(value, dtype=torch.float32) for name, value in weights.items()}
+    state["fc3.weight"] = torch.zeros_like(state["fc3.weight"])
+    state["fc3.bias"] = torch.zeros_like(state["fc3.bias"])
+    state["fc3.bias"][label] = 1.5
+    return state
+
+def save_weights(path, state, bump=0):
+    """保存 .pth；bump 把 mtime 往后推几秒，保证缓存能看到文件变了"""
+    import torch
+    torch.save(state, str(path))
+    if bump:
+        st = os.stat(str(path))
+        os.utime(str(path), ns=(st.st_atime_ns, st.st_mtime_ns + bump * 10**9))
+
+def test_compiled_weights_round_trip(tmp_path):
+    from redstone_lenet_weights import write_compiled_weights, load_compiled_weights, is_stale, file_sha256
+    pth, rlw = tmp_path / "w.pth", str(tmp_path / "w.rlw")
+    save_weights(pth, constant_state_dict(3))
+    state = {name: value.numpy() for name, value in constant_state_dict(3).items()}
+    write_compiled_weights(rlw, state, file_sha256(str(pth)))
+
+    for fixed_point in (False, True):
+        assert load_weights(rlw, fixed_point) == load_weights(str(pth), fixed_point)
+    # 数组直接指向映射的内存，只读
+    compiled = load_compiled_weights(rlw, fixed_point=True)
+    assert compiled["conv1.weight"].dtype == np.int32 and not compiled["conv1.weight"].flags.writeable
+    assert forward(random_images(1, seed=12)[0].tolist(), load_weights(rlw)) == \
+        forward(random_images(1, seed=12)[0].tolist(), load_weights(str(pth)))
+
+    assert not is_stale(rlw, str(pth))
+    save_weights(pth, constant_state_dict(5))
+    assert is_stale(rlw, str(pth))
+
+def test_prediction_cache_hits_and_eviction(tmp_path):
+    from redstone_lenet_cache import PredictionCache
+    save_weights(tmp_path / "w.pth", constant_state_dict(3))
+    images = random_images(4, seed=10)
+    store = str(tmp_path / "cache.sqlite")
+
+    cache = PredictionCache(str(tmp_path / "w.pth"), maxsize=2, store_path=store, commit_every=2)
+    assert [cache.predict(img) for img in images[:3]] == [3, 3, 3]
+    # 攒够 2 个才写一次 sqlite，第 3 个还在缓冲里，写入之间不占着事务
+    assert cache.stats()["pending"] == 1 and not cache.store.in_transaction
+    assert cache.stats()["misses"] == 3 and cache.stats()["evictions"] == 1 and cache.stats()["size"] == 2
+    cache.predict(images[2])
+    assert cache.stats()["hits"] == 1
+    # images[0] 已经从内存的 LRU 里被挤出，只能从 sqlite 里读到
+    cache.predict(images[0])
+    assert cache.stats()["disk_hits"] == 1 and cache.stats()["misses"] == 3
+    assert list(cache.memory) == [pack_image(images[2]), pack_image(images[0])]
+    cache.close()
+
+    # 重新打开：close 时写入了缓冲里剩下的结果
+    cache = PredictionCache(str(tmp_path / "w.pth"), maxsize=2, store_path=store)
+    assert [cache.predict(img) for img in images[:3]] == [3, 3, 3]
+    assert cache.stats()["disk_hits"] == 3 and cache.stats()["misses"] == 0
+    cache.close()
+
+    # 权重文件在 check_interval 之内不会再被 stat
+    cache = PredictionCache(str(tmp_path / "w.pth"), store_path=store, check_interval=3600)
+    save_weights(tmp_path / "w.pth", constant_state_dict(6), bump=1)
+    assert cache.predict(images[3]) == 3
+    cache.check_interval = 0
+    assert cache.predict(images[3]) == 6 and cache.stats()["invalidations"] == 1
+    cache.close()
+
+def test_prediction_cache_invalidation(tmp_path):
+    from redstone_lenet_cache import PredictionCache
+    from redstone_lenet_weights import write_compiled_weights, file_sha256
+    a, b = tmp_path / "a.pth", tmp_path / "b.pth"
+    save_weights(a, constant_state_dict(3))
+    save_weights(b, constant_state_dict(5))
+    store = str(tmp_path / "cache.sqlite")
+    image = random_images(1, seed=11)[0]
+
+    cache_a = PredictionCache(str(a), store_path=store, check_interval=0, commit_every=1)
+    cache_b = PredictionCache(str(b), store_path=store, check_interval=0, commit_every=1)
+    assert (cache_a.predict(image), cache_b.predict(image)) == (3, 5)
+    save_weights(a, constant_state_dict(7), bump=1)
+    assert cache_a.predict(image) == 7 and cache_a.stats()["invalidations"] == 1
+    # 作废 a 的结果不会删掉共用同一个 sqlite 的 b 的结果
+    cache_b.memory.clear()
+    assert cache_b.predict(image) == 5 and cache_b.stats()["disk_hits"] == 1
+    cache_a.close()
+    cache_b.close()
+
+    # .rlw：源 .pth 改了而 .rlw 还没重新导出时也要作废，并改用 .pth 的权重
+    rlw = tmp_path / "a.rlw"
+    write_compiled_weights(str(rlw), {k: v.numpy() for k, v in constant_state_dict(7).items()}, file_sha256(str(a)))
+    cache = PredictionCache(str(rlw), store_path=store, check_interval=0)
+    assert cache.source_path == str(a) and cache.predict(image) == 7
+    save_weights(a, constant_state_dict(2), bump=2)
+    assert cache.predict(image) == 2 and cache.stats()["invalidations"] == 1
+    cache.close()
+
+def skeleton_samples(count, seed=0):
+    """已经是骨架的 15x15 图：skeletonize 对它们不起作用，逐张版本与批量版本的输入完全相同"""
+    from skimage.morphology import skeletonize
+    from redstone_lenet import binarize_image
+    from PIL import Image
+    raw, _ = raw_digits(count, seed)
+    skeletons = np.stack([skeletonize(binarize_image(Image.fromarray(r))) for r in raw]).astype(np.uint8)
+    assert all((skeletonize(s).astype(np.uint8) == s).all() for s in skeletons)
+    return skeletons
+
+class ScriptedRng:
+    """代替 np.random.Generator：integers 依次返回事先给定的数组"""
+    def __init__(self, values):
+        self.values = list(values)
+
+    def integers(self, low, high=None, size=None):
+        return self.values.pop(0)
+
+def test_quadrant_merge_matches_scalar_draws(monkeypatch):
+    from redstone_lenet import custom_skeletonize, random_quadrant_merge, skeleton_variants_batch
+    skeletons = skeleton_samples(30, seed=4)
+    rng = np.random.default_rng(5)
+    mid_x, mid_y = rng.integers(5, 10, size=30), rng.integers(5, 10, size=30)
+    picks = rng.integers(5, size=(30, 4))  # variants 列表的下标，逐张版本里的 np.random.randint(5)
+
+    batch = random_quadrant_merge(skeleton_variants_batch(skeletons), ScriptedRng([mid_x, mid_y, picks]))
+    for n, skeleton in enumerate(skeletons):
+        # 逐张版本依次抽 mid_x, mid_y 和四块各自的变种，用同样的数代替
+        draws = iter([mid_x[n], mid_y[n], *picks[n]])
+        monkeypatch.setattr(np.random, "randint", lambda *args: next(draws))
+        assert (custom_skeletonize(skeleton) == batch[n]).all()
+
+def test_quadrant_merge_pixel_frequencies():
+    from redstone_lenet import custom_skeletonize, random_quadrant_merge, skeleton_variants_batch
+    skeleton = skeleton_samples(1, seed=6)
+    draws = 8000
+    np.random.seed(0)
+    freq_scalar = np.mean([custom_skeletonize(skeleton[0]) for _ in range(draws)], axis=0)
+    repeat = np.repeat(skeleton, draws, axis=0)
+    freq_batch = random_quadrant_merge(skeleton_variants_batch(repeat), np.random.default_rng(0)).mean(axis=0)
+    # 每个像素的频率标准差不超过 sqrt(0.25 / 8000) ≈ 0.0056，两者之差的 6 倍标准差约为 0.05
+    assert np.abs(freq_scalar - freq_batch).max() < 0.05
+    # 骨架本身的像素总是点亮，没有被任何变种覆盖到的像素总是熄灭
+    assert (freq_batch[skeleton[0] == 1] == 1).all() and (freq_scalar[skeleton[0] == 1] == 1).all()
+    assert ((freq_batch > 0) == (freq_scalar > 0)).all()
+
+if __name__ == "__main__":
+    # 用 pytest 跑完整个文件，新加的测试不需要再在这里登记
+    import sys
+    import pytest
+    status = pytest.main([__file__, "-q"])
+    paths, images = pre_draw_images()
+    for path, pred in zip(paths, predict_batch(images, weights)):
+        print(f"{path}: {pred}")
+    sys.exit(status)
@@ -0,0 +1,236 @@
+import math
+import random
+import re
+
+import numpy as np
+
+import redstone_float_array as rfa
+from redstone_float import RedstoneFloat as rf
+from redstone_float_ticks import TickCounter, DEFAULT_TICK_COSTS
+from redstone_float_multiply import (exponent_add, mantissa_multiply, formating, multiplying,
+                                     exponent_add_fast, mantissa_multiply_fast, formating_fast, multiplying_fast)
+from redstone_float_add import adding, adding_fast
+
+SAMPLES = 20000
+
+def random_operand(rng):
+    """随机的红石浮点数，尾数不一定已标准化（例如 .00001101），也包括 0"""
+    mantissa = rng.getrandbits(16) >> rng.choice([0, 0, 0, 3, 8, 15, 16])
+    return rf(rng.getrandbits(1), mantissa, rng.getrandbits(8))
+
+def fields(x):
+    return (x.sign, x.mantissa, x.exponent)
+
+# ===== 改为 __slots__ 整数存储之前、基于颜色字典的编码，作为回归测试的参照 =====
+
+MANTISSA_COLORS = ["white", "orange", "magenta", "light_blue", "yellow", "lime", "pink", "gray",
+                   "light_gray", "cyan", "purple", "blue", "brown", "green", "red", "black"]
+EXPONENT_COLORS = ["white", "orange", "magenta", "light_blue", "yellow", "lime", "pink", "gray"]
+
+def dict_redstr(value):
+    if value == 0:
+        return ".0e-0(+2)"
+    sign_str = '-' if value < 0 else ''
+    abs_value = abs(value)
+    exponent = math.floor(math.log2(abs_value))
+    mantissa = abs_value / (2 ** exponent)
+    if mantissa >= 1:
+        mantissa /= 2
+        exponent += 1
+    exponent -= 2
+    mantissa_bits = ''
+    remaining = mantissa
+    for i in range(16):
+        bit_value = 2 ** (-i - 1)
+        if remaining >= bit_value:
+            mantissa_bits += '1'
+            remaining -= bit_value
+        else:
+            mantissa_bits += '0'
+    mantissa_bits = mantissa_bits.rstrip('0') or '0'
+    exponent_val = -exponent
+    if exponent_val < 0 or exponent_val >= 256:
+        raise ValueError("Exponent out of range for 8-bit encoding")
+    return f"{sign_str}.{mantissa_bits}e-{bin(exponent_val)[2:].lstrip('0') or '0'}(+2)"
+
+def dict_from_string(encoded):
+    """return: (s, M, E)"""
+    match = re.fullmatch(r'(-?)\.(\d{1,16})e-(\d{1,8})\(\+2\)', encoded)
+    if not match:
+        raise ValueError(encoded)
+    sign_str, mantissa_str, exponent_str = match.groups()
+    M = {color: int(bit) for color, bit in zip(MANTISSA_COLORS, mantissa_str.ljust(16, '0'))}
+    exponent_value = sum(int(b) << i for i, b in enumerate(reversed(exponent_str.rjust(8, '0'))))
+    E = {color: (exponent_value >> i) & 1 for i, color in enumerate(EXPONENT_COLORS)}
+    return ('obsidian' if sign_str == '-' else ''), M, E
+
+def dict_to_float(s, M, E):
+    mantissa = sum(2 ** (-i - 1) for i, color in enumerate(MANTISSA_COLORS) if M[color] > 0)
+    exponent = sum(2 ** i for i, color in enumerate(EXPONENT_COLORS) if E[color] > 0)
+    return (-1) ** (s == 'obsidian') * mantissa * (2 ** (2 - exponent))
+
+def test_fast_path_matches_simulation():
+    rng = random.Random(0)
+    for _ in range(SAMPLES):
+        a, b = random_operand(rng), random_operand(rng)
+
+        # 中间结果：未标准化的 raw_E / raw_M
+        raw_E = exponent_add(a.E, b.E)
+        raw_M = mantissa_multiply(a.M, b.M)
+        assert rf('', 0, raw_E).exponent == exponent_add_fast(a.exponent, b.exponent)
+        assert rf('', raw_M, 0).mantissa == mantissa_multiply_fast(a.mantissa, b.mantissa)
+        # 进位之后每种颜色最多1个物品
+        assert all(v in (0, 1) for v in raw_M.values()) and all(v in (0, 1) for v in raw_E.values())
+
+        raw = multiplying(a, b)
+        assert fields(raw) == fields(multiplying_fast(a, b))
+        assert fields(raw) == fields(multiplying(a, b, fast=True))
+
+        # 尾数为0时逐个模拟的 formating 不会结束，只比较非0的情况
+        if raw.mantissa:
+            assert fields(formating(raw)) == fields(formating_fast(raw))
+            assert fields(multiplying(a, b, True)) == fields(multiplying_fast(a, b, True))
+
+def test_fast_path_on_encoded_floats():
+    rng = random.Random(1)
+    for _ in range(SAMPLES // 4):
+        a = rf.from_float(rng.uniform(-2, 2))
+        b = rf.from_float(rng.uniform(-2, 2))
+        assert fields(multiplying(a, b, True)) == fields(multiplying_fast(a, b, True))
+
+def test_vectorized_multiply_and_encode():
+    rng = random.Random(2)
+    values_a = [rng.uniform(-2, 2) * 2 ** -rng.randint(0, 20) for _ in range(SAMPLES // 4)] + [0.0]
+    values_b = [rng.uniform(-2, 2) for _ in range(SAMPLES // 4)] + [1.0]
+    a, b = rfa.encode(values_a), rfa.encode(values_b)
+    assert [tuple(int(p[i]) for p in a) for i in range(len(values_a))] == [fields(rf.from_float(v)) for v in values_a]
+    assert np.array_equal(rfa.decode(a), [rf.from_float(v).to_float() for v in values_a])
+    product = rfa.multiply(a, b)
+    for i, (x, y) in enumerate(zip(values_a, values_b)):
+        assert tuple(int(p[i]) for p in product) == fields(multiplying_fast(rf.from_float(x), rf.from_float(y), True))
+
+def test_array_text_round_trip():
+    rng = random.Random(4)
+    values = [rng.uniform(-2, 2) * 2 ** -rng.randint(0, 30) for _ in range(SAMPLES // 4)] + [0.0, -0.0]
+    strings = rfa.RedstoneFloatArray.from_float(values).to_strings()
+    assert strings.tolist() == [rf.redstr(v) for v in values]
+    parsed = rfa.RedstoneFloatArray.from_strings(strings.reshape(-1, 2))
+    assert parsed.shape == (len(values) // 2, 2)
+    assert [fields(x) for x in parsed.to_scalars()] == [fields(rf.from_string(s)) for s in strings]
+    # 非二进制的数字与 from_string 的处理方式相同
+    assert [fields(x) for x in rfa.RedstoneFloatArray.from_strings([".21e-29(+2)"]).to_scalars()] == \
+        [fields(rf.from_string(".21e-29(+2)"))]
+
+def test_add_fast_matches_simulation():
+    rng = random.Random(6)
+    pairs = [(random_operand(rng), random_operand(rng)) for _ in range(SAMPLES // 4)]
+    # 对阶位移 0 ~ 16 位、完全抵消、进位后指数回绕
+    for a, _ in pairs[:SAMPLES // 20]:
+        pairs.append((a, rf(rng.getrandbits(1), rng.getrandbits(16), (a.exponent + rng.randint(0, 17)) & 0xFF)))
+        pairs.append((a, rf(1 - a.sign, a.mantissa, a.exponent)))
+    pairs.append((rf(0, 0xFFFF, 0), rf(0, 0x8000, 0)))
+    for a, b in pairs:
+        assert fields(adding(a, b)) == fields(adding_fast(a, b)) == fields(adding(a, b, fast=True))
+    assert fields(adding_fast(rf(0, 0xFFFF, 0), rf(0, 0x8000, 0))) == (0, 0xBFFF, 0xFF)
+
+def test_vectorized_add():
+    rng = random.Random(7)
+    pairs = [(random_operand(rng), random_operand(rng)) for _ in range(SAMPLES // 4)]
+    a = rfa.RedstoneFloatArray.from_scalars(a for a, _ in pairs)
+    b = rfa.RedstoneFloatArray.from_scalars(b for _, b in pairs)
+    total = rfa.RedstoneFloatArray(*rfa.add(a, b))
+    assert [fields(x) for x in total.to_scalars()] == [fields(adding_fast(x, y)) for x, y in pairs]
+
+    # 尾数足够短时对阶不会丢位，和必须精确
+    np_rng = np.random.default_rng(3)
+    x = np_rng.integers(-2 ** 10, 2 ** 10, size=5000) * 2.0 ** -12
+    y = np_rng.integers(-2 ** 10, 2 ** 10, size=5000) * 2.0 ** -12
+    stats = {}
+    assert np.array_equal(rfa.decode(rfa.add(rfa.encode(x), rfa.encode(y), stats)), x + y)
+    assert stats.get("overflow", 0) == 0
+    # 超过 4 时指数回绕，与 adding 相同
+    big = rfa.encode([3.5, -3.5])
+    assert np.array_equal(rfa.decode(rfa.add(big, big, stats)), [7 * 2.0 ** -256, -7 * 2.0 ** -256])
+    assert stats["overflow"] == 2
+
+def test_encoding_matches_dict_implementation():
+    rng = random.Random(5)
+    values = [0.0, -0.0, 1.0, -1.0, 0.5, 3.99, -3.99, 4.0, 8.0, 2.0 ** -251, 2.0 ** -252, 2.0 ** -253, 2.0 ** -300,
+              1 - 2 ** -17, 5e-324, -5e-324, 1e300]
+    values += [rng.uniform(-4, 4) * 2.0 ** -rng.randint(0, 260) for _ in range(SAMPLES // 4)]
+    for value in values:
+        try:
+            expected = dict_redstr(value)
+        except ValueError:
+            # 超出 8 位指数范围，两种实现都报错
+            try:
+                rf.redstr(value)
+            except ValueError:
+                continue
+            raise AssertionError(f"redstr({value}) should raise")
+        assert rf.redstr(value) == expected, value
+        assert rf.from_float(value).to_string() == expected, value
+
+    # 未标准化的尾数、非 0/1 的数字、前导 0 和超过 8 位的指数
+    strings = [rf.redstr(v) for v in (0.0, 0.75, -1.5, 2.0 ** -200)]
+    strings += [".0001e-0(+2)", "-.0000000000000001e-11111111(+2)", ".21e-29(+2)", ".1e-00000010(+2)",
+                "-.1100000000000000e-00000010(+2)", ".1e-22222222(+2)"]
+    strings += ["%s.%se-%s(+2)" % (rng.choice(["", "-"]), format(rng.getrandbits(16), "016b")[:rng.randint(1, 16)],
+                                   format(rng.getrandbits(8), "b")) for _ in range(1000)]
+    for string in strings:
+        s, M, E = dict_from_string(string)
+        x = rf.from_string(string)
+        assert x.s == s
+        assert x.M == {color: int(bit > 0) for color, bit in M.items()}
+        assert x.E == E
+        assert x.to_float() == dict_to_float(s, M, E)
+        assert rf(s, M, E).M == x.M and fields(rf(s, M, E)) == fields(x)
+    for bad in ["1e-0(+2)", ".e-0(+2)", ".1e-0", ".10000000000000000e-0(+2)", ".1e-000000000(+2)"]:
+        try:
+            rf.from_string(bad)
+        except ValueError:
+            continue
+        raise AssertionError(f"from_string({bad!r}) should raise")
+
+def test_tick_counts_for_known_operands():
+    # 0.75 = .11，0.5 = .1：尾数通道 0 做 1 + 15 次检测、投入 1 个物品，通道 1 做 1 + 14 次检测、投入 1 个物品，
+    # 其余 14 个通道各检测 1 次就关闭；乘积 .011 需要左移一次再标准化
+    # 指数阶段：预先投入补码的 7 个物品，再投入两个指数的 1 + 7 个物品
+    ticks = TickCounter()
+    r = multiplying(rf.from_float(0.75), rf.from_float(0.5), True, ticks=ticks)
+    assert r.to_float() == 0.375 and ticks.operations == 1
+    assert {stage: dict(counter) for stage, counter in ticks.counts.items()} == {
+        "exponent_add": {"item_insert": 7 + 8, "comparator_check": 8, "hopper_drain": 14},
+        "mantissa_channels": {"comparator_check": 45, "item_insert": 2},
+        "carry": {"comparator_check": 16},
+        "normalize": {"comparator_check": 25, "hopper_drain": 2, "item_insert": 3},
+    }
+    assert ticks.channel_ticks() == [36, 34] + [2] * 14
+    assert ticks.ticks("mantissa_channels") == 45 * 2 + 2 * 4 == sum(ticks.channel_ticks())
+    assert ticks.ticks() == 396
+    assert ticks.critical_path_ticks() == 396 - 98 + 36
+
+    # 覆盖一部分开销，其余沿用默认值；漏斗一共漏掉 16 个物品，每个少 4 游戏刻
+    fast_hopper = TickCounter({"hopper_drain": 4})
+    multiplying(rf.from_float(0.75), rf.from_float(0.5), True, ticks=fast_hopper)
+    assert fast_hopper.costs == dict(DEFAULT_TICK_COSTS, hopper_drain=4)
+    assert fast_hopper.ticks() == 396 - 16 * 4
+    assert DEFAULT_TICK_COSTS["hopper_drain"] == 8
+
+    # 没有传入计数器时不统计，空的计数器也照常计数
+    empty = TickCounter()
+    assert empty.ticks() == 0 and empty.report()["bottleneck"] is None
+    multiplying(rf.from_float(0.75), rf.from_float(0.5), True, ticks=empty)
+    assert empty.ticks() == 396
+    ticks.merge(empty)
+    assert ticks.operations == 2 and ticks.ticks() == 2 * 396
+
+if __name__ == "__main__":
+    test_fast_path_matches_simulation()
+    test_fast_path_on_encoded_floats()
+    test_vectorized_multiply_and_encode()
+    test_array_text_round_trip()
+    test_encoding_matches_dict_implementation()
+    test_vectorized_add()
+    test_tick_counts_for_known_operands()
+    print(f"fast path matches the simulation on {SAMPLES + SAMPLES // 4} operand pairs")